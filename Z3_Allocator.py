@@ -1,12 +1,671 @@
+import argparse
 import sqlite3
+import hashlib
 import json
+import math
+import os
+import time
 from collections import defaultdict
+from contextlib import contextmanager
+from fractions import Fraction
 from typing import Dict, List, Tuple
 from z3 import *
 
+import chain_dp
+import heuristic
+import profiling
+import schedule_io
+from device_registry import DEFAULT_REGISTRY, DeviceRegistry
+from schedule_store import ScheduleStore
+
+CONTIGUITY_ENCODINGS = ['pairwise', 'prefix']
+OBJECTIVES = chain_dp.OBJECTIVES
+# 'optimize' hands the objective to Z3's Optimize; 'bisect' binary-searches the
+# max chunk time with plain Solver checks (max_chunk_time only); 'heuristic' runs
+# greedy + local search without Z3 (heuristic.py), for very long pipelines.
+ENGINES = ['optimize', 'bisect', 'heuristic']
+# Integer ticks per millisecond for quantized (Int instead of Real) models.
+TIME_UNITS = {'us': 1000, 'ns': 1000000}
+# Resource orders tried by chain_dp when bounding the optimum for pruning (6! = 720).
+MAX_BOUND_ORDERS = 720
+
+@contextmanager
+def phase(stats: Dict, name: str, **attrs):
+    """Add the wall time of the block to stats[name + '_ms'] and expose it as a profiling span."""
+    start = time.perf_counter()
+    try:
+        with profiling.span(name, **attrs):
+            yield
+    finally:
+        stats[f'{name}_ms'] = stats.get(f'{name}_ms', 0.0) + (time.perf_counter() - start) * 1e3
+
+class PipelineModel:
+    """
+    Z3 variables and structural constraints (Constraints 1-3) for one stage
+    list and resource set. Timing data is only used by solve(), so one model
+    can be solved for several applications: each call adds its exclusions and
+    objective inside a push/pop scope and the structure stays in the solver.
+
+    With time_scale set, timings enter the model as integers rounded to
+    1/time_scale ms and the objective uses Int arithmetic. The reported
+    times are still the exact float sums of the chosen stages.
+
+    With track set, the constraints are collected in named groups instead
+    of being asserted, for unsat_core().
+
+    With require_all False, Constraint 2 is left out: a resource may get no
+    stage at all, and solve() can limit or penalize the number of chunks.
+
+    solver and prefix let several models share one solver (joint
+    co-scheduling): prefix keeps their variable names apart.
+    """
+
+    def __init__(self, stages: List[int], backends: List[str], core_types: List[str],
+                 encoding: str = 'pairwise', excluded: set = frozenset(), optimize: bool = True,
+                 time_scale: int = None, track: bool = False, require_all: bool = True,
+                 solver=None, prefix: str = ''):
+        if encoding not in CONTIGUITY_ENCODINGS:
+            raise ValueError(f"Unknown contiguity encoding: {encoding}")
+        self.stages = stages
+        self.backends = backends
+        self.core_types = core_types
+        self.encoding = encoding
+        self.time_scale = time_scale
+        # solve() needs Optimize; solve_bisect() only asks satisfiability questions.
+        if solver is None:
+            solver = Optimize() if optimize else Solver()
+        self.solver = solver
+        self.prefix = prefix
+        self.solves = 0
+        self.groups = {} if track else None
+
+        # Create variables for stage assignments; excluded options are constant False.
+        assign = {}
+        for s in stages:
+            assign[s] = {}
+            for b in backends:
+                if b in ['CUDA', 'VK']:
+                    usable = (s, b, None) not in excluded
+                    assign[s][b] = Bool(f'{prefix}s{s}_{b}') if usable else BoolVal(False)
+                else:
+                    assign[s][b] = {}
+                    for c in core_types:
+                        usable = (s, b, c) not in excluded
+                        assign[s][b][c] = Bool(f'{prefix}s{s}_{b}_{c}') if usable else BoolVal(False)
+        self.assign = assign
+        self.num_variables = sum(1 for _, var in self.options() if not is_false(var))
+
+        # Constraint 1: Each stage must be assigned exactly one resource.
+        for s in stages:
+            stage_assignments = []
+            for b in backends:
+                if b in ['CUDA', 'VK']:
+                    stage_assignments.append(assign[s][b])
+                else:
+                    stage_assignments.extend(list(assign[s][b].values()))
+            self._add(f"stage {s} on exactly one resource", PbEq([(a, 1) for a in stage_assignments], 1))
+
+        # Constraint 2: Must use all resources available for this application.
+        for b in backends if require_all else []:
+            if b in ['CUDA', 'VK']:
+                self._add(self.use_label(b, None), Or([assign[s][b] for s in stages]))
+            else:
+                for c in core_types:
+                    self._add(self.use_label(b, c), Or([assign[s][b][c] for s in stages]))
+
+        # Constraint 3: Enforce contiguous (grouped) usage.
+        for name, column in self.resource_columns():
+            if encoding == 'prefix':
+                self._add_prefix_contiguity(name, column)
+            else:
+                self._add_pairwise_contiguity(name, column)
+
+    def _add(self, group: str, constraint):
+        if self.groups is None:
+            self.solver.add(constraint)
+        else:
+            self.groups.setdefault(group, []).append(constraint)
+
+    @staticmethod
+    def resource_name(b: str, c: str) -> str:
+        return b if c is None else f"{b}_{c}"
+
+    @classmethod
+    def use_label(cls, b: str, c: str) -> str:
+        """Group name of Constraint 2 for one resource."""
+        return f"use {cls.resource_name(b, c)}"
+
+    @staticmethod
+    def option_keys(stages: List[int], backends: List[str], core_types: List[str]):
+        """Yield every (stage, backend, core_type) option, core_type None for GPU backends."""
+        for s in stages:
+            for b in backends:
+                if b in ['CUDA', 'VK']:
+                    yield s, b, None
+                else:
+                    for c in core_types:
+                        yield s, b, c
+
+    def options(self):
+        """Yield ((stage, backend, core_type), assignment Bool) for every option."""
+        for s, b, c in self.option_keys(self.stages, self.backends, self.core_types):
+            yield (s, b, c), self.assign[s][b] if c is None else self.assign[s][b][c]
+
+    def resource_columns(self) -> List[Tuple[str, List]]:
+        """Per resource, its assignment Bools in stage order."""
+        columns = []
+        for b in self.backends:
+            if b in ['CUDA', 'VK']:
+                columns.append((b, [self.assign[s][b] for s in self.stages]))
+            else:
+                for c in self.core_types:
+                    columns.append((self.resource_name(b, c), [self.assign[s][b][c] for s in self.stages]))
+        return columns
+
+    def _add_pairwise_contiguity(self, name: str, column: List):
+        """Once a resource is dropped, none of the later stages may use it."""
+        for i in range(len(column) - 1):
+            self._add(
+                f"contiguous use of {name}",
+                Implies(
+                    And(column[i], Not(column[i+1])),
+                    And([Not(column[j]) for j in range(i+2, len(column))])
+                )
+            )
+
+    def _add_prefix_contiguity(self, name: str, column: List):
+        """
+        Same restriction with an auxiliary ended[i] per stage: a drop at i sets
+        ended[i+1], ended stays set, and an ended resource is unused.
+        """
+        ended = [Bool(f'{self.prefix}ended_{name}_{i}') for i in range(len(column))]
+        self.num_variables += len(ended)
+        group = f"contiguous use of {name}"
+        for i in range(len(column) - 1):
+            self._add(group, Implies(And(column[i], Not(column[i+1])), ended[i+1]))
+            self._add(group, Implies(ended[i], ended[i+1]))
+        for i in range(len(column)):
+            self._add(group, Implies(ended[i], Not(column[i])))
+
+    @staticmethod
+    def _timing(times: Dict, s: int, b: str, c: str):
+        if c is None:
+            return times[s].get(b)
+        return times[s].get(b, {}).get(c)
+
+    def _quantity(self, name: str):
+        """Objective variable: Int ticks when quantized, Real milliseconds otherwise."""
+        return Int(name) if self.time_scale else Real(name)
+
+    def _coefficient(self, time_val: float):
+        """Timing as it enters the model (ticks when quantized)."""
+        return round(time_val * self.time_scale) if self.time_scale else time_val
+
+    def _exact(self, time_val: float):
+        """Timing as Z3 reads it, for exact arithmetic outside the solver."""
+        return self._coefficient(time_val) if self.time_scale else Fraction(str(time_val))
+
+    def _value(self, model, expr) -> float:
+        """Milliseconds of an objective expression in a model."""
+        if self.time_scale:
+            return model.evaluate(expr).as_long() / self.time_scale
+        return self._real_value(model, expr)
+
+    def _chunk_count(self):
+        """Number of resources that get at least one stage (each forms exactly one chunk)."""
+        return Sum([If(Or(column), 1, 0) for _, column in self.resource_columns()
+                    if not all(is_false(var) for var in column)])
+
+    def _limit_chunks(self, max_chunks: int):
+        if max_chunks is not None:
+            self.solver.add(self._chunk_count() <= max_chunks)
+
+    def _restrict(self, times: Dict, excluded: set):
+        """Force off excluded and untimed options in the current scope."""
+        for key, var in self.options():
+            if (key in excluded or self._timing(times, *key) is None) and not is_false(var):
+                self.solver.add(Not(var))
+
+    def _resource_loads(self, times: Dict) -> Dict[Tuple[str, str], object]:
+        """Per resource, the sum of its assigned stage times (its chunk time)."""
+        terms = defaultdict(list)
+        for (s, b, c), var in self.options():
+            time_val = self._timing(times, s, b, c)
+            if time_val is not None and not is_false(var):
+                terms[(b, c)].append(If(var, self._coefficient(time_val), 0 if self.time_scale else 0.0))
+        return {resource: Sum(resource_terms) for resource, resource_terms in terms.items()}
+
+    def solve(self, times: Dict, excluded: set = frozenset(), hint: Dict = None,
+              objective: str = 'total_time', chunk_penalty: float = 0.0, max_chunks: int = None) -> Dict:
+        """
+        Minimize the objective for one application's timings.
+
+        objective is 'total_time' (sum of all stage times) or 'max_chunk_time'
+        (the slowest resource's chunk, with total time as the tie-breaker).
+        Options in excluded, and options without a timing, are forced off for
+        this call only.
+
+        chunk_penalty (ms per chunk) is added to the objective to model the
+        handoff between chunks, and max_chunks caps their number; both only
+        matter for models built with require_all False.
+
+        hint maps stage -> (backend, core_type) of a previous schedule. If it
+        is still feasible, its objective value becomes an upper bound and its
+        assignment the initial phase. The solver then first asks whether
+        anything strictly better exists (for max_chunk_time, also anything
+        as good with a lower total time); if not, the hint is returned as
+        proven optimal without running the optimization.
+        """
+        if objective not in OBJECTIVES:
+            raise ValueError(f"Unknown objective: {objective}")
+        solver = self.solver
+        stats = {'variables': self.num_variables}
+        solver.push()
+        try:
+            with phase(stats, 'encode'):
+                self._restrict(times, excluded)
+
+                # Calculate total execution time.
+                total_time = self._quantity('total_time')
+                loads = self._resource_loads(times)
+                solver.add(total_time == Sum(list(loads.values())))
+                goal = total_time
+                if objective == 'max_chunk_time':
+                    goal = self._quantity('max_chunk_time')
+                    for load in loads.values():
+                        solver.add(goal >= load)
+                stats['variables'] += 1 if goal is total_time else 2
+                self._limit_chunks(max_chunks)
+                if chunk_penalty:
+                    goal = goal + self._coefficient(chunk_penalty) * self._chunk_count()
+
+            warm_start = None
+            if hint:
+                with phase(stats, 'check'):
+                    warm_start = self._apply_hint(times, hint, goal,
+                                                  total_time if objective != 'total_time' else None)
+                if warm_start['proved_optimal']:
+                    pipeline = {s: hint[s] + (self._timing(times, s, *hint[s]),) for s in self.stages}
+                    with phase(stats, 'extract'):
+                        result = self._extract(warm_start['model'], times, total_time, pipeline)
+                    result['warm_start'] = {k: v for k, v in warm_start.items() if k != 'model'}
+                    result['stats'] = self._solver_stats(stats)
+                    return result
+
+            with phase(stats, 'check'):
+                solver.minimize(goal)
+                if objective != 'total_time':
+                    solver.minimize(total_time)
+                self.solves += 1
+                outcome = solver.check()
+            if outcome != sat:
+                return None
+            with phase(stats, 'extract'):
+                result = self._extract(solver.model(), times, total_time)
+            if warm_start:
+                result['warm_start'] = {k: v for k, v in warm_start.items() if k != 'model'}
+            result['stats'] = self._solver_stats(stats)
+            return result
+        finally:
+            solver.pop()
+
+    def solve_bisect(self, times: Dict, excluded: set = frozenset(), max_chunks: int = None) -> Dict:
+        """
+        Minimize the max chunk time with plain satisfiability checks.
+
+        Every chunk is one resource's contiguous block, so its time is one of
+        the finite set of range sums of that resource's stage times. The
+        smallest feasible bound is found by bisecting over those candidates;
+        each probe asks "is there a schedule with every chunk <= T?" under a
+        fresh guard literal passed as an assumption, so the structural
+        constraints and learned clauses are shared by all probes. Like the
+        Optimize engine, ties on the smallest bound are then broken by total
+        time: further probes ask for a strictly lower total at that bound
+        until none exists.
+        """
+        solver = self.solver
+        stats = {'variables': self.num_variables + 1}
+        solver.push()
+        try:
+            with phase(stats, 'encode'):
+                self._restrict(times, excluded)
+                total_time = self._quantity('total_time')
+                loads = self._resource_loads(times)
+                solver.add(total_time == Sum(list(loads.values())))
+                self._limit_chunks(max_chunks)
+
+            # Candidate chunk times, summed exactly the way Z3 reads the float timings.
+            candidates = set()
+            for b, c in loads:
+                column = [self._timing(times, s, b, c) for s in self.stages]
+                for i in range(len(column)):
+                    acc = 0
+                    for j in range(i, len(column)):
+                        if column[j] is None:
+                            break
+                        acc += self._exact(column[j])
+                        candidates.add(acc)
+            # No chunk can be faster than the slowest stage on its fastest resource.
+            floor = max((min((t for t in (self._timing(times, s, b, c) for b, c in loads) if t is not None),
+                             default=0.0) for s in self.stages), default=0.0)
+            candidates = sorted(t for t in candidates if t >= self._exact(floor))
+
+            check_ms = []
+            def feasible(bound, below_total=None):
+                guard = Bool(f'bound_{len(check_ms)}')
+                if self.time_scale:
+                    limit = IntVal(bound)
+                else:
+                    limit = RealVal(f"{bound.numerator}/{bound.denominator}")
+                constraints = [load <= limit for load in loads.values()]
+                if below_total is not None:
+                    constraints.append(total_time < below_total)
+                solver.add(Implies(guard, And(constraints)))
+                start = time.perf_counter()
+                outcome = solver.check(guard)
+                check_ms.append((time.perf_counter() - start) * 1e3)
+                return solver.model() if outcome == sat else None
+
+            with phase(stats, 'check'):
+                lo, hi = 0, len(candidates) - 1
+                best = feasible(candidates[hi]) if candidates else None
+                best_bound = candidates[hi] if candidates else None
+                while best is not None and lo < hi:
+                    mid = (lo + hi) // 2
+                    model = feasible(candidates[mid])
+                    if model is not None:
+                        best, best_bound, hi = model, candidates[mid], mid
+                    else:
+                        lo = mid + 1
+                tie_breaks = 0
+                while best is not None:
+                    model = feasible(best_bound, best.evaluate(total_time))
+                    if model is None:
+                        break
+                    best = model
+                    tie_breaks += 1
+            if best is None:
+                return None
+            self.solves += 1
+            stats['variables'] += len(check_ms)
+            with phase(stats, 'extract'):
+                result = self._extract(best, times, total_time)
+            result['stats'] = self._solver_stats(stats)
+            result['bisection'] = {
+                'candidates': len(candidates),
+                'iterations': len(check_ms),
+                'tie_breaks': tie_breaks,
+                'check_ms': check_ms,
+                'bound': float(best_bound) / (self.time_scale or 1)
+            }
+            return result
+        finally:
+            solver.pop()
+
+    def _apply_hint(self, times: Dict, hint: Dict, goal, tie_break=None) -> Dict:
+        """
+        Check a hinted assignment, bound the objective by it and try to prove it
+        optimal. With tie_break (the secondary objective), a hint is only proven
+        optimal if no schedule reaching its goal value has a lower tie_break.
+        """
+        solver = self.solver
+        literals = []
+        for (s, b, c), var in self.options():
+            chosen = hint.get(s) == (b, c)
+            if is_false(var):
+                if chosen:
+                    return {'feasible': False, 'proved_optimal': False}
+                continue
+            literals.append(var if chosen else Not(var))
+        if set(hint) != set(self.stages) or solver.check(literals) != sat:
+            return {'feasible': False, 'proved_optimal': False}
+        hint_model = solver.model()
+        bound = hint_model.evaluate(goal)
+        hint_time = self._value(hint_model, goal)
+
+        solver.add(goal <= bound)
+        for lit in literals:
+            var = lit.arg(0) if is_not(lit) else lit
+            solver.set_initial_value(var, BoolVal(not is_not(lit)))
+        solver.push()
+        solver.add(goal < bound)
+        improved = solver.check() == sat
+        solver.pop()
+        if not improved and tie_break is not None:
+            solver.push()
+            solver.add(tie_break < hint_model.evaluate(tie_break))
+            improved = solver.check() == sat
+            solver.pop()
+        return {'feasible': True, 'proved_optimal': not improved, 'hint_time': hint_time,
+                'model': hint_model}
+
+    def unsat_core(self, times: Dict, excluded: set = frozenset()) -> List[str]:
+        """
+        Names of a minimal set of constraint groups that cannot hold together
+        for these timings, or [] when they can. Missing timings and excluded
+        options form one group per resource. Requires a model built with track.
+        """
+        groups = dict(self.groups)
+        forced_off = defaultdict(list)
+        for (s, b, c), var in self.options():
+            if self._timing(times, s, b, c) is None:
+                forced_off[f"no timing on {self.resource_name(b, c)}"].append((s, var))
+            elif (s, b, c) in excluded:
+                forced_off[f"pruned options on {self.resource_name(b, c)}"].append((s, var))
+        for label, entries in forced_off.items():
+            groups[f"{label} (stages {', '.join(str(s) for s, _ in entries)})"] = [Not(var) for _, var in entries]
+
+        solver = Solver()
+        literals = {}
+        for label, constraints in groups.items():
+            literals[label] = Bool(f'track: {label}')
+            solver.add(Implies(literals[label], And(constraints)))
+        if solver.check(list(literals.values())) != unsat:
+            return []
+        by_literal = {str(lit): label for label, lit in literals.items()}
+        core = [by_literal[str(lit)] for lit in solver.unsat_core()]
+        # Drop groups one at a time while the rest stays unsatisfiable.
+        i = 0
+        while i < len(core):
+            trial = core[:i] + core[i + 1:]
+            if solver.check([literals[label] for label in trial]) == unsat:
+                core = trial
+            else:
+                i += 1
+        order = list(groups)
+        return sorted(core, key=order.index)
+
+    def _solver_stats(self, stats: Dict) -> Dict:
+        """Add assertion count and Z3's own counters (conflicts, decisions, memory, ...) to stats."""
+        stats['assertions'] = len(self.solver.assertions())
+        z3_stats = self.solver.statistics()
+        stats['z3'] = {key: z3_stats.get_key_value(key) for key in z3_stats.keys()}
+        return stats
+
+    @staticmethod
+    def _real_value(model, expr) -> float:
+        value_str = model.evaluate(expr).as_decimal(10)
+        if value_str.endswith('?'):
+            value_str = value_str[:-1]
+        return float(value_str)
+
+    def _extract(self, model, times: Dict, total_time, solution: Dict = None) -> Dict:
+        if solution is None:
+            solution = {}
+            for (s, b, c), var in self.options():
+                if s not in solution and is_true(model.evaluate(var)):
+                    solution[s] = (b, c, self._timing(times, s, b, c))
+        if not self.time_scale:
+            return {
+                'pipeline': solution,
+                'total_time': self._real_value(model, total_time)
+            }
+        # Report the float sum (same 10-digit precision as the Real model) and the rounding cost.
+        exact = round(sum(solution[s][2] for s in sorted(solution)), 10)
+        rounding = [abs(self._coefficient(t) / self.time_scale - t)
+                    for t in (self._timing(times, *key) for key, _ in self.options()) if t is not None]
+        max_rounding = max(rounding, default=0.0)
+        return {
+            'pipeline': solution,
+            'total_time': exact,
+            'quantization': {
+                'ticks_per_ms': self.time_scale,
+                'model_total_time': self._value(model, total_time),
+                'objective_error': abs(self._value(model, total_time) - exact),
+                'max_rounding_error': max_rounding,
+                # The quantized optimum is within this much of the true optimum.
+                'optimality_gap_bound': 2 * len(self.stages) * max_rounding
+            }
+        }
+
+class ClusterSplitModel(PipelineModel):
+    """
+    PipelineModel in which the physical cores of a CPU cluster can host
+    several concurrent chunks (e.g. 2+2 threads on four little cores).
+
+    Each cluster c with n cores becomes up to n lanes named 'c#1'..'c#n',
+    used in that order. A used lane picks one thread count, and the thread
+    counts of a cluster's lanes add up to at most n. times[s][b][lane] maps
+    thread count -> stage time (get_thread_times); a lane's stage time is
+    the one measured at its thread count.
+    """
+
+    def __init__(self, stages: List[int], backends: List[str], core_types: List[str],
+                 cluster_cores: Dict[str, int], encoding: str = 'pairwise', optimize: bool = True,
+                 time_scale: int = None, require_all: bool = True):
+        self.clusters = core_types
+        self.cluster_cores = cluster_cores
+        lanes = [self.lane_name(c, i) for c in core_types for i in range(1, cluster_cores[c] + 1)]
+        super().__init__(stages, backends, lanes, encoding, optimize=optimize, time_scale=time_scale,
+                         require_all=False)
+
+        columns = dict(self.resource_columns())
+        self.threads = {}
+        for b in backends:
+            if b in ['CUDA', 'VK']:
+                if require_all:
+                    self._add(self.use_label(b, None), Or(columns[b]))
+                continue
+            for c in core_types:
+                cores = cluster_cores[c]
+                used = [Or(columns[self.resource_name(b, self.lane_name(c, i))]) for i in range(1, cores + 1)]
+                weighted = []
+                for i in range(1, cores + 1):
+                    lane = self.lane_name(c, i)
+                    self.threads[(b, lane)] = {t: Bool(f'threads_{b}_{lane}_{t}') for t in range(1, cores + 1)}
+                    choices = list(self.threads[(b, lane)].values())
+                    # A used lane runs with exactly one thread count, an unused one with none.
+                    self._add(f"threads of {b}_{lane}", PbEq([(x, 1) for x in choices] + [(Not(used[i - 1]), 1)], 1))
+                    weighted.extend((x, t) for t, x in self.threads[(b, lane)].items())
+                    if i > 1:
+                        self._add(f"lane order of {b}_{c}", Implies(used[i - 1], used[i - 2]))
+                    self.num_variables += len(choices)
+                self._add(f"cores of {b}_{c}", PbLe(weighted, cores))
+                if require_all:
+                    self._add(self.use_label(b, c), Or(used))
+
+    @staticmethod
+    def lane_name(core_type: str, index: int) -> str:
+        return f"{core_type}#{index}"
+
+    @staticmethod
+    def cluster_of(lane: str) -> str:
+        return lane.split('#')[0]
+
+    @staticmethod
+    def _timing(times: Dict, s: int, b: str, c: str):
+        value = PipelineModel._timing(times, s, b, c)
+        if isinstance(value, dict):
+            return min(value.values()) if value else None
+        return value
+
+    def _thread_timings(self, times: Dict, s: int, b: str, lane: str) -> Dict[int, float]:
+        return times[s].get(b, {}).get(lane) or {}
+
+    def _restrict(self, times: Dict, excluded: set):
+        super()._restrict(times, excluded)
+        # A lane cannot run a stage at a thread count that was never measured for it.
+        for (s, b, c), var in self.options():
+            if c is None or is_false(var):
+                continue
+            measured = self._thread_timings(times, s, b, c)
+            for t, choice in self.threads[(b, c)].items():
+                if t not in measured:
+                    self.solver.add(Not(And(var, choice)))
+
+    def _resource_loads(self, times: Dict) -> Dict[Tuple[str, str], object]:
+        terms = defaultdict(list)
+        zero = 0 if self.time_scale else 0.0
+        for (s, b, c), var in self.options():
+            if is_false(var):
+                continue
+            if c is None:
+                time_val = self._timing(times, s, b, c)
+                if time_val is not None:
+                    terms[(b, c)].append(If(var, self._coefficient(time_val), zero))
+                continue
+            for t, time_val in self._thread_timings(times, s, b, c).items():
+                terms[(b, c)].append(If(And(var, self.threads[(b, c)][t]), self._coefficient(time_val), zero))
+        return {resource: Sum(resource_terms) for resource, resource_terms in terms.items()}
+
+    def _extract(self, model, times: Dict, total_time, solution: Dict = None) -> Dict:
+        lane_threads = {}
+        for (b, lane), choices in self.threads.items():
+            for t, choice in choices.items():
+                if is_true(model.evaluate(choice)):
+                    lane_threads[lane] = t
+        solution = {}
+        for (s, b, c), var in self.options():
+            if s not in solution and is_true(model.evaluate(var)):
+                time_val = self._timing(times, s, b, c) if c is None else times[s][b][c][lane_threads[c]]
+                solution[s] = (b, c, time_val)
+        result = super()._extract(model, times, total_time, solution)
+        result['threads'] = {lane: t for lane, t in lane_threads.items()
+                             if any(c == lane for _, c, _ in solution.values())}
+        return result
+
 class PipelineOptimizer:
-    def __init__(self, db_name: str = "benchmark_results.db"):
+    def __init__(self, db_name: str = "benchmark_results.db", encoding: str = 'pairwise',
+                 prune: bool = False, incremental: bool = False,
+                 objective: str = 'total_time', engine: str = 'optimize', time_unit: str = None,
+                 relax: bool = False, optional_resources: bool = False, chunk_penalty: float = 0.0,
+                 max_chunks: int = None, split_clusters: bool = False, devices: str = DEFAULT_REGISTRY,
+                 sensitivity: bool = False):
+        if time_unit is not None and time_unit not in TIME_UNITS:
+            raise ValueError(f"Unknown time unit: {time_unit}")
+        if objective not in OBJECTIVES:
+            raise ValueError(f"Unknown objective: {objective}")
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine: {engine}")
+        if engine == 'bisect' and objective != 'max_chunk_time':
+            raise ValueError("The bisect engine only minimizes max_chunk_time")
+        if engine == 'bisect' and chunk_penalty:
+            raise ValueError("The bisect engine does not support a chunk penalty")
+        if engine == 'bisect' and split_clusters:
+            raise ValueError("The bisect engine does not support split clusters")
+        if engine == 'heuristic' and (split_clusters or optional_resources or chunk_penalty
+                                      or max_chunks is not None):
+            raise ValueError("The heuristic engine only solves the default model")
+        if sensitivity and (split_clusters or optional_resources or chunk_penalty or max_chunks is not None):
+            raise ValueError("Sensitivity margins are only computed for the default model")
         self.db_name = db_name
+        self.encoding = encoding
+        self.prune = prune
+        self.incremental = incremental
+        self.objective = objective
+        self.engine = engine
+        self.time_scale = TIME_UNITS[time_unit] if time_unit else None
+        self.relax = relax
+        # A chunk penalty or limit only makes sense when resources may stay unused.
+        self.optional_resources = optional_resources or bool(chunk_penalty) or max_chunks is not None
+        self.chunk_penalty = chunk_penalty
+        self.max_chunks = max_chunks
+        self.split_clusters = split_clusters
+        self.devices = DeviceRegistry(devices)
+        self.sensitivity = sensitivity
+        self.last_unsat_core = None
+        self.unsat_cores = {}
+        self.models = {}
         self.conn = sqlite3.connect(db_name)
         self.cursor = self.conn.cursor()
 
@@ -23,13 +682,55 @@ class PipelineOptimizer:
         self.cursor.execute(query, (machine, application))
         
         times = defaultdict(lambda: defaultdict(dict))
-        for stage, backend, core_type, time in self.cursor.fetchall():
+        for stage, backend, core_type, min_time in self.cursor.fetchall():
+            if backend in ['CUDA', 'VK'] or core_type == 'None':
+                times[stage][backend] = float(min_time)
+            else:
+                times[stage][backend][core_type] = float(min_time)
+        return times
+
+    def get_thread_times(self, machine: str, application: str) -> Dict:
+        """Like get_execution_times, but CPU entries map num_threads -> minimum time."""
+        self.cursor.execute("""
+            SELECT stage, backend, core_type, num_threads, MIN(time_ms) as min_time
+            FROM benchmark_result
+            WHERE machine_name = ? AND application = ? AND stage > 0
+            GROUP BY stage, backend, core_type, num_threads
+            HAVING min_time IS NOT NULL
+            ORDER BY stage, backend, core_type, num_threads
+        """, (machine, application))
+        times = defaultdict(lambda: defaultdict(dict))
+        for stage, backend, core_type, threads, min_time in self.cursor.fetchall():
             if backend in ['CUDA', 'VK'] or core_type == 'None':
-                times[stage][backend] = float(time)
+                times[stage][backend] = min(times[stage].get(backend, float(min_time)), float(min_time))
             else:
-                times[stage][backend][core_type] = float(time)
+                times[stage][backend].setdefault(core_type, {})[threads] = float(min_time)
         return times
 
+    def get_cluster_cores(self, machine: str, application: str) -> Dict[str, int]:
+        """
+        Physical cores per CPU cluster from the device registry. Clusters the
+        registry does not list fall back to the largest thread count benchmarked.
+        """
+        self.cursor.execute("""
+            SELECT core_type, MAX(num_threads)
+            FROM benchmark_result
+            WHERE machine_name = ? AND application = ? AND backend = 'OMP'
+              AND core_type IS NOT NULL AND core_type != 'None'
+            GROUP BY core_type
+        """, (machine, application))
+        cores = {core_type: count for core_type, count in self.cursor.fetchall()}
+        cores.update(self.devices.cluster_cores(machine))
+        return cores
+
+    def count_benchmark_rows(self, machine: str, application: str) -> int:
+        """Number of raw timing rows (all thread counts) behind get_execution_times."""
+        self.cursor.execute("""
+            SELECT COUNT(*) FROM benchmark_result
+            WHERE machine_name = ? AND application = ? AND stage > 0 AND time_ms IS NOT NULL
+        """, (machine, application))
+        return self.cursor.fetchone()[0]
+
     def get_machine_resources(self, machine: str, application: str) -> Tuple[List[str], List[str]]:
         """Get available backends and core types for a machine and application."""
         self.cursor.execute("""
@@ -70,112 +771,351 @@ class PipelineOptimizer:
         mapping["gpu"] = 0
         return mapping
 
-    def optimize_pipeline(self, machine: str, application: str) -> Dict:
-        """Find optimal pipeline configuration using Z3."""
-        times = self.get_execution_times(machine, application)
-        if not times:
-            return None
-
-        stages = sorted(times.keys())
-        backends, core_types = self.get_machine_resources(machine, application)
+    def optimize_pipeline(self, machine: str, application: str, encoding: str = None,
+                          hint: Dict = None) -> Dict:
+        """
+        Find optimal pipeline configuration using Z3.
 
-        solver = Optimize()
-        # Create variables for stage assignments.
-        assign = {}
-        for s in stages:
-            assign[s] = {}
-            for b in backends:
-                if b in ['CUDA', 'VK']:
-                    assign[s][b] = Bool(f's{s}_{b}')
-                else:
-                    assign[s][b] = {}
-                    for c in core_types:
-                        assign[s][b][c] = Bool(f's{s}_{b}_{c}')
+        hint is a previously published build_schedule result for the same pair,
+        used to warm-start the solver (see PipelineModel.solve).
+        """
+        fetch = {}
+        with phase(fetch, 'fetch', machine=machine, application=application):
+            times = self.get_execution_times(machine, application)
+            if not times:
+                return None
+            backends, core_types = self.get_machine_resources(machine, application)
+            raw_rows = self.count_benchmark_rows(machine, application)
+            thread_times = cluster_cores = None
+            if self.split_clusters:
+                thread_times = self.get_thread_times(machine, application)
+                cluster_cores = self.get_cluster_cores(machine, application)
 
-        # Constraint 1: Each stage must be assigned exactly one resource.
-        for s in stages:
-            stage_assignments = []
-            for b in backends:
-                if b in ['CUDA', 'VK']:
-                    stage_assignments.append(assign[s][b])
-                else:
-                    stage_assignments.extend(list(assign[s][b].values()))
-            solver.add(PbEq([(a, 1) for a in stage_assignments], 1))
+        assignment = self.schedule_assignment(hint, backends) if hint else None
+        result = self.solve_pipeline(times, backends, core_types, encoding=encoding, hint=assignment,
+                                     thread_times=thread_times, cluster_cores=cluster_cores)
+        if result:
+            result['pruning']['raw_rows'] = raw_rows
+            result['stats'].update(fetch)
+        else:
+            self.unsat_cores[(machine, application)] = self.last_unsat_core
+        return result
 
-        # Constraint 2: Must use all resources available for this application.
-        for b in backends:
-            if b in ['CUDA', 'VK']:
-                solver.add(Or([assign[s][b] for s in stages]))
+    @staticmethod
+    def schedule_assignment(schedule_dict: Dict, backends: List[str]) -> Dict:
+        """Map a build_schedule result back to stage -> (backend, core_type)."""
+        gpu_backend = next((b for b in backends if b in ['CUDA', 'VK']), None)
+        cpu_backend = next((b for b in backends if b not in ['CUDA', 'VK']), None)
+        assignment = {}
+        for chunk in schedule_dict["schedule"]["chunks"]:
+            if chunk["hardware"] == "gpu":
+                resource = (gpu_backend, None)
             else:
-                for c in core_types:
-                    solver.add(Or([assign[s][b][c] for s in stages]))
+                resource = (cpu_backend, chunk["hardware"])
+            for s in chunk["stages"]:
+                assignment[s] = resource
+        return assignment
 
-        # Constraint 3: Enforce contiguous (grouped) usage.
-        for b in backends:
-            if b in ['CUDA', 'VK']:
-                for i in range(len(stages) - 1):
-                    s_i = stages[i]
-                    s_ip1 = stages[i+1]
-                    solver.add(
-                        Implies(
-                            And(assign[s_i][b], Not(assign[s_ip1][b])),
-                            And([Not(assign[stages[j]][b]) for j in range(i+2, len(stages))])
-                        )
-                    )
+    def prune_options(self, times: Dict, backends: List[str], core_types: List[str],
+                      objective: str = 'total_time') -> set:
+        """
+        Options (stage, backend, core_type) that cannot be part of an optimal schedule.
+
+        Slower thread counts are already folded away by MIN(time_ms) in
+        get_execution_times. Here every resource order is tried with
+        chain_dp to get an upper bound, and an option is dropped when the
+        per-stage lower bound plus its extra cost over the fastest resource
+        for that stage already exceeds it.
+        """
+        stages, resources, cost = chain_dp.normalize(times, backends, core_types)
+        upper = chain_dp.solve_exact(cost, objective, max_orders=MAX_BOUND_ORDERS)[0]
+        return {(stages[i],) + resources[k]
+                for i, k in chain_dp.dominated_options(cost, upper, objective)}
+
+    def solve_pipeline(self, times: Dict, backends: List[str], core_types: List[str],
+                       encoding: str = None, prune: bool = None, hint: Dict = None,
+                       thread_times: Dict = None, cluster_cores: Dict[str, int] = None) -> Dict:
+        """
+        Solve the chain-partitioning model for already fetched timing data.
+
+        encoding selects how contiguous resource usage (Constraint 3) is expressed:
+        'pairwise' forbids every later use after a drop (O(S^2) clauses per resource),
+        'prefix' threads an "ended" indicator through the stages (O(S) clauses).
+
+        With prune, options found by prune_options get no variable. Options
+        without a timing never get one.
+
+        With self.incremental, the structural model is cached per (stage list,
+        resource set, encoding) and reused across applications; pruned and
+        untimed options are then forced off per solve instead. That only saves
+        model construction, and the reused model keeps variables a fresh one
+        would not create, so it only pays off with the 'prefix' encoding on
+        short pipelines; with 'pairwise' it is usually slower.
+
+        self.objective is minimized by self.engine. The 'bisect' engine
+        returns a 'bisection' summary (iterations, per-check latency). With
+        self.time_scale the model is quantized and the result carries a
+        'quantization' summary of the rounding error.
+
+        hint (stage -> (backend, core_type)) warm-starts the solve; the bisect
+        engine ignores it. The result carries 'solve_ms' and, with a hint, a
+        'warm_start' summary.
+
+        When the instance is infeasible, self.last_unsat_core names a minimal
+        set of conflicting constraint groups. With self.relax, a resource whose
+        "use" constraint is in the core is dropped and the solve repeated;
+        the result then lists the cores and dropped resources under 'relaxed'.
+
+        With self.optional_resources, resources may stay unused (no Constraint
+        2); self.chunk_penalty ms is then charged per chunk and self.max_chunks
+        caps the number of chunks. Pruning is skipped in that mode, since its
+        bound assumes every resource is used.
+
+        With self.split_clusters and thread_times (get_thread_times) and
+        cluster_cores given, a ClusterSplitModel lets a CPU cluster host
+        several concurrent chunks; the result's 'threads' maps each used lane
+        to its thread count. Hints, pruning and model reuse do not apply.
+
+        result['stats'] holds per-phase wall times (prune_ms, build_ms,
+        encode_ms, check_ms, extract_ms), the model's variable and assertion
+        counts and Z3's statistics() counters under 'z3'.
+        """
+        encoding = encoding or self.encoding
+        prune = self.prune if prune is None else prune
+        stages = sorted(times.keys())
+        stats = {}
+        split = self.split_clusters and thread_times is not None
+        prune = prune and not self.optional_resources and not split and self.engine != 'heuristic'
+        with phase(stats, 'prune'):
+            pruned = self.prune_options(times, backends, core_types, self.objective) if prune else set()
+        option_keys = list(PipelineModel.option_keys(stages, backends, core_types))
+
+        # The split model solves per-lane timings; the failure diagnosis below keeps the per-cluster ones.
+        model_times = times
+        with phase(stats, 'build'):
+            if self.engine == 'heuristic':
+                model = None
+            elif split:
+                hint = None
+                model_times = self.lane_times(thread_times, backends, core_types, cluster_cores)
+                model = ClusterSplitModel(stages, backends, core_types, cluster_cores, encoding,
+                                          optimize=self.engine == 'optimize', time_scale=self.time_scale,
+                                          require_all=not self.optional_resources)
+            elif self.incremental:
+                key = (tuple(stages), tuple(backends), tuple(core_types), encoding)
+                model = self.models.get(key)
+                if model is None:
+                    model = self.models[key] = PipelineModel(stages, backends, core_types, encoding,
+                                                             optimize=self.engine == 'optimize',
+                                                             time_scale=self.time_scale,
+                                                             require_all=not self.optional_resources)
             else:
-                for c in core_types:
-                    for i in range(len(stages) - 1):
-                        s_i = stages[i]
-                        s_ip1 = stages[i+1]
-                        solver.add(
-                            Implies(
-                                And(assign[s_i][b][c], Not(assign[s_ip1][b][c])),
-                                And([Not(assign[stages[j]][b][c]) for j in range(i+2, len(stages))])
-                            )
-                        )
-
-        # Calculate total execution time.
-        total_time = Real('total_time')
-        time_terms = []
-        for s in stages:
-            stage_terms = []
+                untimed = {k for k in option_keys if PipelineModel._timing(times, *k) is None}
+                model = PipelineModel(stages, backends, core_types, encoding, excluded=pruned | untimed,
+                                      optimize=self.engine == 'optimize', time_scale=self.time_scale,
+                                      require_all=not self.optional_resources)
+        start = time.perf_counter()
+        if self.engine == 'heuristic':
+            result = self.solve_heuristic(times, backends, core_types)
+        elif self.engine == 'bisect':
+            result = model.solve_bisect(model_times, pruned, max_chunks=self.max_chunks)
+        else:
+            result = model.solve(model_times, pruned, hint=hint, objective=self.objective,
+                                 chunk_penalty=self.chunk_penalty, max_chunks=self.max_chunks)
+        solve_ms = (time.perf_counter() - start) * 1e3
+        if result:
+            result['pruning'] = {'options': len(option_keys), 'pruned': len(pruned)}
+            result['solve_ms'] = solve_ms
+            result['stats'].update(stats)
+            return result
+
+        core = self.last_unsat_core = self.unsat_core(times, backends, core_types, encoding, pruned)
+        # Prefer a resource that is also missing timings in the core over one merely outnumbering stages.
+        candidates = [r for r in self.resources(backends, core_types) if PipelineModel.use_label(*r) in core]
+        untimed = [r for r in candidates
+                   if any(label.startswith(f"no timing on {PipelineModel.resource_name(*r)} (") for label in core)]
+        culprit = (untimed or candidates or [None])[0]
+        if not self.relax or culprit is None:
+            return None
+        b, c = culprit
+        if c is None:
+            backends = [x for x in backends if x != b]
+        else:
+            core_types = [x for x in core_types if x != c]
+        result = self.solve_pipeline(times, backends, core_types, encoding=encoding, prune=prune,
+                                     thread_times=thread_times, cluster_cores=cluster_cores)
+        if result:
+            relaxed = result.setdefault('relaxed', {'unsat_cores': [], 'dropped': []})
+            relaxed['unsat_cores'].insert(0, core)
+            relaxed['dropped'].insert(0, PipelineModel.resource_name(b, c))
+        return result
+
+    def solve_heuristic(self, times: Dict, backends: List[str], core_types: List[str]) -> Dict:
+        """
+        Greedy + local search solution of the default model (heuristic.search)
+        in the optimize_pipeline result format. Not proven optimal: the
+        result's 'heuristic' entry holds the lower bound and the relative
+        gap to it.
+        """
+        stats = {'variables': 0}
+        with phase(stats, 'check'):
+            stages, resources, cost = chain_dp.normalize(times, backends, core_types)
+            value, assignment, info = heuristic.search(cost, self.objective)
+        if assignment is None:
+            return None
+        return {
+            'pipeline': {stages[i]: resources[k] + (cost[i][k],) for i, k in enumerate(assignment)},
+            'total_time': round(chain_dp.evaluate(cost, assignment), 10),
+            'heuristic': info,
+            'stats': stats
+        }
+
+    @staticmethod
+    def lane_times(thread_times: Dict, backends: List[str], core_types: List[str],
+                   cluster_cores: Dict[str, int]) -> Dict:
+        """ClusterSplitModel timings: every lane of a cluster gets the cluster's per-thread-count times."""
+        times = defaultdict(lambda: defaultdict(dict))
+        for s, entry in thread_times.items():
             for b in backends:
                 if b in ['CUDA', 'VK']:
-                    if b in times[s]:
-                        stage_terms.append(If(assign[s][b], times[s][b], 0.0))
-                else:
-                    for c in core_types:
-                        if c in times[s][b]:
-                            stage_terms.append(If(assign[s][b][c], times[s][b][c], 0.0))
-            time_terms.extend(stage_terms)
-        solver.add(total_time == Sum(time_terms))
-        solver.minimize(total_time)
-
-        if solver.check() == sat:
-            model = solver.model()
-            solution = {}
-            total_time_str = model.evaluate(total_time).as_decimal(10)
-            if total_time_str.endswith('?'):
-                total_time_str = total_time_str[:-1]
-            total_time_value = float(total_time_str)
-
-            for s in stages:
-                for b in backends:
-                    if b in ['CUDA', 'VK']:
-                        if is_true(model.evaluate(assign[s][b])):
-                            solution[s] = (b, None, times[s][b])
-                            break
-                    else:
-                        for c in core_types:
-                            if is_true(model.evaluate(assign[s][b][c])):
-                                solution[s] = (b, c, times[s][b][c])
-                                break
+                    if b in entry:
+                        times[s][b] = entry[b]
+                    continue
+                for c in core_types:
+                    measured = {t: v for t, v in entry.get(b, {}).get(c, {}).items() if t <= cluster_cores[c]}
+                    for i in range(1, cluster_cores[c] + 1):
+                        times[s][b][ClusterSplitModel.lane_name(c, i)] = measured
+        return times
 
-            return {
-                'pipeline': solution,
-                'total_time': total_time_value
-            }
-        return None
+    @staticmethod
+    def resources(backends: List[str], core_types: List[str]) -> List[Tuple[str, str]]:
+        """(backend, core_type) resources in model order, core_type None for GPU backends."""
+        return [(b, None) if b in ['CUDA', 'VK'] else (b, c)
+                for b in backends for c in ([None] if b in ['CUDA', 'VK'] else core_types)]
+
+    @staticmethod
+    def hardware_of(backend: str, core: str) -> str:
+        """Schedule hardware name of a resource: "gpu" or the CPU cluster ("big", "medium", "little")."""
+        return "gpu" if backend in ['CUDA', 'VK'] else ClusterSplitModel.cluster_of(core)
+
+    def coschedule(self, machine: str, targets: Dict[str, float], disjoint: bool = False) -> Dict[str, Dict]:
+        """
+        Joint schedules for applications running concurrently on one machine.
+
+        targets maps application -> target rate (frames per second, or any
+        relative weight). At those rates a hardware resource (the GPU or one
+        CPU cluster) is busy sum_a rate_a * chunk_a ms per second, chunk_a
+        being application a's chunk time on it. The model minimizes the
+        busiest resource's demand D, so that every application can run at
+        scale = 1000 / D times its target: scale >= 1 means all targets are
+        met and scale * sum(rates) is the aggregate throughput. Resources are
+        time-shared unless disjoint is set, in which case each one serves at
+        most one application. Every resource is optional for every
+        application; rate-weighted total time breaks ties.
+
+        Returns application -> optimize_pipeline-style result with a
+        'coschedule' entry holding the achieved rate and the application's
+        budget per hardware resource (the share of its time, scale * rate *
+        chunk / 1000). Returns None when some application cannot be placed.
+        """
+        stats = {}
+        solver = Optimize()
+        models = {}
+        loads = defaultdict(lambda: defaultdict(list))
+        usage = defaultdict(lambda: defaultdict(list))
+        with phase(stats, 'encode', machine=machine):
+            for i, application in enumerate(targets):
+                with phase(stats, 'fetch', application=application):
+                    times = self.get_execution_times(machine, application)
+                    backends, core_types = self.get_machine_resources(machine, application)
+                if not times:
+                    raise ValueError(f"No timings for {application} on {machine}")
+                model = PipelineModel(sorted(times.keys()), backends, core_types, self.encoding,
+                                      require_all=False, solver=solver, prefix=f'app{i}_')
+                model._restrict(times, frozenset())
+                for (b, c), load in model._resource_loads(times).items():
+                    loads[application][self.hardware_of(b, c)].append(load)
+                for (s, b, c), var in model.options():
+                    if not is_false(var):
+                        usage[self.hardware_of(b, c)][application].append(var)
+                models[application] = (model, times)
+
+            demand = Real('demand')
+            for hardware, users in usage.items():
+                solver.add(demand >= Sum([targets[a] * Sum(loads[a][hardware]) for a in users if loads[a][hardware]]))
+                if disjoint and len(users) > 1:
+                    solver.add(PbLe([(Or(vars), 1) for vars in users.values()], 1))
+            totals = {a: Sum([load for hw_loads in loads[a].values() for load in hw_loads]) for a in targets}
+
+        with phase(stats, 'check'):
+            solver.minimize(demand)
+            solver.minimize(Sum([targets[a] * totals[a] for a in targets]))
+            outcome = solver.check()
+        if outcome != sat:
+            return None
+
+        results = {}
+        with phase(stats, 'extract'):
+            model_values = solver.model()
+            peak = PipelineModel._real_value(model_values, demand)
+            scale = 1000.0 / peak if peak > 0 else float('inf')
+            for application, (model, times) in models.items():
+                result = model._extract(model_values, times, totals[application])
+                chunks = defaultdict(float)
+                for b, c, time_val in result['pipeline'].values():
+                    chunks[self.hardware_of(b, c)] += time_val
+                rate = targets[application]
+                result['coschedule'] = {
+                    'target_rate': rate,
+                    'rate': rate * scale,
+                    'scale': scale,
+                    'disjoint': disjoint,
+                    'budget': {hardware: round(scale * rate * chunk / 1000.0, 6)
+                               for hardware, chunk in sorted(chunks.items())}
+                }
+                results[application] = result
+        for result in results.values():
+            result['stats'] = dict(stats)
+        return results
+
+    def sensitivity_margins(self, machine: str, application: str, result: Dict) -> List[Dict]:
+        """
+        Stability margin of every timing behind a schedule: how many ms each
+        (stage, resource) timing may get faster or slower, alone, before a
+        different assignment becomes optimal (None: never). Computed with
+        chain_dp.sensitivity over the resources the schedule uses, least
+        stable first, so the top entries are the benchmarks to re-measure.
+        """
+        times = self.get_execution_times(machine, application)
+        backends, core_types = self.get_machine_resources(machine, application)
+        stages, resources, cost = chain_dp.normalize(times, backends, core_types)
+        used = [r for r in resources if any(result['pipeline'][s][:2] == r for s in stages)]
+        cost = [[row[resources.index(r)] for r in used] for row in cost]
+        assignment = [used.index(result['pipeline'][s][:2]) for s in stages]
+        margins = chain_dp.sensitivity(cost, assignment, self.objective)
+        entries = []
+        for i, s in enumerate(stages):
+            for k, (b, c) in enumerate(used):
+                if margins[i][k] is None:
+                    continue
+                faster, slower = margins[i][k]
+                entries.append({
+                    "stage": s,
+                    "hardware": self.hardware_of(b, c),
+                    "time_ms": cost[i][k],
+                    "in_schedule": assignment[i] == k,
+                    "faster_ms": None if faster == math.inf else round(faster, 6),
+                    "slower_ms": None if slower == math.inf else round(slower, 6)
+                })
+        return sorted(entries, key=lambda e: min(m for m in (e["faster_ms"], e["slower_ms"], math.inf)
+                                                 if m is not None))
+
+    def unsat_core(self, times: Dict, backends: List[str], core_types: List[str],
+                   encoding: str = None, excluded: set = frozenset()) -> List[str]:
+        """Minimal conflicting constraint groups of an infeasible instance (see PipelineModel.unsat_core)."""
+        model = PipelineModel(sorted(times.keys()), backends, core_types, encoding or self.encoding, track=True,
+                              require_all=not self.optional_resources)
+        return model.unsat_core(times, excluded)
 
     def build_schedule(self, device: str, application: str, result: Dict) -> Dict:
         """
@@ -189,6 +1129,7 @@ class PipelineOptimizer:
                 "name": "chunk1",
                 "hardware": "big" or "gpu" or "medium" or "little",
                 "threads": <number>,
+                "affinity": [core IDs to pin the threads to],
                 "stages": [stage numbers]
               },
               ...
@@ -197,6 +1138,11 @@ class PipelineOptimizer:
           "total_time": <total_time>,
           "max_chunk_time": <max_chunk_time>
         }
+
+        affinity comes from the device registry and never overlaps between
+        chunks (they run concurrently); it is [] for GPU chunks, for devices
+        missing from the registry and for clusters whose core IDs were only
+        inferred from the benchmarks.
         """
         pipeline = result["pipeline"]
         sorted_stages = sorted(pipeline.keys())
@@ -231,21 +1177,23 @@ class PipelineOptimizer:
         
         chunks = []
         chunk_index = 1
+        placements = []
         for (resource, group_time, stage_list) in grouped_pipeline:
             backend, core = resource
-            if backend in ['CUDA', 'VK']:
-                hardware = "gpu"
-            else:
-                hardware = core  # e.g. "big", "medium", "little"
-            threads = thread_mapping.get(hardware, 0)
+            hardware = self.hardware_of(backend, core)
+            threads = result.get('threads', {}).get(core, thread_mapping.get(hardware, 0))
             chunk = {
                 "name": f"chunk{chunk_index}",
                 "hardware": hardware,
                 "threads": threads,
+                "affinity": [],
                 "stages": stage_list
             }
             chunks.append(chunk)
+            placements.append((hardware, threads))
             chunk_index += 1
+        for chunk, mask in zip(chunks, self.devices.affinity(device, placements)):
+            chunk["affinity"] = mask
 
         schedule_dict = {
             "schedule": {
@@ -258,12 +1206,11 @@ class PipelineOptimizer:
         }
         return schedule_dict
 
-    def collect_and_save_all_schedules(self):
-        """Collect schedules for all device-application combinations and save to a single JSON file."""
-        all_schedules = []
+    def list_pairs(self) -> List[Tuple[str, str]]:
+        """All (machine, application) pairs in the database, in output order."""
+        pairs = []
         self.cursor.execute("SELECT DISTINCT machine_name FROM benchmark_result")
         machines = [row[0] for row in self.cursor.fetchall()]
-        
         for machine in sorted(machines):
             self.cursor.execute(
                 "SELECT DISTINCT application FROM benchmark_result WHERE machine_name = ?",
@@ -271,20 +1218,362 @@ class PipelineOptimizer:
             )
             applications = [row[0] for row in self.cursor.fetchall()]
             for app in sorted(applications):
-                result = self.optimize_pipeline(machine, app)
-                if result:
-                    schedule_dict = self.build_schedule(machine, app, result)
-                    all_schedules.append(schedule_dict)
-        with open("all_schedules.json", "w") as f:
+                pairs.append((machine, app))
+        return pairs
+
+    def load_hints(self, path: str) -> Dict[Tuple[str, str], Dict]:
+        """Previously published schedules keyed by (device, application), for warm starts."""
+        if not path or not os.path.exists(path):
+            return {}
+        with open(path) as f:
+            return {schedule_io.schedule_key(schedule_dict): schedule_dict for schedule_dict in json.load(f)}
+
+    def _solve_pairs(self, pairs: List[Tuple[str, str]], hints: Dict, stats: Dict, metrics: List = None,
+                     baseline: bool = False):
+        """
+        Solve each pair and yield (machine, application, schedule dict), accumulating run statistics.
+        With metrics set, each pair's result['stats'] (plus schedule_ms) is appended to it. With
+        baseline set, hinted pairs are also solved cold to measure the warm-start speed-up.
+        """
+        for machine, app in pairs:
+            with profiling.span('pair', machine=machine, application=app):
+                schedule_dict = self._solve_pair(machine, app, hints, stats, metrics, baseline)
+            if schedule_dict:
+                yield machine, app, schedule_dict
+
+    def _solve_pair(self, machine: str, app: str, hints: Dict, stats: Dict, metrics: List,
+                    baseline: bool = False) -> Dict:
+        """Solve one pair, add its figures to the run statistics and return its schedule dict."""
+        result = self.optimize_pipeline(machine, app, hint=hints.get((machine, app)))
+        if not result:
+            core = self.unsat_cores.get((machine, app))
+            if core:
+                stats['infeasible'] += 1
+                print(f"No schedule for {machine}/{app}, conflicting constraints: {'; '.join(core)}")
+            return None
+        relaxed = result.get('relaxed')
+        if relaxed:
+            stats['relaxed'] += 1
+            print(f"Relaxed {machine}/{app}: dropped {', '.join(relaxed['dropped'])} "
+                  f"(conflicting constraints: {'; '.join(relaxed['unsat_cores'][0])})")
+        for key, value in result['pruning'].items():
+            stats[key] += value
+        stats['solve_ms'] += result['solve_ms']
+        bisection = result.get('bisection')
+        if bisection:
+            stats['checks'] += bisection['iterations']
+            stats['check_ms'] += sum(bisection['check_ms'])
+        search = result.get('heuristic')
+        if search:
+            stats['heuristic_pairs'] += 1
+            stats['max_heuristic_gap'] = max(stats['max_heuristic_gap'], search['gap'])
+        quantization = result.get('quantization')
+        if quantization:
+            stats['max_objective_error'] = max(stats['max_objective_error'], quantization['objective_error'])
+            stats['max_gap_bound'] = max(stats['max_gap_bound'], quantization['optimality_gap_bound'])
+        warm_start = result.get('warm_start')
+        if warm_start:
+            stats['hints'] += 1
+            stats['hints_feasible'] += warm_start['feasible']
+            stats['hints_proved_optimal'] += warm_start['proved_optimal']
+            stats['warm_solve_ms'] += result['solve_ms']
+            if baseline:
+                cold = self.optimize_pipeline(machine, app)
+                if cold:
+                    stats['baseline_pairs'] += 1
+                    stats['baseline_warm_ms'] += result['solve_ms']
+                    stats['baseline_cold_ms'] += cold['solve_ms']
+        with phase(result['stats'], 'schedule'):
+            schedule_dict = self.build_schedule(machine, app, result)
+        if self.sensitivity:
+            with phase(result['stats'], 'sensitivity'):
+                schedule_dict["sensitivity"] = self.sensitivity_margins(machine, app, result)
+        if metrics is not None:
+            metrics.append({'machine': machine, 'application': app, **result['stats']})
+        return schedule_dict
+
+    def _print_stats(self, stats: Dict):
+        print(f"Solver time: {stats['solve_ms']:.1f} ms")
+        if stats['checks']:
+            print(f"Bisection: {stats['checks']} satisfiability checks, "
+                  f"{stats['check_ms'] / stats['checks']:.2f} ms per check")
+        if stats['heuristic_pairs']:
+            print(f"Heuristic: {stats['heuristic_pairs']} pairs, worst gap to the lower bound "
+                  f"{stats['max_heuristic_gap']:.1%}")
+        if self.time_scale:
+            print(f"Quantized to 1/{self.time_scale} ms: objective off by at most "
+                  f"{stats['max_objective_error']:.3g} ms in the model, "
+                  f"optimum within {stats['max_gap_bound']:.3g} ms of the unquantized one")
+        if self.prune:
+            print(f"Pruned {stats['pruned']} of {stats['options']} resource options "
+                  f"({stats['raw_rows']} benchmark rows before thread-count dominance)")
+        if stats['infeasible'] and not self.relax:
+            print(f"{stats['infeasible']} infeasible pairs skipped; --relax drops unusable resources instead")
+        if stats['hints']:
+            print(f"Warm start: {stats['hints_feasible']} of {stats['hints']} hints still feasible, "
+                  f"{stats['hints_proved_optimal']} proven optimal without optimization "
+                  f"({stats['warm_solve_ms']:.1f} ms for hinted pairs)")
+            if stats['baseline_pairs']:
+                print(f"Warm-start speed-up: {stats['baseline_cold_ms'] / max(stats['baseline_warm_ms'], 1e-9):.2f}x "
+                      f"({stats['baseline_cold_ms']:.1f} ms cold vs {stats['baseline_warm_ms']:.1f} ms warm "
+                      f"over {stats['baseline_pairs']} pairs)")
+            else:
+                print("Warm-start speed-up not measured; --warm-start-baseline also solves hinted pairs cold")
+
+    @staticmethod
+    def write_metrics(path: str, metrics: List[Dict], output_ms: float):
+        """Write per-pair instrumentation to a JSON sidecar, slowest pairs first in 'slowest'."""
+        phases = sorted({key for record in metrics for key in record if key.endswith('_ms')})
+        totals = {key: sum(record.get(key, 0.0) for record in metrics) for key in phases}
+        totals['output_ms'] = output_ms
+        slowest = sorted(metrics, key=lambda r: -sum(r.get(key, 0.0) for key in phases))
+        with open(path, "w") as f:
+            json.dump({
+                "pairs": metrics,
+                "totals": totals,
+                "slowest": [[r['machine'], r['application']] for r in slowest]
+            }, f, indent=2)
+
+    def benchmark_digest(self) -> str:
+        """SHA-1 of the benchmark_result rows, identifying the timing data a schedule was solved from."""
+        digest = hashlib.sha1()
+        self.cursor.execute("""
+            SELECT machine_name, application, backend, stage, core_type, num_threads, time_ms
+            FROM benchmark_result
+            ORDER BY machine_name, application, backend, stage, core_type, num_threads, time_ms
+        """)
+        for row in self.cursor.fetchall():
+            digest.update(repr(row).encode())
+        return digest.hexdigest()
+
+    def run_options(self) -> Dict:
+        """Everything that decides the published schedules, recorded in stream headers."""
+        registry = json.dumps(self.devices.devices, sort_keys=True).encode()
+        return {
+            'objective': self.objective,
+            'engine': self.engine,
+            'encoding': self.encoding,
+            'time_scale': self.time_scale,
+            'prune': self.prune,
+            'relax': self.relax,
+            'optional_resources': self.optional_resources,
+            'chunk_penalty': self.chunk_penalty,
+            'max_chunks': self.max_chunks,
+            'split_clusters': self.split_clusters,
+            'sensitivity': self.sensitivity,
+            'devices': hashlib.sha1(registry).hexdigest(),
+            'benchmarks': self.benchmark_digest()
+        }
+
+    def collect_and_save_all_schedules(self, output_file: str = "all_schedules.json",
+                                       stream_file: str = None, warm_start_file: str = None,
+                                       metrics_file: str = None, warm_start_baseline: bool = False):
+        """
+        Collect schedules for all device-application combinations and save to a single JSON file.
+
+        With stream_file set, each schedule is appended to that JSON Lines file as
+        soon as it is solved, and the stream is compacted into output_file at the
+        end and then retired. A stream left by an interrupted run is resumed
+        (its pairs are skipped) only if its header matches run_options();
+        otherwise it is set aside and the run starts over.
+
+        With warm_start_file set (typically the previous output_file), each pair is
+        warm-started from its previously published schedule; with
+        warm_start_baseline, hinted pairs are solved cold as well and the
+        speed-up is reported.
+
+        With metrics_file set, per-pair phase timings, model sizes and Z3
+        statistics are written there as JSON (see write_metrics).
+        """
+        hints = self.load_hints(warm_start_file)
+        stats = defaultdict(int)
+        metrics = [] if metrics_file else None
+        output = {}
+        if stream_file:
+            done, restarted = schedule_io.prepare_stream(stream_file, self.run_options())
+            if restarted:
+                print(f"{stream_file} was written with other options or benchmark data; "
+                      f"moved it to {stream_file}.stale and started a new stream")
+            pairs = [pair for pair in self.list_pairs() if pair not in done]
+            with schedule_io.ScheduleStreamWriter(stream_file) as writer:
+                for _, _, schedule_dict in self._solve_pairs(pairs, hints, stats, metrics, warm_start_baseline):
+                    with phase(output, 'output'):
+                        writer.write(schedule_dict)
+            with phase(output, 'output'):
+                count, dropped = schedule_io.compact_schedule_stream(stream_file, output_file, replaced=set(pairs))
+            schedule_io.retire_stream(stream_file)
+            print(f"Compacted {count} schedules from {stream_file} into {output_file} "
+                  f"(stream moved to {stream_file}.done)")
+            if dropped:
+                print(f"Dropped {len(dropped)} stale schedules of pairs that are now infeasible: "
+                      f"{', '.join(f'{m}/{a}' for m, a in dropped)}")
+        else:
+            all_schedules = [schedule_dict for _, _, schedule_dict
+                             in self._solve_pairs(self.list_pairs(), hints, stats, metrics, warm_start_baseline)]
+            with phase(output, 'output', path=output_file):
+                with open(output_file, "w") as f:
+                    json.dump(all_schedules, f, indent=2)
+            print(f"Saved the combination in file {output_file}")
+        self._print_stats(stats)
+        if metrics_file:
+            self.write_metrics(metrics_file, metrics, output.get('output_ms', 0.0))
+            print(f"Wrote instrumentation for {len(metrics)} pairs to {metrics_file}")
+
+    def pin_jointly(self, machine: str, schedules: List[Dict]):
+        """
+        Re-assign the affinity of schedules that run at the same time on one
+        machine, so that chunks of different schedules on the same cluster get
+        disjoint cores as long as the cluster has enough of them.
+        """
+        chunks = [chunk for schedule_dict in schedules for chunk in schedule_dict["schedule"]["chunks"]]
+        masks = self.devices.affinity(machine, [(chunk["hardware"], chunk["threads"]) for chunk in chunks])
+        for chunk, mask in zip(chunks, masks):
+            chunk["affinity"] = mask
+
+    def collect_and_save_coschedules(self, targets: Dict[str, float], output_file: str = "coschedules.json",
+                                     disjoint: bool = False):
+        """
+        Co-schedule the applications in targets on every machine that has
+        benchmarks for all of them (see coschedule) and save the schedules,
+        one per (machine, application), to a single JSON file. Each schedule
+        carries its 'coschedule' rate and resource budget; core affinity is
+        assigned across all applications of a machine (see pin_jointly).
+        """
+        pairs = set(self.list_pairs())
+        machines = sorted({m for m, _ in pairs if all((m, a) in pairs for a in targets)})
+        all_schedules = []
+        for machine in machines:
+            results = self.coschedule(machine, targets, disjoint)
+            if results is None:
+                print(f"No joint schedule found for {machine}")
+                continue
+            scale = next(iter(results.values()))['coschedule']['scale']
+            rates = ", ".join(f"{a} {r['coschedule']['rate']:.1f}/s" for a, r in results.items())
+            print(f"{machine}: {scale:.2f}x the target rates ({rates})")
+            machine_schedules = []
+            for application, result in results.items():
+                schedule_dict = self.build_schedule(machine, application, result)
+                schedule_dict["coschedule"] = result['coschedule']
+                machine_schedules.append(schedule_dict)
+            self.pin_jointly(machine, machine_schedules)
+            all_schedules.extend(machine_schedules)
+        with open(output_file, "w") as f:
             json.dump(all_schedules, f, indent=2)
-        print("Saved the combination in file all_schedules.json")
+        print(f"Saved {len(all_schedules)} co-scheduled schedules in file {output_file}")
 
     def __del__(self):
         self.conn.close()
 
 def main():
-    optimizer = PipelineOptimizer()
-    optimizer.collect_and_save_all_schedules()
+    parser = argparse.ArgumentParser(description="Compute optimal pipeline schedules for every device and application.")
+    parser.add_argument("--db", default="benchmark_results.db")
+    parser.add_argument("--output", default="all_schedules.json")
+    parser.add_argument("--stream", metavar="JSONL",
+                        help="append schedules to this JSON Lines file as they are solved and resume from it")
+    parser.add_argument("--store", action="store_true",
+                        help="also index the schedules in the 'schedules' table of the database")
+    parser.add_argument("--devices", default=DEFAULT_REGISTRY, metavar="JSON",
+                        help="device topology registry (see device_registry.py)")
+    parser.add_argument("--metrics", metavar="JSON",
+                        help="write per-pair phase timings and Z3 statistics to this sidecar file")
+    parser.add_argument("--trace", metavar="JSON",
+                        help="write a Chrome trace-event file of the run's phases (chrome://tracing, Perfetto)")
+    parser.add_argument("--folded", metavar="TXT",
+                        help="write the run's phases as folded stacks for flamegraph.pl")
+    parser.add_argument("--encoding", choices=CONTIGUITY_ENCODINGS, default='pairwise',
+                        help="contiguity constraint encoding")
+    parser.add_argument("--objective", choices=OBJECTIVES, default='total_time',
+                        help="quantity to minimize")
+    parser.add_argument("--engine", choices=ENGINES, default='optimize',
+                        help="'bisect' binary-searches max_chunk_time with plain satisfiability checks; "
+                             "'heuristic' runs greedy + local search (fast, reports its gap to a lower bound)")
+    parser.add_argument("--time-unit", choices=sorted(TIME_UNITS),
+                        help="quantize timings to integer microseconds or nanoseconds (Int arithmetic)")
+    parser.add_argument("--prune", action="store_true",
+                        help="drop resource options that cannot be part of an optimal schedule")
+    parser.add_argument("--optional-resources", action="store_true",
+                        help="allow resources to stay unused instead of forcing one chunk per resource")
+    parser.add_argument("--chunk-penalty", type=float, default=0.0, metavar="MS",
+                        help="handoff cost added to the objective per chunk (implies --optional-resources)")
+    parser.add_argument("--max-chunks", type=int, metavar="N",
+                        help="use at most N chunks, like max_blocks in legacy/basic_allocator.py "
+                             "(implies --optional-resources)")
+    parser.add_argument("--split-clusters", action="store_true",
+                        help="let a CPU cluster's cores host several concurrent chunks (e.g. 2+2 little cores)")
+    parser.add_argument("--coschedule", nargs="+", metavar="APP=RATE",
+                        help="jointly schedule these applications running concurrently on each machine, "
+                             "maximizing throughput at the given relative rates (e.g. CifarDense=30 Tree=10)")
+    parser.add_argument("--disjoint", action="store_true",
+                        help="with --coschedule, give every resource to at most one application")
+    parser.add_argument("--sensitivity", action="store_true",
+                        help="report how far each stage timing may move before the optimum changes")
+    parser.add_argument("--relax", action="store_true",
+                        help="drop resources that make a pair infeasible instead of skipping the pair")
+    parser.add_argument("--incremental", action="store_true",
+                        help="reuse one structural model per stage/resource set across applications; "
+                             "only pays off with --encoding prefix (slower with the default pairwise encoding)")
+    parser.add_argument("--warm-start", nargs="?", const="", metavar="JSON",
+                        help="warm-start from previously published schedules (default: the --output file)")
+    parser.add_argument("--warm-start-baseline", action="store_true",
+                        help="with --warm-start, also solve hinted pairs cold and report the speed-up")
+    args = parser.parse_args()
+    if args.engine == 'bisect' and args.objective != 'max_chunk_time':
+        parser.error("--engine bisect requires --objective max_chunk_time")
+    if args.engine == 'bisect' and args.split_clusters:
+        parser.error("--engine bisect does not support --split-clusters")
+    if args.engine == 'bisect' and args.chunk_penalty:
+        parser.error("--engine bisect does not support --chunk-penalty")
+    if args.engine == 'heuristic' and (args.split_clusters or args.optional_resources or args.chunk_penalty
+                                       or args.max_chunks is not None):
+        parser.error("--engine heuristic only supports the default model")
+
+    targets = {}
+    for item in args.coschedule or []:
+        application, _, rate = item.partition("=")
+        try:
+            targets[application] = float(rate or 1.0)
+        except ValueError:
+            parser.error(f"--coschedule expects APP=RATE, got {item}")
+        if targets[application] <= 0:
+            parser.error(f"--coschedule rates must be positive, got {item}")
+    if args.sensitivity and (args.split_clusters or args.optional_resources or args.chunk_penalty
+                             or args.max_chunks is not None):
+        parser.error("--sensitivity only supports the default model")
+    if args.disjoint and not targets:
+        parser.error("--disjoint requires --coschedule")
+    if args.warm_start_baseline and args.warm_start is None:
+        parser.error("--warm-start-baseline requires --warm-start")
+
+    optimizer = PipelineOptimizer(args.db, encoding=args.encoding, prune=args.prune,
+                                  incremental=args.incremental, objective=args.objective,
+                                  engine=args.engine, time_unit=args.time_unit, relax=args.relax,
+                                  optional_resources=args.optional_resources, chunk_penalty=args.chunk_penalty,
+                                  max_chunks=args.max_chunks, split_clusters=args.split_clusters,
+                                  devices=args.devices, sensitivity=args.sensitivity)
+    warm_start_file = None
+    if args.warm_start is not None:
+        warm_start_file = args.warm_start or args.output
+    recorder = profiling.register(profiling.SpanRecorder()) if args.trace or args.folded else None
+    with profiling.span('run'):
+        if targets:
+            optimizer.collect_and_save_coschedules(targets, args.output, args.disjoint)
+        else:
+            optimizer.collect_and_save_all_schedules(args.output, stream_file=args.stream,
+                                                     warm_start_file=warm_start_file, metrics_file=args.metrics,
+                                                     warm_start_baseline=args.warm_start_baseline)
+    if recorder:
+        profiling.unregister(recorder)
+        if args.trace:
+            recorder.write_chrome_trace(args.trace)
+            print(f"Wrote trace of {len(recorder.events)} spans to {args.trace}")
+        if args.folded:
+            recorder.write_folded(args.folded)
+            print(f"Wrote folded stacks to {args.folded}")
+    if args.store:
+        store = ScheduleStore(args.db)
+        count = store.import_json(args.output, args.objective)
+        store.close()
+        print(f"Indexed {count} schedules in {args.db}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,220 @@
+import itertools
+import math
+from typing import Dict, List, Optional, Sequence, Tuple
+
+GPU_BACKENDS = ['CUDA', 'VK']
+OBJECTIVES = ['total_time', 'max_chunk_time']
+EPSILON = 1e-9
+
+Resource = Tuple[str, Optional[str]]
+
+
+def normalize(times: Dict, backends: List[str], core_types: List[str]) -> Tuple[List[int], List[Resource], List[List[float]]]:
+    """
+    Flatten get_execution_times output into (stages, resources, cost) where
+    cost[i][k] is the time of stages[i] on resources[k] and math.inf marks a
+    missing timing. Resources are (backend, core_type) with core_type None
+    for GPU backends, in the same order optimize_pipeline declares them.
+    """
+    stages = sorted(times.keys())
+    resources = []
+    for b in backends:
+        if b in GPU_BACKENDS:
+            resources.append((b, None))
+        else:
+            resources.extend((b, c) for c in core_types)
+    cost = []
+    for s in stages:
+        row = []
+        for b, c in resources:
+            entry = times[s].get(b) if c is None else times[s].get(b, {}).get(c)
+            row.append(float(entry) if isinstance(entry, (int, float)) else math.inf)
+        cost.append(row)
+    return stages, resources, cost
+
+
+def chunk_value(chunk_times: Sequence[float], objective: str) -> float:
+    return max(chunk_times) if objective == 'max_chunk_time' else sum(chunk_times)
+
+
+def evaluate(cost: List[List[float]], assignment: Sequence[int], objective: str = 'total_time') -> float:
+    """Objective of a per-stage resource assignment (consecutive equal resources form a chunk)."""
+    chunk_times = []
+    previous = None
+    for i, k in enumerate(assignment):
+        if k != previous:
+            chunk_times.append(0.0)
+            previous = k
+        chunk_times[-1] += cost[i][k]
+    return chunk_value(chunk_times, objective) if chunk_times else 0.0
+
+
+def solve_order(cost: List[List[float]], order: Sequence[int],
+                objective: str = 'total_time') -> Tuple[float, Optional[List[int]]]:
+    """
+    Best split of the stage chain into len(order) non-empty contiguous blocks,
+    block k running on resource order[k]. Returns (value, assignment) or
+    (inf, None) when no split is feasible.
+    """
+    n, m = len(cost), len(order)
+    if m == 0 or n < m:
+        return math.inf, None
+    inf = math.inf
+    dp = [[inf] * (n + 1) for _ in range(m)]
+    back = [[-1] * (n + 1) for _ in range(m)]
+    for k, r in enumerate(order):
+        # Missing timings count as 0 in the prefix sums; blocks never span them.
+        prefix = [0.0]
+        missing = [0]
+        for i in range(n):
+            prefix.append(prefix[-1] + (cost[i][r] if cost[i][r] < inf else 0.0))
+            missing.append(missing[-1] + (cost[i][r] == inf))
+        if k == 0:
+            for i in range(1, n - m + 2):
+                dp[0][i] = prefix[i] if missing[i] == 0 else inf
+            continue
+        if objective == 'max_chunk_time':
+            for i in range(k + 1, n - m + k + 2):
+                best, arg = inf, -1
+                for j in range(i - 1, k - 1, -1):
+                    if cost[j][r] == inf:
+                        break
+                    value = max(dp[k - 1][j], prefix[i] - prefix[j])
+                    if value < best:
+                        best, arg = value, j
+                dp[k][i], back[k][i] = best, arg
+        else:
+            best, arg = inf, -1
+            for i in range(k + 1, n - m + k + 2):
+                j = i - 1
+                if dp[k - 1][j] < inf and cost[j][r] < inf:
+                    candidate = dp[k - 1][j] - prefix[j]
+                    if candidate < best:
+                        best, arg = candidate, j
+                if cost[i - 1][r] == inf:
+                    best, arg = inf, -1
+                    continue
+                if best < inf:
+                    dp[k][i], back[k][i] = prefix[i] + best, arg
+    if dp[m - 1][n] == inf:
+        return inf, None
+    assignment = [0] * n
+    i = n
+    for k in range(m - 1, -1, -1):
+        j = back[k][i] if k > 0 else 0
+        for t in range(j, i):
+            assignment[t] = order[k]
+        i = j
+    return dp[m - 1][n], assignment
+
+
+def solve_exact(cost: List[List[float]], objective: str = 'total_time',
+                max_orders: Optional[int] = None) -> Tuple[float, Optional[List[int]], bool]:
+    """
+    Optimum of the optimize_pipeline model (every resource used, each in one
+    contiguous block) by trying every resource order. Returns
+    (value, assignment, exhaustive); exhaustive is False when max_orders cut
+    the enumeration short, in which case value is only an upper bound.
+    """
+    resources = range(len(cost[0])) if cost else range(0)
+    best_value, best_assignment = math.inf, None
+    exhaustive = True
+    for count, order in enumerate(itertools.permutations(resources)):
+        if max_orders is not None and count >= max_orders:
+            exhaustive = False
+            break
+        value, assignment = solve_order(cost, order, objective)
+        if value < best_value - EPSILON:
+            best_value, best_assignment = value, assignment
+    return best_value, best_assignment, exhaustive
+
+
+def lower_bound(cost: List[List[float]], objective: str = 'total_time') -> float:
+    """Relaxation ignoring the block structure: every stage on its fastest resource."""
+    fastest = [min(row) for row in cost]
+    if not fastest:
+        return 0.0
+    return max(fastest) if objective == 'max_chunk_time' else sum(fastest)
+
+
+def dominated_options(cost: List[List[float]], upper: float,
+                      objective: str = 'total_time') -> List[Tuple[int, int]]:
+    """
+    (stage index, resource index) options that cannot appear in any schedule
+    whose objective is <= upper:
+      total_time      lower_bound + (cost - fastest cost of the stage) > upper
+      max_chunk_time  the option alone already exceeds upper
+    Missing timings (inf) are always reported.
+    """
+    pruned = []
+    lb = lower_bound(cost, objective)
+    for i, row in enumerate(cost):
+        fastest = min(row)
+        for k, value in enumerate(row):
+            if value == math.inf:
+                pruned.append((i, k))
+            elif objective == 'max_chunk_time':
+                if value > upper + EPSILON:
+                    pruned.append((i, k))
+            elif lb + (value - fastest) > upper + EPSILON:
+                pruned.append((i, k))
+    return pruned
+
+
+def _flip_margin(cost: List[List[float]], assignment: Sequence[int], i: int, k: int,
+                 limit: float, sign: int, objective: str, precision: float) -> float:
+    """Smallest change sign * delta (0 < delta <= limit) of cost[i][k] at which assignment stops being optimal."""
+    def flips(delta):
+        perturbed = [list(row) for row in cost]
+        perturbed[i][k] += sign * delta
+        return solve_exact(perturbed, objective)[0] < evaluate(perturbed, assignment, objective) - EPSILON
+    if not flips(limit):
+        return math.inf
+    lo, hi = 0.0, limit
+    while hi - lo > precision:
+        mid = (lo + hi) / 2
+        if flips(mid):
+            hi = mid
+        else:
+            lo = mid
+    return hi
+
+
+def sensitivity(cost: List[List[float]], assignment: Sequence[int], objective: str = 'total_time',
+                precision: float = 1e-6) -> List[List[Optional[Tuple[float, float]]]]:
+    """
+    Stability margins of an optimal assignment: margins[i][k] is (faster,
+    slower), how many ms cost[i][k] alone may drop or grow before another
+    assignment becomes strictly better (math.inf: never, None: no timing).
+
+    For total_time every assignment's value moves by exactly the change
+    when it uses (i, k) and not at all otherwise, so the margins are gaps
+    to the best assignment forced off (i, k) (if used) or onto it (if not):
+    one DP per option. For max_chunk_time the value is not linear in the
+    change and each margin is bisected to precision with DP checks.
+    """
+    base = evaluate(cost, assignment, objective)
+    upper = sum(value for row in cost for value in row if value < math.inf)
+    margins = []
+    for i, row in enumerate(cost):
+        margins.append([])
+        for k, value in enumerate(row):
+            if value == math.inf:
+                margins[i].append(None)
+                continue
+            if objective == 'max_chunk_time':
+                faster = _flip_margin(cost, assignment, i, k, value, -1, objective, precision)
+                slower = _flip_margin(cost, assignment, i, k, upper, 1, objective, precision)
+            else:
+                forced = [list(r) for r in cost]
+                if assignment[i] == k:
+                    forced[i][k] = math.inf
+                else:
+                    forced[i] = [v if j == k else math.inf for j, v in enumerate(row)]
+                gap = max(solve_exact(forced, objective)[0] - base, 0.0)
+                faster, slower = (math.inf, gap) if assignment[i] == k else (gap, math.inf)
+                # A timing cannot drop below zero.
+                if faster >= value:
+                    faster = math.inf
+            margins[i].append((faster, slower))
+    return margins
@@ -0,0 +1,214 @@
+import argparse
+import json
+import os
+import sqlite3
+from collections import defaultdict
+from typing import Dict, List
+
+import numpy as np
+
+from schedule_io import split_schedule_id
+
+FORMAT_VERSION = 2
+MANIFEST_NAME = "manifest.json"
+
+
+def _encode(values: List, dictionary: List[str]) -> np.ndarray:
+    """Dictionary-encode a list of strings; None becomes -1."""
+    index = {v: i for i, v in enumerate(dictionary)}
+    return np.array([index[v] if v is not None else -1 for v in values], dtype=np.int32)
+
+
+def _build_dictionary(*columns: List) -> List[str]:
+    return sorted({v for col in columns for v in col if v is not None})
+
+
+def _benchmark_columns(db_name: str) -> Dict[str, List]:
+    conn = sqlite3.connect(db_name)
+    rows = conn.execute("""
+        SELECT machine_name, application, backend, stage, core_type, num_threads, time_ms
+        FROM benchmark_result
+        ORDER BY machine_name, application, stage, backend, core_type, num_threads
+    """).fetchall()
+    conn.close()
+    names = ["machine", "application", "backend", "stage", "core_type", "num_threads", "time_ms"]
+    return {name: [row[i] for row in rows] for i, name in enumerate(names)}
+
+
+def _schedule_columns(schedules: List[Dict]) -> Dict[str, List]:
+    cols = defaultdict(list)
+    chunk_offset = 0
+    stage_offset = 0
+    affinity_offset = 0
+    for entry in schedules:
+        sched = entry["schedule"]
+        device = sched["device_id"]
+        cols["sched_machine"].append(device)
+        cols["sched_application"].append(split_schedule_id(sched["schedule_id"], device))
+        cols["sched_total_time"].append(entry["total_time"])
+        cols["sched_max_chunk_time"].append(entry["max_chunk_time"])
+        cols["sched_chunk_offset"].append(chunk_offset)
+        for chunk in sched["chunks"]:
+            cols["chunk_hardware"].append(chunk["hardware"])
+            cols["chunk_threads"].append(chunk["threads"])
+            cols["chunk_stage_offset"].append(stage_offset)
+            cols["chunk_affinity_offset"].append(affinity_offset)
+            cols["stages"].extend(chunk["stages"])
+            cols["affinity"].extend(chunk.get("affinity", []))
+            stage_offset += len(chunk["stages"])
+            affinity_offset += len(chunk.get("affinity", []))
+            chunk_offset += 1
+    cols["sched_chunk_offset"].append(chunk_offset)
+    cols["chunk_stage_offset"].append(stage_offset)
+    cols["chunk_affinity_offset"].append(affinity_offset)
+    return cols
+
+
+def export_columnar(out_dir: str, db_name: str = "benchmark_results.db",
+                    schedules_path: str = "all_schedules.json") -> Dict:
+    """
+    Write benchmark_result and the schedule list as one .npy file per column.
+
+    String columns (machine, application, backend, core_type/hardware) are
+    dictionary-encoded as int32 codes, with the dictionaries kept in the
+    manifest.  Missing values (NULL core_type, NULL num_threads) are stored
+    as -1.  A chunk's stages and pinned cores are slices of the stages and
+    affinity columns, delimited by chunk_stage_offset and
+    chunk_affinity_offset.  Every column can be opened with
+    np.load(mmap_mode='r').
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    bench = _benchmark_columns(db_name)
+    schedules = []
+    if schedules_path and os.path.exists(schedules_path):
+        with open(schedules_path) as f:
+            schedules = json.load(f)
+    sched = _schedule_columns(schedules)
+
+    dictionaries = {
+        "machine": _build_dictionary(bench["machine"], sched["sched_machine"]),
+        "application": _build_dictionary(bench["application"], sched["sched_application"]),
+        "backend": _build_dictionary(bench["backend"]),
+        "core_type": _build_dictionary(bench["core_type"], sched["chunk_hardware"], ["gpu"]),
+    }
+
+    arrays = {
+        "machine": _encode(bench["machine"], dictionaries["machine"]),
+        "application": _encode(bench["application"], dictionaries["application"]),
+        "backend": _encode(bench["backend"], dictionaries["backend"]),
+        "stage": np.array(bench["stage"], dtype=np.int32),
+        "core_type": _encode(bench["core_type"], dictionaries["core_type"]),
+        "num_threads": np.array([-1 if t is None else t for t in bench["num_threads"]], dtype=np.int32),
+        "time_ms": np.array([np.nan if t is None else t for t in bench["time_ms"]], dtype=np.float64),
+        "sched_machine": _encode(sched["sched_machine"], dictionaries["machine"]),
+        "sched_application": _encode(sched["sched_application"], dictionaries["application"]),
+        "sched_total_time": np.array(sched["sched_total_time"], dtype=np.float64),
+        "sched_max_chunk_time": np.array(sched["sched_max_chunk_time"], dtype=np.float64),
+        "sched_chunk_offset": np.array(sched["sched_chunk_offset"], dtype=np.int64),
+        "chunk_hardware": _encode(sched["chunk_hardware"], dictionaries["core_type"]),
+        "chunk_threads": np.array(sched["chunk_threads"], dtype=np.int32),
+        "chunk_stage_offset": np.array(sched["chunk_stage_offset"], dtype=np.int64),
+        "stages": np.array(sched["stages"], dtype=np.int32),
+        "chunk_affinity_offset": np.array(sched["chunk_affinity_offset"], dtype=np.int64),
+        "affinity": np.array(sched["affinity"], dtype=np.int32),
+    }
+    for name, arr in arrays.items():
+        np.save(os.path.join(out_dir, f"{name}.npy"), arr)
+
+    manifest = {
+        "version": FORMAT_VERSION,
+        "dictionaries": dictionaries,
+        "columns": {name: {"dtype": str(arr.dtype), "length": int(arr.shape[0])}
+                    for name, arr in arrays.items()},
+    }
+    with open(os.path.join(out_dir, MANIFEST_NAME), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+class ColumnarDataset:
+    """Columns loaded by load_columnar, memory-mapped unless mmap=False."""
+
+    def __init__(self, manifest: Dict, columns: Dict[str, np.ndarray]):
+        self.manifest = manifest
+        self.dictionaries = manifest["dictionaries"]
+        self.columns = columns
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.columns[name]
+
+    def code(self, dictionary: str, value: str) -> int:
+        """Return the integer code of a value, or -1 if it does not occur."""
+        try:
+            return self.dictionaries[dictionary].index(value)
+        except ValueError:
+            return -1
+
+    def decode(self, dictionary: str, codes) -> List:
+        values = self.dictionaries[dictionary]
+        return [values[c] if c >= 0 else None for c in np.asarray(codes).tolist()]
+
+    def benchmark_mask(self, machine: str, application: str) -> np.ndarray:
+        """Boolean row mask over benchmark columns for one (machine, application)."""
+        return ((self["machine"] == self.code("machine", machine)) &
+                (self["application"] == self.code("application", application)))
+
+    def schedules(self) -> List[Dict]:
+        """Rebuild the all_schedules.json list from the schedule columns."""
+        result = []
+        chunk_offsets = self["sched_chunk_offset"]
+        stage_offsets = self["chunk_stage_offset"]
+        stages = self["stages"]
+        affinity_offsets = self["chunk_affinity_offset"]
+        affinity = self["affinity"]
+        machines = self.decode("machine", self["sched_machine"])
+        applications = self.decode("application", self["sched_application"])
+        hardware = self.decode("core_type", self["chunk_hardware"])
+        for i in range(len(machines)):
+            chunks = []
+            for n, c in enumerate(range(int(chunk_offsets[i]), int(chunk_offsets[i + 1])), start=1):
+                chunks.append({
+                    "name": f"chunk{n}",
+                    "hardware": hardware[c],
+                    "threads": int(self["chunk_threads"][c]),
+                    "affinity": affinity[affinity_offsets[c]:affinity_offsets[c + 1]].tolist(),
+                    "stages": stages[stage_offsets[c]:stage_offsets[c + 1]].tolist()
+                })
+            result.append({
+                "schedule": {
+                    "schedule_id": f"{machines[i]}_{applications[i]}_schedule_001",
+                    "device_id": machines[i],
+                    "chunks": chunks
+                },
+                "total_time": float(self["sched_total_time"][i]),
+                "max_chunk_time": float(self["sched_max_chunk_time"][i])
+            })
+        return result
+
+
+def load_columnar(path: str, mmap: bool = True) -> ColumnarDataset:
+    """Open a directory written by export_columnar."""
+    with open(os.path.join(path, MANIFEST_NAME)) as f:
+        manifest = json.load(f)
+    if manifest.get("version") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported columnar format version: {manifest.get('version')}")
+    mode = "r" if mmap else None
+    columns = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mode)
+               for name in manifest["columns"]}
+    return ColumnarDataset(manifest, columns)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export benchmark data and schedules to columnar .npy files.")
+    parser.add_argument("out_dir")
+    parser.add_argument("--db", default="benchmark_results.db")
+    parser.add_argument("--schedules", default="all_schedules.json")
+    args = parser.parse_args()
+    manifest = export_columnar(args.out_dir, args.db, args.schedules)
+    rows = manifest["columns"]["time_ms"]["length"]
+    scheds = manifest["columns"]["sched_total_time"]["length"]
+    print(f"Exported {rows} benchmark rows and {scheds} schedules to {args.out_dir}")
+
+
+if __name__ == "__main__":
+    main()
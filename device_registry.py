@@ -0,0 +1,222 @@
+import argparse
+import glob
+import json
+import os
+import re
+import sqlite3
+from typing import Dict, List, Optional, Tuple
+
+DEFAULT_REGISTRY = "devices.json"
+# Cluster names from slowest to fastest; core IDs are numbered in this order,
+# as on Android big.LITTLE parts (cpu0.. are the little cores).
+CLUSTER_ORDER = ['little', 'medium', 'big']
+CLUSTER_NAMES = {1: ['big'], 2: ['little', 'big'], 3: ['little', 'medium', 'big']}
+GPU_TYPES = {'VK': 'vulkan', 'CUDA': 'cuda'}
+
+
+class DeviceRegistry:
+    """
+    Device topologies kept in a JSON file, keyed by machine name:
+
+        {"<machine>": {
+            "source": "sysfs" | "benchmark" | "manual",
+            "clusters": {"little": {"core_ids": [0, 1, 2, 3], "max_freq_khz": 1800000}, ...},
+            "gpu": {"type": "vulkan", "memory_mb": null, "cores": [8]}
+        }}
+
+    Clusters marked "inferred": true only know their size; their core IDs are
+    placeholders and are not used as pin targets until a sysfs dump replaces
+    the entry. Adding a device means adding an entry (by hand or with the
+    sysfs/infer commands), not changing code.
+    """
+
+    def __init__(self, path: str = DEFAULT_REGISTRY):
+        self.path = path
+        self.devices = {}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.devices = json.load(f)
+
+    def get(self, machine: str) -> Optional[Dict]:
+        return self.devices.get(machine)
+
+    def put(self, machine: str, topology: Dict):
+        self.devices[machine] = topology
+
+    def save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(dict(sorted(self.devices.items())), f, indent=2)
+            f.write("\n")
+        os.replace(tmp_path, self.path)
+
+    def core_ids(self, machine: str, cluster: str) -> List[int]:
+        topology = self.get(machine)
+        if not topology or cluster not in topology["clusters"]:
+            return []
+        return list(topology["clusters"][cluster]["core_ids"])
+
+    def pin_targets(self, machine: str, cluster: str) -> List[int]:
+        """Core IDs threads may be pinned to: [] for inferred clusters."""
+        topology = self.get(machine)
+        if not topology or topology["clusters"].get(cluster, {}).get("inferred"):
+            return []
+        return self.core_ids(machine, cluster)
+
+    def cluster_cores(self, machine: str) -> Dict[str, int]:
+        """Physical core count per CPU cluster ({} for unknown devices)."""
+        topology = self.get(machine)
+        if not topology:
+            return {}
+        return {cluster: len(info["core_ids"]) for cluster, info in topology["clusters"].items()}
+
+    def affinity(self, machine: str, chunks: List[Tuple[str, int]]) -> List[List[int]]:
+        """
+        Core IDs to pin each chunk to, given (cluster, threads) per chunk. All
+        chunks of a pipeline run concurrently, so chunks on the same cluster get
+        disjoint IDs, handed out in chunk order from the lowest ID. Chunks on a
+        GPU or on an unregistered or inferred cluster get []. IDs are only
+        reused when the chunks ask for more threads than the cluster has cores.
+        """
+        taken = {}
+        masks = []
+        for cluster, threads in chunks:
+            ids = self.pin_targets(machine, cluster)
+            if not ids or not threads:
+                masks.append([])
+                continue
+            start = taken.get(cluster, 0)
+            masks.append(sorted(ids[(start + i) % len(ids)] for i in range(min(threads, len(ids)))))
+            taken[cluster] = start + threads
+        return masks
+
+    def device_configs(self, aliases: Dict[str, str] = None) -> Dict[str, Dict]:
+        """
+        Topologies in the precursor scripts' get_device_configs format,
+        {device: {cluster: {'cores': [...], 'counts': [1..n]}, 'gpu': {...}}},
+        with cluster names renamed through aliases (e.g. {'little': 'small'}).
+        """
+        aliases = aliases or {}
+        configs = {}
+        for machine, topology in self.devices.items():
+            config = {}
+            for cluster, info in sorted(topology["clusters"].items(), key=lambda kv: min(kv[1]["core_ids"])):
+                ids = info["core_ids"]
+                config[aliases.get(cluster, cluster)] = {'cores': ids, 'counts': list(range(1, len(ids) + 1))}
+            if topology.get("gpu"):
+                config['gpu'] = {'cores': topology["gpu"].get("cores", []), 'counts': [1]}
+            configs[machine] = config
+        return configs
+
+
+def _read_int(path: str) -> Optional[int]:
+    try:
+        with open(path) as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return None
+
+
+def topology_from_sysfs(cpu_dir: str, gpu_type: str = None, gpu_memory_mb: int = None) -> Dict:
+    """
+    Topology from a copy of /sys/devices/system/cpu. CPUs are grouped into
+    clusters by cpufreq/cpuinfo_max_freq (falling back to topology/cluster_id)
+    and the groups named little/medium/big from slowest to fastest.
+    """
+    groups = {}
+    for cpu_path in glob.glob(os.path.join(cpu_dir, "cpu[0-9]*")):
+        cpu = int(re.search(r"cpu(\d+)$", cpu_path).group(1))
+        freq = _read_int(os.path.join(cpu_path, "cpufreq", "cpuinfo_max_freq"))
+        key = freq if freq is not None else _read_int(os.path.join(cpu_path, "topology", "cluster_id"))
+        groups.setdefault(key, []).append(cpu)
+    if not groups:
+        raise ValueError(f"No cpuN directories in {cpu_dir}")
+    if len(groups) > len(CLUSTER_NAMES):
+        raise ValueError(f"{len(groups)} CPU clusters in {cpu_dir}; only up to {len(CLUSTER_NAMES)} are named")
+    keys = sorted(groups, key=lambda k: (k is None, k))
+    clusters = {}
+    for name, key in zip(CLUSTER_NAMES[len(keys)], keys):
+        has_freq = key is not None and all(
+            _read_int(os.path.join(cpu_dir, f"cpu{c}", "cpufreq", "cpuinfo_max_freq")) is not None
+            for c in groups[key])
+        clusters[name] = {"core_ids": sorted(groups[key]), "max_freq_khz": key if has_freq else None}
+    topology = {"source": "sysfs", "clusters": clusters}
+    if gpu_type:
+        num_cpus = sum(len(ids) for ids in groups.values())
+        topology["gpu"] = {"type": gpu_type, "memory_mb": gpu_memory_mb, "cores": [num_cpus]}
+    return topology
+
+
+def topology_from_benchmark(db_name: str, machine: str) -> Dict:
+    """
+    Topology inferred from benchmark_result: a cluster per benchmarked core
+    type with as many cores as its largest thread count, and the GPU backend
+    as the GPU type. The database has no core IDs, so the clusters are
+    numbered little-first as placeholders and marked inferred.
+    """
+    conn = sqlite3.connect(db_name)
+    rows = conn.execute("""
+        SELECT core_type, MAX(num_threads)
+        FROM benchmark_result
+        WHERE machine_name = ? AND backend NOT IN ('CUDA', 'VK')
+          AND core_type IS NOT NULL AND core_type != 'None'
+        GROUP BY core_type
+    """, (machine,)).fetchall()
+    backends = [row[0] for row in conn.execute(
+        "SELECT DISTINCT backend FROM benchmark_result WHERE machine_name = ? AND backend IN ('CUDA', 'VK')",
+        (machine,))]
+    conn.close()
+    counts = dict(rows)
+    clusters = {}
+    next_id = 0
+    for name in sorted(counts, key=lambda c: (CLUSTER_ORDER.index(c) if c in CLUSTER_ORDER else len(CLUSTER_ORDER), c)):
+        clusters[name] = {"core_ids": list(range(next_id, next_id + counts[name])), "max_freq_khz": None,
+                          "inferred": True}
+        next_id += counts[name]
+    topology = {"source": "benchmark", "clusters": clusters}
+    if backends:
+        topology["gpu"] = {"type": GPU_TYPES[sorted(backends)[0]], "memory_mb": None, "cores": [next_id]}
+    return topology
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the device topology registry.")
+    parser.add_argument("--registry", default=DEFAULT_REGISTRY)
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("show", help="print the registered devices")
+    infer = sub.add_parser("infer", help="add devices found in the benchmark database")
+    infer.add_argument("--db", default="benchmark_results.db")
+    infer.add_argument("--machine", help="only this machine (default: all)")
+    infer.add_argument("--force", action="store_true", help="overwrite registered devices")
+    sysfs = sub.add_parser("sysfs", help="add a device from a /sys/devices/system/cpu dump")
+    sysfs.add_argument("cpu_dir")
+    sysfs.add_argument("--machine", required=True)
+    sysfs.add_argument("--gpu-type")
+    sysfs.add_argument("--gpu-memory-mb", type=int)
+    args = parser.parse_args()
+
+    registry = DeviceRegistry(args.registry)
+    if args.command == "show":
+        for machine, topology in sorted(registry.devices.items()):
+            clusters = ", ".join(f"{c}={info['core_ids']}{' (inferred)' if info.get('inferred') else ''}"
+                                 for c, info in topology["clusters"].items())
+            gpu = topology.get("gpu", {}).get("type", "none")
+            print(f"{machine}: {clusters}; gpu {gpu} ({topology.get('source')})")
+        return
+    if args.command == "infer":
+        conn = sqlite3.connect(args.db)
+        machines = [args.machine] if args.machine else \
+            [row[0] for row in conn.execute("SELECT DISTINCT machine_name FROM benchmark_result ORDER BY 1")]
+        conn.close()
+        added = [m for m in machines if args.force or registry.get(m) is None]
+        for machine in added:
+            registry.put(machine, topology_from_benchmark(args.db, machine))
+        print(f"Registered {len(added)} devices from {args.db}")
+    else:
+        registry.put(args.machine, topology_from_sysfs(args.cpu_dir, args.gpu_type, args.gpu_memory_mb))
+        print(f"Registered {args.machine} from {args.cpu_dir}")
+    registry.save()
+
+
+if __name__ == "__main__":
+    main()
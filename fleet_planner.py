@@ -0,0 +1,229 @@
+import argparse
+import json
+import time
+from typing import Dict, List, Tuple
+from z3 import And, If, Not, Or, Real, RealVal, Sum, is_true, sat
+
+from device_registry import DEFAULT_REGISTRY, DeviceRegistry
+from timing_cube import TimingCube
+from Z3_Allocator import CONTIGUITY_ENCODINGS, OBJECTIVES, PipelineModel, PipelineOptimizer
+
+# Every (machine, hardware) resource is a core type of this single pseudo-backend.
+FLEET_BACKEND = 'fleet'
+DEFAULT_OUTPUT = "fleet_plan.json"
+
+
+def transfer_ms(latency_ms: float, bandwidth_mbps: float, payload_kb: float) -> float:
+    """Time to send payload_kb kilobytes over a link (1 Mbit/s moves 1 kbit per ms)."""
+    return latency_ms + payload_kb * 8 / bandwidth_mbps
+
+
+class FleetModel(PipelineModel):
+    """
+    One chain-partitioning model over the resources of several machines.
+
+    Each (machine, hardware) pair is a resource "<machine>/<hardware>", so
+    Constraints 1 and 3 apply unchanged; every resource is optional. When
+    consecutive stages run on different machines, the boundary costs a
+    transfer over the link, which counts towards the total time and, as a
+    resource of its own, towards the max chunk time.
+    """
+
+    def __init__(self, stages: List[int], resources: List[Tuple[str, str]], encoding: str = 'pairwise'):
+        self.fleet_resources = resources
+        self.machines = list(dict.fromkeys(m for m, _ in resources))
+        super().__init__(stages, [FLEET_BACKEND], [self.resource_key(m, h) for m, h in resources], encoding,
+                         require_all=False)
+
+    @staticmethod
+    def resource_key(machine: str, hardware: str) -> str:
+        return f"{machine}/{hardware}"
+
+    def _on(self, machine: str, s: int):
+        return Or([self.assign[s][FLEET_BACKEND][self.resource_key(m, h)]
+                   for m, h in self.fleet_resources if m == machine])
+
+    def plan(self, times: Dict, transfers: Dict[int, float], objective: str = 'total_time') -> Dict:
+        """
+        Minimize the objective for combined timings (times[s][FLEET_BACKEND][key])
+        where transfers[s] is the link cost of handing stage s's output to
+        another machine.
+        """
+        if objective not in OBJECTIVES:
+            raise ValueError(f"Unknown objective: {objective}")
+        solver = self.solver
+        self._restrict(times, frozenset())
+        loads = self._resource_loads(times)
+        crossings = {}
+        for s, following in zip(self.stages, self.stages[1:]):
+            crossings[s] = Or([And(self._on(m, s), Not(self._on(m, following))) for m in self.machines])
+        link = Sum([If(moved, transfers[s], 0.0) for s, moved in crossings.items()]) if crossings else RealVal(0)
+
+        total_time = Real('total_time')
+        solver.add(total_time == Sum(list(loads.values())) + link)
+        goal = total_time
+        if objective == 'max_chunk_time':
+            goal = Real('max_chunk_time')
+            for load in list(loads.values()) + [link]:
+                solver.add(goal >= load)
+        solver.minimize(goal)
+        if objective != 'total_time':
+            solver.minimize(total_time)
+        if solver.check() != sat:
+            return None
+
+        model = solver.model()
+        pipeline = {}
+        for (s, b, key), var in self.options():
+            if s not in pipeline and is_true(model.evaluate(var)):
+                machine, hardware = key.split('/', 1)
+                pipeline[s] = (machine, hardware, self._timing(times, s, b, key))
+        return {
+            'pipeline': pipeline,
+            'transfers': {s: transfers[s] for s, moved in crossings.items() if is_true(model.evaluate(moved))},
+            'total_time': self._real_value(model, total_time),
+            'link_time': self._real_value(model, link)
+        }
+
+
+class FleetPlanner:
+    """
+    Partition one application's pipeline across several machines joined by
+    a link with the given latency and bandwidth. payload_kb is the data
+    handed from one stage to the next; payloads overrides it per producing
+    stage.
+
+    Per-device chunks are in the build_schedule format plus their "time".
+    With an optimizer, thread counts come from its get_thread_mapping and
+    affinity from its device registry; otherwise CPU chunks get 1 thread.
+    """
+
+    def __init__(self, cube: TimingCube, latency_ms: float = 1.0, bandwidth_mbps: float = 100.0,
+                 payload_kb: float = 100.0, payloads: Dict[int, float] = None,
+                 objective: str = 'total_time', encoding: str = 'pairwise', optimizer: PipelineOptimizer = None):
+        if bandwidth_mbps <= 0:
+            raise ValueError(f"Bandwidth must be positive, got {bandwidth_mbps}")
+        if objective not in OBJECTIVES:
+            raise ValueError(f"Unknown objective: {objective}")
+        self.cube = cube
+        self.latency_ms = latency_ms
+        self.bandwidth_mbps = bandwidth_mbps
+        self.payload_kb = payload_kb
+        self.payloads = payloads or {}
+        self.objective = objective
+        self.encoding = encoding
+        self.optimizer = optimizer
+        self.registry = optimizer.devices if optimizer else DeviceRegistry(None)
+
+    def plan(self, application: str, machines: List[str]) -> Dict:
+        """Fleet plan with a schedule (chunk list) per machine, or None if infeasible."""
+        times = {}
+        resources = []
+        for machine in machines:
+            stage_times = self.cube.stage_times(machine, application)
+            if not stage_times:
+                raise ValueError(f"No timings for {application} on {machine}")
+            for s, by_hardware in stage_times.items():
+                for hardware, time_val in by_hardware.items():
+                    key = FleetModel.resource_key(machine, hardware)
+                    times.setdefault(s, {}).setdefault(FLEET_BACKEND, {})[key] = time_val
+                    if (machine, hardware) not in resources:
+                        resources.append((machine, hardware))
+        stages = sorted(times)
+        transfers = {s: transfer_ms(self.latency_ms, self.bandwidth_mbps, self.payloads.get(s, self.payload_kb))
+                     for s in stages}
+
+        start = time.perf_counter()
+        result = FleetModel(stages, resources, self.encoding).plan(times, transfers, self.objective)
+        solve_ms = (time.perf_counter() - start) * 1e3
+        if result is None:
+            return None
+
+        chunks = []
+        for s in stages:
+            machine, hardware, time_val = result['pipeline'][s]
+            if chunks and chunks[-1][0] == (machine, hardware):
+                chunks[-1][1].append(s)
+                chunks[-1][2] += time_val
+            else:
+                chunks.append([(machine, hardware), [s], time_val])
+        schedules = []
+        for machine in machines:
+            threads = self.optimizer.get_thread_mapping(machine, application) if self.optimizer else {}
+            device_chunks = [{
+                "name": f"chunk{index}",
+                "hardware": hardware,
+                "threads": threads.get(hardware, 0 if hardware == "gpu" else 1),
+                "affinity": [],
+                "stages": stage_list,
+                "time": chunk_time
+            } for index, ((m, hardware), stage_list, chunk_time) in enumerate(chunks, 1) if m == machine]
+            masks = self.registry.affinity(machine, [(chunk["hardware"], chunk["threads"]) for chunk in device_chunks])
+            for chunk, mask in zip(device_chunks, masks):
+                chunk["affinity"] = mask
+            if device_chunks:
+                schedules.append({
+                    "schedule_id": f"{machine}_{application}_fleet_001",
+                    "device_id": machine,
+                    "chunks": device_chunks
+                })
+        return {
+            "application": application,
+            "machines": machines,
+            "link": {"latency_ms": self.latency_ms, "bandwidth_mbps": self.bandwidth_mbps},
+            "schedules": schedules,
+            "transfers": [{
+                "after_stage": s,
+                "from": result['pipeline'][s][0],
+                "to": result['pipeline'][stages[stages.index(s) + 1]][0],
+                "ms": cost
+            } for s, cost in sorted(result['transfers'].items())],
+            "total_time": result['total_time'],
+            "max_chunk_time": max([c[2] for c in chunks] + [result['link_time']]),
+            "link_time": result['link_time'],
+            "solve_ms": solve_ms
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Partition one pipeline across several machines joined by a link.")
+    parser.add_argument("--db", default="benchmark_results.db")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    parser.add_argument("--application", required=True)
+    parser.add_argument("--machines", nargs="+", required=True)
+    parser.add_argument("--latency-ms", type=float, default=1.0, help="per-transfer link latency")
+    parser.add_argument("--bandwidth-mbps", type=float, default=100.0, help="link bandwidth in Mbit/s")
+    parser.add_argument("--payload-kb", type=float, default=100.0, help="data passed between consecutive stages")
+    parser.add_argument("--payloads", metavar="JSON",
+                        help="per-stage output sizes in KB ({\"<stage>\": kb}), overriding --payload-kb")
+    parser.add_argument("--objective", choices=OBJECTIVES, default='total_time')
+    parser.add_argument("--encoding", choices=CONTIGUITY_ENCODINGS, default='pairwise')
+    parser.add_argument("--devices", default=DEFAULT_REGISTRY, metavar="JSON",
+                        help="device topology registry used for core affinity")
+    args = parser.parse_args()
+    if args.bandwidth_mbps <= 0:
+        parser.error("--bandwidth-mbps must be positive")
+
+    payloads = {}
+    if args.payloads:
+        with open(args.payloads) as f:
+            payloads = {int(s): float(kb) for s, kb in json.load(f).items()}
+    planner = FleetPlanner(TimingCube.load(args.db), args.latency_ms, args.bandwidth_mbps, args.payload_kb,
+                           payloads, args.objective, args.encoding,
+                           PipelineOptimizer(args.db, devices=args.devices))
+    plan = planner.plan(args.application, args.machines)
+    if plan is None:
+        print(f"No feasible plan for {args.application} on {args.machines}")
+        return
+    for schedule in plan["schedules"]:
+        chunks = ", ".join(f"{c['hardware']} {c['stages']}" for c in schedule["chunks"])
+        print(f"{schedule['device_id']}: {chunks}")
+    print(f"{len(plan['transfers'])} transfers ({plan['link_time']:.3f} ms), total {plan['total_time']:.3f} ms, "
+          f"max chunk {plan['max_chunk_time']:.3f} ms, solved in {plan['solve_ms']:.1f} ms")
+    with open(args.output, "w") as f:
+        json.dump(plan, f, indent=2)
+    print(f"Saved the plan in file {args.output}")
+
+
+if __name__ == "__main__":
+    main()
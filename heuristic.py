@@ -0,0 +1,232 @@
+import math
+import random
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import chain_dp
+
+DEFAULT_TIME_LIMIT_MS = 20.0
+DEFAULT_RESTARTS = 8
+# Weight updates tried by weighted_load_bound.
+LOAD_BOUND_ITERATIONS = 30
+
+
+class ChainState:
+    """
+    A chain partition as a resource order plus block boundaries: block j
+    covers stages bounds[j] .. bounds[j+1]-1 on resource order[j].
+
+    Per-resource prefix sums of the timings (missing timings counted
+    separately) give any block's (missing, time) in O(1), so a boundary
+    shift or a resource swap is evaluated from the one or two blocks it
+    changes, independent of the number of stages (max_chunk_time also
+    sorts the m block times). Values compare as (missing timings,
+    objective), which steers the search out of infeasible partitions first.
+    """
+
+    def __init__(self, cost: List[List[float]], objective: str):
+        self.objective = objective
+        self.n = len(cost)
+        self.m = len(cost[0]) if cost else 0
+        self.prefix = []
+        self.missing = []
+        for r in range(self.m):
+            prefix, missing = [0.0], [0]
+            for row in cost:
+                prefix.append(prefix[-1] + (row[r] if row[r] < math.inf else 0.0))
+                missing.append(missing[-1] + (row[r] == math.inf))
+            self.prefix.append(prefix)
+            self.missing.append(missing)
+        self.order = []
+        self.bounds = []
+        self.blocks = []
+
+    def block(self, r: int, i: int, j: int) -> Tuple[int, float]:
+        return self.missing[r][j] - self.missing[r][i], self.prefix[r][j] - self.prefix[r][i]
+
+    def reset(self, order: Sequence[int], bounds: Sequence[int]):
+        self.order = list(order)
+        self.bounds = list(bounds)
+        self.blocks = [self.block(r, bounds[j], bounds[j + 1]) for j, r in enumerate(order)]
+
+    def value(self, changed: Dict[int, Tuple[int, float]] = None) -> Tuple[int, float]:
+        """Value of the current blocks with the blocks in changed replaced."""
+        blocks = self.blocks if not changed else [changed.get(j, b) for j, b in enumerate(self.blocks)]
+        missing = sum(b[0] for b in blocks)
+        if self.objective == 'max_chunk_time':
+            # Ties on the slowest block are broken by the next slowest, so the
+            # search can make progress on plateaus of the max.
+            return (missing,) + tuple(sorted((b[1] for b in blocks), reverse=True))
+        return missing, sum(b[1] for b in blocks)
+
+    def assignment(self) -> List[int]:
+        assignment = [0] * self.n
+        for j, r in enumerate(self.order):
+            for i in range(self.bounds[j], self.bounds[j + 1]):
+                assignment[i] = r
+        return assignment
+
+
+def greedy_start(cost: List[List[float]]) -> Tuple[List[int], List[int]]:
+    """
+    Order resources by the mean position of the stages they are fastest on
+    (a resource that is never fastest goes where it is relatively best),
+    and size each block by that count, at least one stage each.
+    """
+    n, m = len(cost), len(cost[0])
+    fastest = [min(range(m), key=lambda r: row[r]) for row in cost]
+    centroid, count = {}, {}
+    for r in range(m):
+        positions = [i for i in range(n) if fastest[i] == r]
+        count[r] = len(positions)
+        if positions:
+            centroid[r] = sum(positions) / len(positions)
+        else:
+            centroid[r] = min(range(n), key=lambda i: cost[i][r] / max(min(cost[i]), chain_dp.EPSILON))
+    order = sorted(range(m), key=lambda r: centroid[r])
+    bounds = [0]
+    for j, r in enumerate(order[:-1]):
+        bounds.append(min(max(bounds[-1] + count[r], bounds[-1] + 1), n - (m - 1 - j)))
+    bounds.append(n)
+    return order, bounds
+
+
+def lower_bound(cost: List[List[float]], objective: str) -> float:
+    """
+    chain_dp.lower_bound tightened by the fact that every resource gets at
+    least one stage of its own: the total exceeds the sum of per-stage
+    minima by at least each resource's cheapest extra cost over a stage's
+    minimum; for max_chunk_time the slowest block is at least the mean
+    block and at least every resource's fastest stage.
+    """
+    bound = chain_dp.lower_bound(cost, objective)
+    if not cost:
+        return bound
+    fastest = [min(row) for row in cost]
+    columns = range(len(cost[0]))
+    total = sum(fastest) + sum(min(row[r] - best for row, best in zip(cost, fastest)) for r in columns)
+    if objective == 'max_chunk_time':
+        return max(bound, total / len(cost[0]), max(min(row[r] for row in cost) for r in columns),
+                   weighted_load_bound(cost))
+    return max(bound, total)
+
+
+def weighted_load_bound(cost: List[List[float]], iterations: int = LOAD_BOUND_ITERATIONS) -> float:
+    """
+    For any weights w >= 0 summing to 1, the slowest block is at least the
+    w-weighted mean block time, which is at least sum_i min_r w_r * cost[i][r].
+    The weights start uniform and are shifted towards the resources that
+    the per-stage minimum overloads; the best bound seen is returned.
+    """
+    m = len(cost[0])
+    weights = [1.0 / m] * m
+    best = 0.0
+    for _ in range(iterations):
+        loads = [0.0] * m
+        bound = 0.0
+        for row in cost:
+            weighted = [w * t for w, t in zip(weights, row)]
+            r = weighted.index(min(weighted))
+            bound += weighted[r]
+            loads[r] += row[r]
+        best = max(best, bound)
+        mean = sum(loads) / m
+        if mean <= 0:
+            break
+        weights = [w * (1 + 0.5 * (load - mean) / max(loads)) for w, load in zip(weights, loads)]
+        weights = [w / sum(weights) for w in weights]
+    return best
+
+
+def local_search(state: ChainState, deadline: float) -> Tuple[int, int]:
+    """
+    First-improvement descent over boundary shifts (steps of n/2, n/4, .., 1
+    in both directions) and block resource swaps. Returns (moves applied,
+    moves evaluated).
+    """
+    n, m = state.n, state.m
+    steps = []
+    step = max(n // 2, 1)
+    while step >= 1:
+        steps.extend((step, -step))
+        step //= 2
+    moves = evaluations = 0
+    current = state.value()
+    improved = True
+    while improved and time.perf_counter() < deadline:
+        improved = False
+        for j in range(1, m):
+            for step in steps:
+                new = state.bounds[j] + step
+                if not state.bounds[j - 1] < new < state.bounds[j + 1]:
+                    continue
+                changed = {j - 1: state.block(state.order[j - 1], state.bounds[j - 1], new),
+                           j: state.block(state.order[j], new, state.bounds[j + 1])}
+                evaluations += 1
+                value = state.value(changed)
+                if value < current:
+                    state.bounds[j] = new
+                    state.blocks[j - 1], state.blocks[j] = changed[j - 1], changed[j]
+                    current, improved, moves = value, True, moves + 1
+        for a in range(m):
+            for b in range(a + 1, m):
+                ra, rb = state.order[a], state.order[b]
+                changed = {a: state.block(rb, state.bounds[a], state.bounds[a + 1]),
+                           b: state.block(ra, state.bounds[b], state.bounds[b + 1])}
+                evaluations += 1
+                value = state.value(changed)
+                if value < current:
+                    state.order[a], state.order[b] = rb, ra
+                    state.blocks[a], state.blocks[b] = changed[a], changed[b]
+                    current, improved, moves = value, True, moves + 1
+    return moves, evaluations
+
+
+def search(cost: List[List[float]], objective: str = 'total_time', time_limit_ms: float = DEFAULT_TIME_LIMIT_MS,
+           restarts: int = DEFAULT_RESTARTS, seed: int = 0) -> Tuple[float, Optional[List[int]], Dict]:
+    """
+    Heuristic solution of the optimize_pipeline model (every resource used,
+    each in one contiguous block): local search from the greedy start, then
+    from up to restarts random resource orders while time_limit_ms allows.
+    Returns (value, assignment, info) like chain_dp.solve_exact, with
+    (inf, None) when no feasible partition was found; info holds the search
+    effort and, for a solution, the lower bound and the relative gap to it
+    (computed after the search, outside time_limit_ms).
+    """
+    start = time.perf_counter()
+    deadline = start + time_limit_ms / 1e3
+    if objective not in chain_dp.OBJECTIVES:
+        raise ValueError(f"Unknown objective: {objective}")
+    info = {'lower_bound': None, 'gap': None, 'moves': 0, 'evaluations': 0, 'restarts': 0}
+    n, m = len(cost), len(cost[0]) if cost else 0
+    if m == 0 or n < m:
+        info['search_ms'] = (time.perf_counter() - start) * 1e3
+        return math.inf, None, info
+
+    rng = random.Random(seed)
+    state = ChainState(cost, objective)
+    best_value, best_assignment = (math.inf, math.inf), None
+    order, bounds = greedy_start(cost)
+    for attempt in range(restarts + 1):
+        if attempt:
+            if time.perf_counter() >= deadline:
+                break
+            order = rng.sample(range(m), m)
+            info['restarts'] += 1
+        state.reset(order, bounds)
+        moves, evaluations = local_search(state, deadline)
+        info['moves'] += moves
+        info['evaluations'] += evaluations
+        value = state.value()
+        if value < best_value:
+            best_value, best_assignment = value, state.assignment()
+    info['search_ms'] = (time.perf_counter() - start) * 1e3
+    if best_value[0]:
+        return math.inf, None, info
+    value = chain_dp.evaluate(cost, best_assignment, objective)
+    start = time.perf_counter()
+    bound = info['lower_bound'] = lower_bound(cost, objective)
+    info['gap'] = (value - bound) / bound if bound > 0 else 0.0
+    info['bound_ms'] = (time.perf_counter() - start) * 1e3
+    return value, best_assignment, info
+
@@ -0,0 +1,225 @@
+import argparse
+import json
+import multiprocessing as mp
+import queue
+import time
+from collections import Counter, defaultdict
+from typing import Callable, Dict, List
+
+import chain_dp
+import heuristic
+from Z3_Allocator import PipelineOptimizer
+
+DEFAULT_LOG = "portfolio_log.jsonl"
+DEFAULT_OUTPUT = "portfolio_schedules.json"
+
+
+def _z3_engine(encoding: str, engine: str = 'optimize') -> Callable:
+    def solve(times: Dict, backends: List[str], core_types: List[str], objective: str) -> Dict:
+        optimizer = PipelineOptimizer(":memory:", encoding=encoding, objective=objective, engine=engine)
+        result = optimizer.solve_pipeline(times, backends, core_types)
+        return result and {'pipeline': result['pipeline'], 'total_time': result['total_time'], 'proved_optimal': True}
+    return solve
+
+
+def _chain_result(stages: List[int], resources: List, cost: List[List[float]], assignment: List[int],
+                  value: float, proved_optimal: bool) -> Dict:
+    pipeline = {stages[i]: resources[k] + (cost[i][k],) for i, k in enumerate(assignment)}
+    # Same 10-digit precision optimize_pipeline reads back from Z3.
+    return {'pipeline': pipeline, 'total_time': round(chain_dp.evaluate(cost, assignment), 10),
+            'value': value, 'proved_optimal': proved_optimal}
+
+
+def dp_engine(times: Dict, backends: List[str], core_types: List[str], objective: str) -> Dict:
+    """Exact chain DP over every resource order (chain_dp.solve_exact)."""
+    stages, resources, cost = chain_dp.normalize(times, backends, core_types)
+    value, assignment, exhaustive = chain_dp.solve_exact(cost, objective)
+    if assignment is None:
+        return None
+    return _chain_result(stages, resources, cost, assignment, value, exhaustive)
+
+
+def heuristic_engine(times: Dict, backends: List[str], core_types: List[str], objective: str) -> Dict:
+    """Greedy + local search (heuristic.search); proven optimal only when it meets its lower bound."""
+    stages, resources, cost = chain_dp.normalize(times, backends, core_types)
+    value, assignment, info = heuristic.search(cost, objective)
+    if assignment is None:
+        return None
+    return _chain_result(stages, resources, cost, assignment, value, info['gap'] <= chain_dp.EPSILON)
+
+
+# Engine name -> callable(times, backends, core_types, objective) returning an
+# optimize_pipeline-style result with 'proved_optimal' (and 'value', the
+# objective value, when that may be False), or None when the instance is infeasible.
+ENGINES = {
+    'z3': _z3_engine('pairwise'),
+    'z3-prefix': _z3_engine('prefix'),
+    'z3-bisect': _z3_engine('pairwise', 'bisect'),
+    'dp': dp_engine,
+    'heuristic': heuristic_engine,
+}
+# Engines that only minimize max_chunk_time.
+MAX_CHUNK_ONLY = {'z3-bisect'}
+
+
+def engines_for(objective: str) -> List[str]:
+    return [name for name in ENGINES if objective == 'max_chunk_time' or name not in MAX_CHUNK_ONLY]
+
+
+def plain_times(times: Dict) -> Dict:
+    """Copy get_execution_times output into plain dicts so it can be sent to worker processes."""
+    return {s: {b: dict(v) if isinstance(v, dict) else v for b, v in entry.items()} for s, entry in times.items()}
+
+
+def _run_engine(name: str, times: Dict, backends: List[str], core_types: List[str], objective: str, results):
+    start = time.perf_counter()
+    try:
+        result, error = ENGINES[name](times, backends, core_types, objective), None
+    except Exception as e:
+        result, error = None, repr(e)
+    results.put((name, (time.perf_counter() - start) * 1e3, result, error))
+
+
+class PortfolioRunner:
+    """
+    Race several engines on the same instance in separate processes.
+
+    The first engine to return a proven optimum wins and the others are
+    terminated. If none does before the timeout, the best unproven result
+    (e.g. the heuristic's) is used. Every race is appended to a JSON Lines
+    log so that wins per engine can be counted later (see summarize_log).
+    """
+
+    def __init__(self, engines: List[str] = None, log_path: str = DEFAULT_LOG, timeout: float = None,
+                 objective: str = 'total_time'):
+        if objective not in chain_dp.OBJECTIVES:
+            raise ValueError(f"Unknown objective: {objective}")
+        self.objective = objective
+        self.engines = engines or engines_for(objective)
+        unknown = [e for e in self.engines if e not in ENGINES]
+        if unknown:
+            raise ValueError(f"Unknown engines: {unknown}")
+        unsupported = [e for e in self.engines if e not in engines_for(objective)]
+        if unsupported:
+            raise ValueError(f"Engines {unsupported} do not minimize {objective}")
+        self.log_path = log_path
+        self.timeout = timeout
+        self.context = mp.get_context()
+
+    def solve(self, times: Dict, backends: List[str], core_types: List[str],
+              machine: str = None, application: str = None) -> Dict:
+        times = plain_times(times)
+        results = self.context.Queue()
+        processes = {name: self.context.Process(target=_run_engine,
+                                                args=(name, times, backends, core_types, self.objective, results),
+                                                daemon=True)
+                     for name in self.engines}
+        start = time.perf_counter()
+        for process in processes.values():
+            process.start()
+
+        winner, fallback, finished, errors = None, None, {}, {}
+        deadline = None if self.timeout is None else start + self.timeout
+        while winner is None and len(finished) + len(errors) < len(processes):
+            wait = None if deadline is None else max(0.0, deadline - time.perf_counter())
+            try:
+                name, elapsed_ms, result, error = results.get(timeout=wait)
+            except queue.Empty:
+                break
+            if error:
+                errors[name] = error
+                continue
+            finished[name] = elapsed_ms
+            # An engine reporting infeasibility settles the instance as well.
+            if result is None or result.get('proved_optimal'):
+                winner = (name, elapsed_ms, result)
+            elif fallback is None or result['value'] < fallback[2]['value']:
+                fallback = (name, elapsed_ms, result)
+        winner = winner or fallback
+
+        for process in processes.values():
+            if process.is_alive():
+                process.terminate()
+        for process in processes.values():
+            process.join()
+
+        record = {
+            "machine": machine,
+            "application": application,
+            "stages": len(times),
+            "objective": self.objective,
+            "engines": self.engines,
+            "winner": winner[0] if winner else None,
+            "proved_optimal": bool(winner and (winner[2] is None or winner[2]['proved_optimal'])),
+            "winner_ms": winner[1] if winner else None,
+            "wall_ms": (time.perf_counter() - start) * 1e3,
+            "finished_ms": finished,
+            "errors": errors,
+            "total_time": winner[2]['total_time'] if winner and winner[2] else None,
+        }
+        if self.log_path:
+            with open(self.log_path, "a") as f:
+                f.write(json.dumps(record, separators=(",", ":")) + "\n")
+        if not winner or winner[2] is None:
+            return None
+        result = dict(winner[2])
+        result['engine'] = winner[0]
+        return result
+
+
+def summarize_log(log_path: str = DEFAULT_LOG) -> Dict[str, Dict]:
+    """Wins and median winning time per engine from a portfolio log."""
+    wins = Counter()
+    times = defaultdict(list)
+    races = 0
+    with open(log_path) as f:
+        for line in f:
+            record = json.loads(line)
+            races += 1
+            if record["winner"]:
+                wins[record["winner"]] += 1
+                times[record["winner"]].append(record["winner_ms"])
+    return {engine: {"wins": wins[engine], "races": races,
+                     "median_ms": sorted(times[engine])[len(times[engine]) // 2]}
+            for engine in wins}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Race several solver engines per (machine, application).")
+    parser.add_argument("--db", default="benchmark_results.db")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    parser.add_argument("--objective", choices=chain_dp.OBJECTIVES, default='total_time')
+    parser.add_argument("--engines", nargs="+", choices=sorted(ENGINES), default=None,
+                        help="default: every engine that minimizes the objective")
+    parser.add_argument("--log", default=DEFAULT_LOG)
+    parser.add_argument("--timeout", type=float, default=None, help="seconds per race")
+    parser.add_argument("--summary", action="store_true", help="only print wins per engine from the log")
+    args = parser.parse_args()
+
+    if args.summary:
+        for engine, row in sorted(summarize_log(args.log).items(), key=lambda kv: -kv[1]["wins"]):
+            print(f"{engine:>12}: {row['wins']}/{row['races']} wins, median {row['median_ms']:.1f} ms")
+        return
+
+    if args.engines and set(args.engines) - set(engines_for(args.objective)):
+        parser.error(f"--engines {' '.join(sorted(MAX_CHUNK_ONLY))} requires --objective max_chunk_time")
+    optimizer = PipelineOptimizer(args.db, objective=args.objective)
+    runner = PortfolioRunner(args.engines, args.log, args.timeout, args.objective)
+    all_schedules = []
+    for machine, app in optimizer.list_pairs():
+        times = optimizer.get_execution_times(machine, app)
+        if not times:
+            continue
+        backends, core_types = optimizer.get_machine_resources(machine, app)
+        result = runner.solve(times, backends, core_types, machine, app)
+        if result:
+            proof = "" if result['proved_optimal'] else " (not proven optimal)"
+            print(f"{machine}/{app}: won by {result['engine']}{proof}")
+            all_schedules.append(optimizer.build_schedule(machine, app, result))
+    with open(args.output, "w") as f:
+        json.dump(all_schedules, f, indent=2)
+    print(f"Saved the combination in file {args.output}")
+
+
+if __name__ == "__main__":
+    main()
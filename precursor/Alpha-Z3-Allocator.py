@@ -1,33 +1,70 @@
+import json
+import os
 import pandas as pd
 import re
 import sys
 from z3 import *
 
-def get_device_configs(cpu_file):
-    """Determine device configurations based on input filename pattern."""
-    if 'android_tree' in cpu_file or 'android_cifar_dense' in cpu_file:
-        return {
-            '3A021JEHN02756': {
-                'small': {'cores': [0, 1, 2, 3], 'counts': [1, 2, 3, 4]},
-                'medium': {'cores': [4, 5], 'counts': [1, 2]},
-                'big': {'cores': [6, 7], 'counts': [1, 2]},
-                'gpu': {'cores': [8], 'counts': [1]}
-            },
-            '9b034f1b': {
-                'small': {'cores': [0, 1], 'counts': [1, 2]},
-                'medium': {'cores': [2, 3, 4], 'counts': [1, 2, 3]},
-                'gpu': {'cores': [8], 'counts': [1]}
-            }
-        }
-    elif 'jetson_tree' in cpu_file:
-        return {
-            'jetson': {
-                'small': {'cores': [1, 2, 3, 4, 5, 6], 'counts': [1, 2, 3, 4, 5, 6]},
-                'gpu': {'cores': [1], 'counts': [1]}
-            }
-        }
-    else:
-        raise ValueError(f"Unsupported device configuration for file: {cpu_file}")
+REGISTRY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'devices.json')
+
+def get_device_configs(cpu_file, registry_file=REGISTRY_FILE):
+    """
+    Device configurations from the device topology registry (devices.json,
+    maintained with device_registry.py). The benchmark CSVs call the little
+    cluster 'small'.
+    """
+    with open(registry_file) as f:
+        registry = json.load(f)
+    configs = {}
+    for device, topology in registry.items():
+        config = {}
+        for cluster, info in sorted(topology['clusters'].items(), key=lambda kv: min(kv[1]['core_ids'])):
+            ids = info['core_ids']
+            config['small' if cluster == 'little' else cluster] = {'cores': ids, 'counts': list(range(1, len(ids) + 1))}
+        if topology.get('gpu'):
+            config['gpu'] = {'cores': topology['gpu']['cores'], 'counts': [1]}
+        configs[device] = config
+    if not configs:
+        raise ValueError(f"No devices registered in {registry_file} for file: {cpu_file}")
+    return configs
+
+def parse_device_id(line):
+    """
+    Device named by a benchmark header line: Android runs print 'on device: <id>',
+    other hosts log their benchmark config ('Config path: .../<id>.yaml').
+    """
+    match = re.search(r'on device:\s+(\S+)', line) or re.search(r'Config path:\s+\S*?([^/\s]+)\.yaml', line)
+    return match.group(1) if match else None
+
+def configs_from_data(df, registry_configs):
+    """
+    Core configurations of the parsed devices: only the core types and counts
+    that have timings, with core IDs taken from the registry. Timings for more
+    cores than the registered cluster has are dropped.
+    """
+    configs = {}
+    for device_id, device_df in df.groupby('Device_ID', sort=False):
+        if device_id not in registry_configs:
+            raise ValueError(f"Unsupported device configuration: {device_id} is not registered in devices.json")
+        registered = registry_configs[device_id]
+        core_types = list(dict.fromkeys(device_df['Core_Type']))
+        unknown = [c for c in core_types if c not in registered]
+        if unknown:
+            raise ValueError(f"Unsupported device configuration: {device_id} has timings for "
+                             f"{', '.join(unknown)} cores, which devices.json does not register")
+        core_types.sort(key=list(registered).index)
+        config = {}
+        for core_type in core_types:
+            counts = sorted({int(c) for c in device_df[device_df['Core_Type'] == core_type]['Core_Count']})
+            cores = registered[core_type]['cores']
+            dropped = [c for c in counts if c > len(cores)]
+            if dropped:
+                print(f"Ignoring {device_id} {core_type} timings for {dropped} cores: "
+                      f"devices.json registers {len(cores)}")
+                counts = [c for c in counts if c <= len(cores)]
+            config[core_type] = {'cores': cores[:max(counts)], 'counts': counts}
+        configs[device_id] = config
+    return configs
 
 def parse_benchmark_files(cpu_file_path, gpu_file_path):
     """Parse both CPU and GPU benchmark files."""
@@ -43,33 +80,15 @@ def parse_benchmark_files(cpu_file_path, gpu_file_path):
     device_data = []
     current_device_id = None
     
-    # Get device configurations based on input file
-    device_configs = get_device_configs(cpu_file_path)
-    
-    found_target_device = False
-    current_config = None
-    
     # Parse CPU data
     for line in cpu_lines:
         line = line.strip()
         
-        # Match device ID for Android devices
-        device_id_match = re.search(r'on device:\s+(\S+)', line)
-        if device_id_match:
-            current_device_id = device_id_match.group(1)
-            if 'jetson_tree' in cpu_file_path:
-                current_device_id = 'jetson'  # Override device ID for Jetson
-            current_config = device_configs.get(current_device_id)
-            if current_config:
-                found_target_device = True
+        # The device is named by the file's header, not by its filename
+        device_id = parse_device_id(line)
+        if device_id:
+            current_device_id = device_id
             continue
-        
-        # Set Jetson device ID based on CPU info
-        if 'jetson_tree' in cpu_file_path and 'Run on' in line and not current_device_id:
-            current_device_id = 'jetson'
-            current_config = device_configs.get(current_device_id)
-            if current_config:
-                found_target_device = True
             
         if line.startswith("ppl/") or line.startswith("[") or not line or line.startswith("CPU Caches"):
             continue
@@ -94,45 +113,31 @@ def parse_benchmark_files(cpu_file_path, gpu_file_path):
                 core_type = task_details[2]
                 core_count = task_details[3]
                 
-                # Only add data if the core type is available for this device
-                if core_type in current_config:
-                    device_data.append([
-                        current_device_id,
-                        'cpu_benchmark',
-                        task_name,
-                        core_type,
-                        core_count,
-                        iterations,
-                        real_time,
-                        cpu_time,
-                        time_unit
-                    ])
-    
-    # Parse GPU data - handle both Vulkan and CUDA
-    gpu_type = None
-    is_cifar_dense = 'android_cifar_dense' in gpu_file_path
+                device_data.append([
+                    current_device_id,
+                    'cpu_benchmark',
+                    task_name,
+                    core_type,
+                    core_count,
+                    iterations,
+                    real_time,
+                    cpu_time,
+                    time_unit
+                ])
     
-    if 'android_tree_vk.csv' in gpu_file_path or 'android_cifar_dense_vk.csv' in gpu_file_path:
-        gpu_type = 'iGPU_Vulkan'
-    elif 'jetson_tree_cuda.csv' in gpu_file_path:
-        gpu_type = 'iGPU_CUDA'
+    # Parse GPU data: rows are named by their API (iGPU_Vulkan, iGPU_CUDA, ...).
+    # A GPU file without a device header continues the CPU file's device.
+    cpu_tasks = {row[2] for row in device_data}
     
     for line in gpu_lines:
         line = line.strip()
         
-        # Handle device ID for Android
-        device_id_match = re.search(r'on device:\s+(\S+)', line)
-        if device_id_match:
-            current_device_id = device_id_match.group(1)
-            if 'jetson_tree' in gpu_file_path:
-                current_device_id = 'jetson'
+        device_id = parse_device_id(line)
+        if device_id:
+            current_device_id = device_id
             continue
-        
-        # Set Jetson device ID based on CPU info in GPU file
-        if 'jetson_tree' in gpu_file_path and 'Run on' in line and not current_device_id:
-            current_device_id = 'jetson'
             
-        if gpu_type and gpu_type in line:
+        if line.startswith('"iGPU_'):
             benchmark_match = re.match(r'"([^"]+)",(\d+),([\d.]+),([\d.]+),(\w+)', line)
             if benchmark_match and current_device_id:
                 task, iterations, real_time, cpu_time, time_unit = (
@@ -144,8 +149,8 @@ def parse_benchmark_files(cpu_file_path, gpu_file_path):
                 )
                 
                 task_name = task.split('/')[1]
-                # Add '_sync' suffix for CIFAR dense GPU tasks to match CPU naming
-                if is_cifar_dense:
+                # CPU runs of synchronous stages (CIFAR dense) are named '<stage>_sync'
+                if task_name not in cpu_tasks and f"{task_name}_sync" in cpu_tasks:
                     task_name = f"{task_name}_sync"
                 
                 device_data.append([
@@ -168,18 +173,69 @@ def parse_benchmark_files(cpu_file_path, gpu_file_path):
                                           'Core_Count', 'Iterations', 'Real_Time', 
                                           'CPU_Time', 'Time_Unit'])
     
-    return df, device_configs
+    return df, configs_from_data(df, get_device_configs(cpu_file_path))
+
+def prune_dominated_options(task_exec_times, pipeline_sequence, core_configs):
+    """
+    Keep, for each task and core type, only the fastest core count with data.
 
-def solve_task_allocation(device_df, tasks, core_configs, task_dependencies, pipeline_sequence, num_pipelines, transfer_penalty=1.2):
+    Core usage and contiguity only depend on the core type, so a slower count
+    of the same core type can always be swapped for the fastest one without
+    increasing any task or pipeline time. The balance soft constraints are
+    optimized before the pipeline time, though, and can prefer a slower count,
+    so solve_task_allocation only applies this with prune_dominated=True
+    (--prune on the command line).
+    """
+    kept = set()
+    for task in pipeline_sequence:
+        for core_type, config in core_configs.items():
+            timed = [(task_exec_times[(task, core_type, count)], count)
+                     for count in config['counts']
+                     if (task, core_type, count) in task_exec_times]
+            if timed:
+                kept.add((task, core_type, min(timed)[1]))
+    return kept
+
+def solve_task_allocation(device_df, tasks, core_configs, task_dependencies, pipeline_sequence, num_pipelines, transfer_penalty=1.2, prune_dominated=False):
     """Solve task allocation with GPU support."""
     solver = Optimize()
     
-    # Create task assignment variables using core counts
+    # Calculate individual task execution times
+    task_exec_times = {}
+    for task in pipeline_sequence:
+        for core_type, config in core_configs.items():
+            for count in config['counts']:
+                task_data = device_df[
+                    (device_df['Task'] == task) &
+                    (device_df['Core_Type'] == core_type) &
+                    (device_df['Core_Count'] == str(count))
+                ]
+                if not task_data.empty:
+                    task_exec_times[(task, core_type, count)] = task_data['Real_Time'].iloc[0]
+                else:
+                    print(f"Warning: No execution time data found for {task} on {core_type} with {count} cores")
+
+    # Drop dominated core counts before creating variables
+    total_options = len(pipeline_sequence) * sum(len(config['counts']) for config in core_configs.values())
+    if prune_dominated:
+        kept_options = prune_dominated_options(task_exec_times, pipeline_sequence, core_configs)
+        print(f"Pruned {total_options - len(kept_options)} of {total_options} task/core-count options")
+    else:
+        kept_options = set(task_exec_times)
+    unassignable = [task for task in pipeline_sequence if not any(option[0] == task for option in kept_options)]
+    if unassignable:
+        raise ValueError(f"No timed core configuration left for {', '.join(unassignable)}; "
+                         f"check that the benchmark files use these task names")
+
+    # Create task assignment variables using core counts (pruned and untimed options are fixed to 0)
     task_vars = {}
     for task in pipeline_sequence:
         for core_type, config in core_configs.items():
             for count in config['counts']:
                 var_name = f"{task}_{core_type}_{count}"
+                if (task, core_type, count) not in kept_options:
+                    task_vars[var_name] = IntVal(0)
+                    continue
                 task_vars[var_name] = Int(var_name)
                 solver.add(Or(task_vars[var_name] == 0, task_vars[var_name] == 1))
     
@@ -253,20 +309,6 @@ def solve_task_allocation(device_df, tasks, core_configs, task_dependencies, pip
                                  core_last_use[core_type] > pos),
                              task_uses_core))
     
-    # Calculate individual task execution times
-    task_exec_times = {}
-    for task in pipeline_sequence:
-        for core_type, config in core_configs.items():
-            for count in config['counts']:
-                task_data = device_df[
-                    (device_df['Task'] == task) &
-                    (device_df['Core_Type'] == core_type) &
-                    (device_df['Core_Count'] == str(count))
-                ]
-                if not task_data.empty:
-                    task_exec_times[(task, core_type, count)] = task_data['Real_Time'].iloc[0]
-                else:
-                    print(f"Warning: No execution time data found for {task} on {core_type} with {count} cores")
 
     # Ensure we have at least one valid configuration for each task
     for task in pipeline_sequence:
@@ -369,7 +411,7 @@ def solve_task_allocation(device_df, tasks, core_configs, task_dependencies, pip
             for core_type, config in core_configs.items():
                 for count in config['counts']:
                     var_name = f"{task}_{core_type}_{count}"
-                    if var_name in task_vars and model[task_vars[var_name]].as_long() == 1:
+                    if var_name in task_vars and model.evaluate(task_vars[var_name]).as_long() == 1:
                         for pipeline_idx in range(num_pipelines):
                             solution['assignments'][(task, pipeline_idx)] = (core_type, count)
                             exec_time = safe_float(model[task_times[task]].as_decimal(6))
@@ -387,8 +429,9 @@ def solve_task_allocation(device_df, tasks, core_configs, task_dependencies, pip
 
 def main():
     # Check command line arguments
-    if len(sys.argv) != 3:
-        print("Usage: python3 Alpha-Z3-Allocator.py <cpu_benchmark_file> <gpu_benchmark_file>")
+    prune_dominated = '--prune' in sys.argv[3:]
+    if len(sys.argv) - prune_dominated != 3:
+        print("Usage: python3 Alpha-Z3-Allocator.py <cpu_benchmark_file> <gpu_benchmark_file> [--prune]")
         print("Example 1: python3 Alpha-Z3-Allocator.py android_tree_cpu.csv android_tree_vk.csv")
         print("Example 2: python3 Alpha-Z3-Allocator.py jetson_tree_cpu.csv jetson_tree_cuda.csv")
         print("Example 3: python3 Alpha-Z3-Allocator.py android_cifar_dense_cpu.csv android_cifar_dense_vk.csv")
@@ -458,7 +501,8 @@ def main():
 
         # Solve task allocation
         solution = solve_task_allocation(device_df, pipeline_sequence, core_configs,
-                                      task_dependencies, pipeline_sequence, num_pipelines)
+                                      task_dependencies, pipeline_sequence, num_pipelines,
+                                      prune_dominated=prune_dominated)
 
         if solution:
             print("\nOptimal Pipeline Allocation:")
@@ -0,0 +1,153 @@
+import cProfile
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+# Registered hooks. Each hook has begin(name, attrs) and end(name, attrs); they are
+# called around every span in registration order (end in reverse order).
+HOOKS: List = []
+
+
+def register(hook):
+    """Attach a hook to every subsequent span."""
+    HOOKS.append(hook)
+    return hook
+
+
+def unregister(hook):
+    HOOKS.remove(hook)
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("name", "attrs", "hooks")
+
+    def __init__(self, name: str, attrs: Dict):
+        self.name = name
+        self.attrs = attrs
+        self.hooks = list(HOOKS)
+
+    def __enter__(self):
+        for hook in self.hooks:
+            hook.begin(self.name, self.attrs)
+        return self
+
+    def __exit__(self, *exc):
+        for hook in reversed(self.hooks):
+            hook.end(self.name, self.attrs)
+        return False
+
+
+def span(name: str, **attrs):
+    """
+    Context manager marking a hook point. With no hook registered it returns a
+    shared no-op object, so an unobserved span costs one list check.
+    """
+    return _Span(name, attrs) if HOOKS else NULL_SPAN
+
+
+class SpanRecorder:
+    """
+    Hook recording every span with its nesting, exportable as Chrome
+    trace-event JSON (chrome://tracing, Perfetto) or as folded stacks for
+    flamegraph.pl / speedscope.
+    """
+
+    def __init__(self):
+        self.events = []
+        self.local = threading.local()
+
+    def _stack(self) -> List:
+        stack = getattr(self.local, "stack", None)
+        if stack is None:
+            stack = self.local.stack = []
+        return stack
+
+    def begin(self, name: str, attrs: Dict):
+        # [name, start_ns, time spent in child spans]
+        self._stack().append([name, time.perf_counter_ns(), 0])
+
+    def end(self, name: str, attrs: Dict):
+        stack = self._stack()
+        _, start, child_ns = stack.pop()
+        duration = time.perf_counter_ns() - start
+        if stack:
+            stack[-1][2] += duration
+        path = ";".join(frame[0] for frame in stack) + (";" if stack else "") + name
+        self.events.append({
+            "name": name,
+            "path": path,
+            "start_ns": start,
+            "duration_ns": duration,
+            "self_ns": duration - child_ns,
+            "tid": threading.get_ident(),
+            "attrs": dict(attrs)
+        })
+
+    def chrome_trace(self) -> Dict:
+        origin = min((e["start_ns"] for e in self.events), default=0)
+        pid = os.getpid()
+        return {
+            "traceEvents": [{
+                "name": e["name"],
+                "ph": "X",
+                "ts": (e["start_ns"] - origin) / 1e3,
+                "dur": e["duration_ns"] / 1e3,
+                "pid": pid,
+                "tid": e["tid"],
+                "args": e["attrs"]
+            } for e in sorted(self.events, key=lambda e: e["start_ns"])],
+            "displayTimeUnit": "ms"
+        }
+
+    def folded_stacks(self) -> List[str]:
+        """'outer;inner <self time in microseconds>' lines, one per distinct stack."""
+        totals = defaultdict(int)
+        for e in self.events:
+            totals[e["path"]] += e["self_ns"]
+        return [f"{path} {ns // 1000}" for path, ns in sorted(totals.items())]
+
+    def write_chrome_trace(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.chrome_trace(), f)
+
+    def write_folded(self, path: str):
+        with open(path, "w") as f:
+            f.write("\n".join(self.folded_stacks()) + "\n")
+
+
+class CProfileHook:
+    """Hook running cProfile only inside spans with one of the given names (e.g. {'check'})."""
+
+    def __init__(self, names):
+        self.names = set(names)
+        self.profile = cProfile.Profile()
+        self.depth = 0
+
+    def begin(self, name: str, attrs: Dict):
+        if name in self.names:
+            if self.depth == 0:
+                self.profile.enable()
+            self.depth += 1
+
+    def end(self, name: str, attrs: Dict):
+        if name in self.names:
+            self.depth -= 1
+            if self.depth == 0:
+                self.profile.disable()
+
+    def dump(self, path: str):
+        self.profile.dump_stats(path)
@@ -0,0 +1,245 @@
+import argparse
+import asyncio
+import json
+import math
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+import chain_dp
+from device_registry import DEFAULT_REGISTRY, DeviceRegistry
+from schedule_io import schedule_key, write_schedules
+from timing_cube import TimingCube
+
+DEFAULT_OUTPUT = "live_schedules.json"
+
+
+class Replanner:
+    """
+    Online re-planning from runtime telemetry.
+
+    Keeps an exponentially weighted estimate of every (device, application,
+    stage, hardware) time, seeded from the timing cube. After each sample
+    the pair's published schedule is evaluated on the estimates; when it is
+    more than tolerance (a fraction) above the optimum for the estimates,
+    the optimum becomes the new schedule. The optimum comes from the exact
+    chain DP (chain_dp.solve_exact) on the in-memory estimates, so a check
+    takes milliseconds and never touches the database or Z3.
+
+    Telemetry samples are {"device", "application", "stage", "hardware",
+    "time_ms"} with hardware as in schedules ('gpu', 'big', ...). The
+    resources of a pair are fixed by its benchmarks: samples for a pair,
+    stage or hardware the timing cube has no entry for are rejected.
+    """
+
+    def __init__(self, cube: TimingCube, schedules: List[Dict], alpha: float = 0.2, tolerance: float = 0.05,
+                 objective: str = 'total_time', registry: DeviceRegistry = None):
+        if not 0 < alpha <= 1:
+            raise ValueError(f"alpha must be in (0, 1], got {alpha}")
+        if objective not in chain_dp.OBJECTIVES:
+            raise ValueError(f"Unknown objective: {objective}")
+        self.estimates = {pair: {s: dict(row) for s, row in cube.stage_times(*pair).items()}
+                          for pair in cube.pairs()}
+        self.hardware = {pair: sorted({h for row in estimates.values() for h in row})
+                         for pair, estimates in self.estimates.items()}
+        self.schedules = {schedule_key(schedule_dict): schedule_dict for schedule_dict in schedules}
+        self.alpha = alpha
+        self.tolerance = tolerance
+        self.objective = objective
+        self.registry = registry or DeviceRegistry(None)
+        self.samples = 0
+        self.check_ms = []
+        self.replan_ms = []
+
+    def observe(self, record: Dict) -> Optional[Dict]:
+        """
+        Fold one telemetry sample into the estimates; returns the new schedule
+        if the pair was re-planned. Raises ValueError for a sample outside the
+        pair's benchmarked stages and hardware.
+        """
+        pair = (record["device"], record["application"])
+        stage, hardware = int(record["stage"]), record["hardware"]
+        if pair not in self.estimates:
+            raise ValueError(f"No benchmarks for {pair[0]}/{pair[1]}")
+        if stage not in self.estimates[pair]:
+            raise ValueError(f"No benchmarks for stage {stage} of {pair[0]}/{pair[1]}")
+        if hardware not in self.hardware[pair]:
+            raise ValueError(f"No benchmarks for {hardware} on {pair[0]}/{pair[1]}")
+        sample = float(record["time_ms"])
+        row = self.estimates[pair][stage]
+        previous = row.get(hardware)
+        row[hardware] = sample if previous is None else (1 - self.alpha) * previous + self.alpha * sample
+        self.samples += 1
+        return self.check(*pair)
+
+    def _cost(self, pair: Tuple[str, str]) -> Tuple[List[int], List[str], List[List[float]]]:
+        estimates = self.estimates[pair]
+        stages = sorted(estimates)
+        hardware = self.hardware[pair]
+        cost = [[estimates[s].get(h, math.inf) for h in hardware] for s in stages]
+        return stages, hardware, cost
+
+    def check(self, device: str, application: str) -> Optional[Dict]:
+        """Re-plan the pair if its schedule is no longer within tolerance of the optimum."""
+        start = time.perf_counter()
+        pair = (device, application)
+        stages, hardware, cost = self._cost(pair)
+        optimum, assignment, _ = chain_dp.solve_exact(cost, self.objective)
+        current = self.schedules.get(pair)
+        if assignment is None:
+            self.check_ms.append((time.perf_counter() - start) * 1e3)
+            return None
+        if current is not None:
+            placed = {s: chunk["hardware"] for chunk in current["schedule"]["chunks"] for s in chunk["stages"]}
+            if all(placed.get(s) in hardware for s in stages):
+                value = chain_dp.evaluate(cost, [hardware.index(placed[s]) for s in stages], self.objective)
+                if value <= optimum * (1 + self.tolerance):
+                    self.check_ms.append((time.perf_counter() - start) * 1e3)
+                    return None
+        schedule_dict = self._schedule(device, application, stages, hardware, cost, assignment, current)
+        self.schedules[pair] = schedule_dict
+        elapsed = (time.perf_counter() - start) * 1e3
+        self.check_ms.append(elapsed)
+        self.replan_ms.append(elapsed)
+        return schedule_dict
+
+    def _schedule(self, device: str, application: str, stages: List[int], hardware: List[str],
+                  cost: List[List[float]], assignment: List[int], current: Optional[Dict]) -> Dict:
+        """build_schedule-style dict; thread counts are kept from the current schedule where possible."""
+        threads = {chunk["hardware"]: chunk["threads"] for chunk in current["schedule"]["chunks"]} if current else {}
+        groups = []
+        for i, k in enumerate(assignment):
+            if groups and groups[-1][0] == k:
+                groups[-1][1].append(stages[i])
+                groups[-1][2] += cost[i][k]
+            else:
+                groups.append([k, [stages[i]], cost[i][k]])
+        chunks = [{
+            "name": f"chunk{index}",
+            "hardware": hardware[k],
+            "threads": threads.get(hardware[k], 0 if hardware[k] == "gpu" else 1),
+            "affinity": [],
+            "stages": stage_list
+        } for index, (k, stage_list, _) in enumerate(groups, 1)]
+        masks = self.registry.affinity(device, [(chunk["hardware"], chunk["threads"]) for chunk in chunks])
+        for chunk, mask in zip(chunks, masks):
+            chunk["affinity"] = mask
+        return {
+            "schedule": {
+                "schedule_id": f"{device}_{application}_schedule_001",
+                "device_id": device,
+                "chunks": chunks
+            },
+            "total_time": round(sum(group[2] for group in groups), 10),
+            "max_chunk_time": max(group[2] for group in groups)
+        }
+
+    def publish(self, path: str):
+        write_schedules([self.schedules[key] for key in sorted(self.schedules)], path)
+
+    def summary(self) -> str:
+        def pct(values, q):
+            return sorted(values)[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+        return (f"{self.samples} samples, {len(self.replan_ms)} re-plans; check p50 {pct(self.check_ms, 0.5):.2f} ms, "
+                f"p99 {pct(self.check_ms, 0.99):.2f} ms, max {max(self.check_ms, default=0.0):.2f} ms")
+
+
+def follow(replanner: Replanner, telemetry_path: str, output: str, poll: float = 0.2, once: bool = False):
+    """
+    Tail a JSON Lines telemetry file, publishing to output after every
+    re-plan. A partially written last line is left for the next poll. With
+    once, stop at the end of the file.
+    """
+    with open(telemetry_path) as f:
+        while True:
+            position = f.tell()
+            line = f.readline()
+            if not line.endswith("\n"):
+                if once:
+                    break
+                f.seek(position)
+                time.sleep(poll)
+                continue
+            if not line.strip():
+                continue
+            try:
+                schedule_dict = replanner.observe(json.loads(line))
+            except (ValueError, KeyError, TypeError) as e:
+                print(f"Skipped bad sample: {e}")
+                continue
+            if schedule_dict:
+                replanner.publish(output)
+                print(f"Re-planned {schedule_dict['schedule']['schedule_id']}: "
+                      f"{', '.join(c['hardware'] + ' ' + str(c['stages']) for c in schedule_dict['schedule']['chunks'])}")
+
+
+async def serve(replanner: Replanner, output: str, socket_path: Optional[str] = None,
+                host: str = "127.0.0.1", port: int = 8766):
+    """Accept newline-delimited telemetry samples on a socket; each is answered with whether it re-planned."""
+    async def client(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    schedule_dict = replanner.observe(json.loads(line))
+                    if schedule_dict:
+                        replanner.publish(output)
+                    response = {"ok": True, "replanned": schedule_dict is not None}
+                except (ValueError, KeyError, TypeError) as e:
+                    response = {"ok": False, "error": f"Bad sample: {e}"}
+                writer.write(json.dumps(response, separators=(",", ":")).encode() + b"\n")
+                await writer.drain()
+        finally:
+            writer.close()
+
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        server = await asyncio.start_unix_server(client, path=socket_path)
+        print(f"Receiving telemetry on {socket_path}")
+    else:
+        server = await asyncio.start_server(client, host, port)
+        print(f"Receiving telemetry on {host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-plan schedules online from per-stage telemetry.")
+    parser.add_argument("--db", default="benchmark_results.db")
+    parser.add_argument("--schedules", default="all_schedules.json", help="initially published schedules")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT,
+                        help="where re-planned schedules are published (schedule_server.py --schedules can serve it)")
+    parser.add_argument("--devices", default=DEFAULT_REGISTRY, metavar="JSON")
+    parser.add_argument("--alpha", type=float, default=0.2, help="EWMA weight of a new sample")
+    parser.add_argument("--tolerance", type=float, default=5.0,
+                        help="re-plan when the schedule is more than this many percent above the optimum")
+    parser.add_argument("--objective", choices=chain_dp.OBJECTIVES, default='total_time')
+    parser.add_argument("--follow", metavar="JSONL", help="tail this telemetry file")
+    parser.add_argument("--once", action="store_true", help="with --follow, stop at the end of the file")
+    parser.add_argument("--socket", help="receive telemetry on this Unix socket")
+    parser.add_argument("--port", type=int, default=8766, help="TCP port when neither --follow nor --socket is given")
+    args = parser.parse_args()
+    if not 0 < args.alpha <= 1:
+        parser.error("--alpha must be in (0, 1]")
+
+    schedules = []
+    if os.path.exists(args.schedules):
+        with open(args.schedules) as f:
+            schedules = json.load(f)
+    replanner = Replanner(TimingCube.load(args.db), schedules, args.alpha, args.tolerance / 100.0,
+                          args.objective, DeviceRegistry(args.devices))
+    try:
+        if args.follow:
+            follow(replanner, args.follow, args.output, once=args.once)
+        else:
+            asyncio.run(serve(replanner, args.output, args.socket, port=args.port))
+    except KeyboardInterrupt:
+        pass
+    print(replanner.summary())
+
+
+if __name__ == "__main__":
+    main()
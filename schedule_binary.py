@@ -0,0 +1,237 @@
+"""
+Compact binary encoding of build_schedule output for on-device loading.
+
+Layout (little-endian, version 2):
+
+    header      magic 'ZSCH', u16 version, u16 reserved,
+                u32 schedule_count, u32 chunk_count, u32 strings_size
+    schedules   schedule_count x SCHEDULE_RECORD
+    index       schedule_count x u32, schedule positions sorted by schedule_id
+    chunks      chunk_count x CHUNK_RECORD
+    strings     UTF-8 schedule_id and device_id bytes
+
+A chunk record holds the hardware enum, the thread count, the first and
+last stage, a bitmask of its stages (bit n = stage n, stages < 64) and a
+bitmask of the cores it is pinned to (bit n = core n, cores < 64).
+Everything is read in place from an mmap, so loading a file costs a
+single mmap call and lookups decode only the records they touch.
+"""
+import argparse
+import json
+import mmap
+import struct
+from typing import Dict, Iterator, List, Optional
+
+MAGIC = b"ZSCH"
+VERSION = 2
+HARDWARE = ["little", "medium", "big", "gpu"]
+HARDWARE_CODES = {name: code for code, name in enumerate(HARDWARE)}
+MASK_BITS = 64
+
+HEADER = struct.Struct("<4sHHIII")
+# schedule_id offset/len, device_id offset/len, first chunk, chunk count, total_time, max_chunk_time
+SCHEDULE_RECORD = struct.Struct("<IHIHIHdd")
+INDEX_ENTRY = struct.Struct("<I")
+# hardware, threads, first stage, last stage, stage mask, core mask
+CHUNK_RECORD = struct.Struct("<BBHHQQ")
+
+
+def _stage_mask(stages: List[int]) -> int:
+    if stages and max(stages) >= MASK_BITS:
+        if stages != list(range(stages[0], stages[-1] + 1)):
+            raise ValueError(f"Stages >= {MASK_BITS} must be contiguous: {stages}")
+        return 0
+    mask = 0
+    for s in stages:
+        mask |= 1 << s
+    return mask
+
+
+def _core_mask(cores: List[int]) -> int:
+    mask = 0
+    for core in cores:
+        if not 0 <= core < MASK_BITS:
+            raise ValueError(f"Core IDs must be below {MASK_BITS}: {cores}")
+        mask |= 1 << core
+    return mask
+
+
+def _mask_cores(mask: int) -> List[int]:
+    return [core for core in range(MASK_BITS) if mask >> core & 1]
+
+
+def _mask_stages(first: int, last: int, mask: int) -> List[int]:
+    if mask == 0:
+        return list(range(first, last + 1))
+    return [s for s in range(first, last + 1) if mask >> s & 1]
+
+
+def encode_schedules(schedules: List[Dict]) -> bytes:
+    """Encode a list of build_schedule dictionaries."""
+    strings = bytearray()
+    string_offsets = {}
+
+    def intern(text: str):
+        if text not in string_offsets:
+            data = text.encode("utf-8")
+            string_offsets[text] = (len(strings), len(data))
+            strings.extend(data)
+        return string_offsets[text]
+
+    schedule_blob = bytearray()
+    chunk_blob = bytearray()
+    chunk_count = 0
+    for entry in schedules:
+        sched = entry["schedule"]
+        sid_off, sid_len = intern(sched["schedule_id"])
+        dev_off, dev_len = intern(sched["device_id"])
+        schedule_blob += SCHEDULE_RECORD.pack(sid_off, sid_len, dev_off, dev_len,
+                                              chunk_count, len(sched["chunks"]),
+                                              entry["total_time"], entry["max_chunk_time"])
+        for chunk in sched["chunks"]:
+            if chunk["hardware"] not in HARDWARE_CODES:
+                raise ValueError(f"Unknown hardware type: {chunk['hardware']}")
+            stages = chunk["stages"]
+            chunk_blob += CHUNK_RECORD.pack(HARDWARE_CODES[chunk["hardware"]], chunk["threads"],
+                                            stages[0], stages[-1], _stage_mask(stages),
+                                            _core_mask(chunk.get("affinity", [])))
+            chunk_count += 1
+
+    order = sorted(range(len(schedules)), key=lambda i: schedules[i]["schedule"]["schedule_id"].encode("utf-8"))
+    index_blob = b"".join(INDEX_ENTRY.pack(i) for i in order)
+    header = HEADER.pack(MAGIC, VERSION, 0, len(schedules), chunk_count, len(strings))
+    return bytes(header + schedule_blob + index_blob + chunk_blob + strings)
+
+
+class ScheduleFile:
+    """Zero-copy reader over an encoded schedule file or buffer."""
+
+    def __init__(self, path: Optional[str] = None, buffer: Optional[bytes] = None):
+        self._file = None
+        self._mmap = None
+        if buffer is None:
+            self._file = open(path, "rb")
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            buffer = self._mmap
+        self.buf = memoryview(buffer)
+        magic, version, _, self.schedule_count, self.chunk_count, strings_size = HEADER.unpack_from(self.buf, 0)
+        if magic != MAGIC:
+            raise ValueError("Not a binary schedule file")
+        if version != VERSION:
+            raise ValueError(f"Unsupported binary schedule version: {version}")
+        self._schedules_at = HEADER.size
+        self._index_at = self._schedules_at + self.schedule_count * SCHEDULE_RECORD.size
+        self._chunks_at = self._index_at + self.schedule_count * INDEX_ENTRY.size
+        self._strings_at = self._chunks_at + self.chunk_count * CHUNK_RECORD.size
+
+    def __len__(self) -> int:
+        return self.schedule_count
+
+    def _string(self, offset: int, length: int) -> bytes:
+        start = self._strings_at + offset
+        return bytes(self.buf[start:start + length])
+
+    def _record(self, i: int) -> tuple:
+        return SCHEDULE_RECORD.unpack_from(self.buf, self._schedules_at + i * SCHEDULE_RECORD.size)
+
+    def schedule_id(self, i: int) -> str:
+        sid_off, sid_len = self._record(i)[:2]
+        return self._string(sid_off, sid_len).decode("utf-8")
+
+    def find(self, schedule_id: str) -> int:
+        """Position of a schedule by id (binary search over the index), or -1."""
+        key = schedule_id.encode("utf-8")
+        lo, hi = 0, self.schedule_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            i = INDEX_ENTRY.unpack_from(self.buf, self._index_at + mid * INDEX_ENTRY.size)[0]
+            sid_off, sid_len = self._record(i)[:2]
+            current = self._string(sid_off, sid_len)
+            if current == key:
+                return i
+            if current < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return -1
+
+    def chunks(self, i: int) -> List[Dict]:
+        """Chunk list of schedule i in the JSON layout."""
+        first_chunk, count = self._record(i)[4:6]
+        chunks = []
+        for n in range(count):
+            hw, threads, first, last, mask, cores = CHUNK_RECORD.unpack_from(
+                self.buf, self._chunks_at + (first_chunk + n) * CHUNK_RECORD.size)
+            chunks.append({
+                "name": f"chunk{n + 1}",
+                "hardware": HARDWARE[hw],
+                "threads": threads,
+                "affinity": _mask_cores(cores),
+                "stages": _mask_stages(first, last, mask)
+            })
+        return chunks
+
+    def get_chunks(self, device: str, application: str, rank: int = 1) -> Optional[List[Dict]]:
+        i = self.find(f"{device}_{application}_schedule_{rank:03d}")
+        return self.chunks(i) if i >= 0 else None
+
+    def schedule(self, i: int) -> Dict:
+        sid_off, sid_len, dev_off, dev_len, _, _, total_time, max_chunk_time = self._record(i)
+        return {
+            "schedule": {
+                "schedule_id": self._string(sid_off, sid_len).decode("utf-8"),
+                "device_id": self._string(dev_off, dev_len).decode("utf-8"),
+                "chunks": self.chunks(i)
+            },
+            "total_time": total_time,
+            "max_chunk_time": max_chunk_time
+        }
+
+    def __iter__(self) -> Iterator[Dict]:
+        for i in range(self.schedule_count):
+            yield self.schedule(i)
+
+    def close(self):
+        self.buf.release()
+        if self._mmap is not None:
+            self._mmap.close()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def json_to_binary(json_path: str, bin_path: str) -> int:
+    with open(json_path) as f:
+        schedules = json.load(f)
+    with open(bin_path, "wb") as f:
+        f.write(encode_schedules(schedules))
+    return len(schedules)
+
+
+def binary_to_json(bin_path: str, json_path: str) -> int:
+    with ScheduleFile(bin_path) as reader:
+        schedules = list(reader)
+    with open(json_path, "w") as f:
+        json.dump(schedules, f, indent=2)
+    return len(schedules)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert schedules between JSON and the compact binary format.")
+    parser.add_argument("command", choices=["encode", "decode"])
+    parser.add_argument("source")
+    parser.add_argument("target")
+    args = parser.parse_args()
+    if args.command == "encode":
+        count = json_to_binary(args.source, args.target)
+    else:
+        count = binary_to_json(args.source, args.target)
+    print(f"Converted {count} schedules from {args.source} to {args.target}")
+
+
+if __name__ == "__main__":
+    main()
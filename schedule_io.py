@@ -0,0 +1,163 @@
+import json
+import os
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+# Key of the stream's first record, holding the options of the run that wrote it.
+HEADER_KEY = "stream_header"
+
+
+def split_schedule_id(schedule_id: str, device: str) -> str:
+    """Recover the application from '<device>_<application>_schedule_NNN'."""
+    body = schedule_id[len(device) + 1:] if schedule_id.startswith(device + "_") else schedule_id
+    return body.rsplit("_schedule_", 1)[0]
+
+
+def schedule_key(schedule_dict: Dict) -> Tuple[str, str]:
+    """Return the (device, application) pair a build_schedule result belongs to."""
+    sched = schedule_dict["schedule"]
+    return sched["device_id"], split_schedule_id(sched["schedule_id"], sched["device_id"])
+
+
+def read_schedule_stream(path: str, repair: bool = False, header: bool = False) -> List[Dict]:
+    """
+    Read a JSON Lines schedule stream.
+
+    A crash can leave the last line partially written; such a trailing
+    fragment is ignored, and with repair=True it is also truncated away so
+    that further appends start on a clean line. The header record (see
+    prepare_stream) is skipped unless header=True.
+    """
+    if not os.path.exists(path):
+        return []
+    records = []
+    good_bytes = 0
+    with open(path, "rb") as f:
+        for raw in f:
+            if not raw.endswith(b"\n"):
+                break
+            line = raw.strip()
+            if line:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                if header or HEADER_KEY not in record:
+                    records.append(record)
+            good_bytes += len(raw)
+    if repair and good_bytes != os.path.getsize(path):
+        with open(path, "r+b") as f:
+            f.truncate(good_bytes)
+    return records
+
+
+def completed_pairs(path: str) -> Set[Tuple[str, str]]:
+    """(device, application) pairs already present in a schedule stream."""
+    return {schedule_key(record) for record in read_schedule_stream(path, repair=True)}
+
+
+def stream_header(path: str) -> Optional[Dict]:
+    """Run options recorded in the first line of a stream, or None."""
+    records = read_schedule_stream(path, header=True)
+    if records and HEADER_KEY in records[0]:
+        return records[0][HEADER_KEY]
+    return None
+
+
+def prepare_stream(path: str, options: Dict) -> Tuple[Set[Tuple[str, str]], bool]:
+    """
+    Open a stream for a run with the given options (JSON-serializable).
+
+    A stream written with the same options is resumed: returns its
+    completed pairs and False. Otherwise (other options, no header, or no
+    stream at all) any existing stream is moved to <path>.stale and a new
+    one is started with a header record of the options: returns an empty
+    set and whether an old stream was set aside.
+    """
+    options = json.loads(json.dumps(options))
+    if os.path.exists(path) and stream_header(path) == options:
+        return completed_pairs(path), False
+    restarted = os.path.exists(path) and os.path.getsize(path) > 0
+    if os.path.exists(path):
+        os.replace(path, path + ".stale")
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        f.write(json.dumps({HEADER_KEY: options}, separators=(",", ":"), sort_keys=True) + "\n")
+    os.replace(tmp_path, path)
+    return set(), restarted
+
+
+def retire_stream(path: str):
+    """Move a compacted stream to <path>.done so the next run starts a new one."""
+    if os.path.exists(path):
+        os.replace(path, path + ".done")
+
+
+class ScheduleStreamWriter:
+    """Append one compact JSON record per line, flushed to disk as it is written."""
+
+    def __init__(self, path: str):
+        self.path = path
+        read_schedule_stream(path, repair=True)
+        self.file = open(path, "a")
+
+    def write(self, schedule_dict: Dict):
+        self.file.write(json.dumps(schedule_dict, separators=(",", ":")) + "\n")
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def iter_sorted(records: List[Dict]) -> Iterator[Dict]:
+    """Yield records in (device, application) order, keeping the last one per pair."""
+    latest = {}
+    for record in records:
+        latest[schedule_key(record)] = record
+    for key in sorted(latest):
+        yield latest[key]
+
+
+def write_schedules(schedules: List[Dict], path: str):
+    """Atomically write schedules in the all_schedules.json array format."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(schedules, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def compact_schedule_stream(stream_path: str, output_file: str = "all_schedules.json",
+                            merge_existing: bool = True,
+                            replaced: Set[Tuple[str, str]] = None) -> Tuple[int, List[Tuple[str, str]]]:
+    """
+    Merge a JSON Lines stream into the array format used by all_schedules.json.
+
+    With merge_existing=True, schedules already in output_file are kept unless
+    the stream holds a newer record for the same (device, application), or
+    the pair is in replaced (the pairs re-solved by this run) and the stream
+    has no record for it, i.e. it no longer has a schedule.
+    Returns the number of schedules written and the pairs dropped that way.
+    """
+    streamed = read_schedule_stream(stream_path)
+    records = []
+    dropped = []
+    if merge_existing and os.path.exists(output_file):
+        with open(output_file) as f:
+            existing = json.load(f)
+        streamed_pairs = {schedule_key(record) for record in streamed}
+        for record in existing:
+            key = schedule_key(record)
+            if replaced and key in replaced and key not in streamed_pairs:
+                dropped.append(key)
+            else:
+                records.append(record)
+    records.extend(streamed)
+    schedules = list(iter_sorted(records))
+    write_schedules(schedules, output_file)
+    return len(schedules), sorted(set(dropped))
@@ -0,0 +1,184 @@
+import argparse
+import asyncio
+import json
+import os
+import time
+from typing import Dict, Optional, Tuple
+
+from schedule_io import schedule_key
+from schedule_store import DEFAULT_OBJECTIVE, ScheduleStore
+from timing_cube import TimingCube
+
+
+class Snapshot:
+    """Immutable view of the schedules and the timing cube served to clients."""
+
+    def __init__(self, schedules: Dict[Tuple[str, str, str], Dict], cube: TimingCube, version: Dict):
+        self.schedules = schedules
+        self.cube = cube
+        self.version = version
+        self.loaded_at = time.time()
+
+
+def _mtime(path: Optional[str]) -> Optional[float]:
+    return os.path.getmtime(path) if path and os.path.exists(path) else None
+
+
+def load_snapshot(db_name: str, schedules_path: Optional[str] = None) -> Snapshot:
+    """
+    Read the timing cube from benchmark_result and the rank-1 schedules.
+
+    Schedules come from schedules_path when given, else from the indexed
+    'schedules' table of the database. The database is opened read-only, so
+    loading never changes the file whose modification time is watched.
+    """
+    version = {"db": _mtime(db_name), "schedules": _mtime(schedules_path)}
+    schedules = {}
+    if schedules_path:
+        with open(schedules_path) as f:
+            for schedule_dict in json.load(f):
+                device, application = schedule_key(schedule_dict)
+                schedules[(device, application, DEFAULT_OBJECTIVE)] = schedule_dict
+    else:
+        store = ScheduleStore(db_name, read_only=True)
+        for machine, application, objective, rank in store.keys():
+            if rank == 1:
+                schedules[(machine, application, objective)] = store.get(machine, application, objective)
+        store.close()
+    return Snapshot(schedules, TimingCube.load(db_name), version)
+
+
+class ScheduleServer:
+    """
+    asyncio server answering newline-delimited JSON requests:
+
+        {"op": "best", "device": ..., "application": ..., "objective": "total_time"}
+        {"op": "evaluate", "device": ..., "application": ..., "chunks": [...]}
+        {"op": "reload"} / {"op": "ping"}
+
+    Every request is answered from the current Snapshot. A background task
+    watches the database and schedule file modification times, builds a new
+    Snapshot off the event loop and swaps it in with a single assignment.
+    """
+
+    def __init__(self, db_name: str = "benchmark_results.db", schedules_path: Optional[str] = None,
+                 poll_interval: float = 1.0):
+        self.db_name = db_name
+        self.schedules_path = schedules_path
+        self.poll_interval = poll_interval
+        self.snapshot = load_snapshot(db_name, schedules_path)
+
+    def handle(self, request: Dict) -> Dict:
+        if not isinstance(request, dict):
+            return {"ok": False, "error": "Bad request: expected a JSON object"}
+        op = request.get("op")
+        snap = self.snapshot
+        if op == "best":
+            key = (request["device"], request["application"], request.get("objective", DEFAULT_OBJECTIVE))
+            schedule_dict = snap.schedules.get(key)
+            if schedule_dict is None:
+                return {"ok": False, "error": f"No schedule for {key}"}
+            return {"ok": True, "schedule": schedule_dict}
+        if op == "evaluate":
+            try:
+                result = snap.cube.evaluate(request["device"], request["application"], request["chunks"])
+            except (KeyError, TypeError) as e:
+                return {"ok": False, "error": str(e.args[0]) if e.args else str(e)}
+            return {"ok": True, **result}
+        if op == "ping":
+            return {"ok": True, "schedules": len(snap.schedules), "loaded_at": snap.loaded_at}
+        return {"ok": False, "error": f"Unknown op: {op}"}
+
+    async def reload(self) -> bool:
+        """
+        Swap in a fresh Snapshot. If loading fails (e.g. a half-written
+        schedule file), log it, keep serving the previous one and return False;
+        the watcher retries on its next poll since the versions still differ.
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            self.snapshot = await loop.run_in_executor(None, load_snapshot, self.db_name, self.schedules_path)
+        except Exception as e:
+            print(f"Reload failed, keeping previous data: {e!r}")
+            return False
+        return True
+
+    async def watch(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            current = {"db": _mtime(self.db_name), "schedules": _mtime(self.schedules_path)}
+            if current != self.snapshot.version and await self.reload():
+                print(f"Reloaded {len(self.snapshot.schedules)} schedules")
+
+    async def client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    if isinstance(request, dict) and request.get("op") == "reload":
+                        if await self.reload():
+                            response = {"ok": True, "schedules": len(self.snapshot.schedules)}
+                        else:
+                            response = {"ok": False, "error": "Reload failed, serving the previous data"}
+                    else:
+                        response = self.handle(request)
+                except (ValueError, KeyError, TypeError, AttributeError) as e:
+                    response = {"ok": False, "error": f"Bad request: {e}"}
+                writer.write(json.dumps(response, separators=(",", ":")).encode() + b"\n")
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def serve(self, socket_path: Optional[str] = None, host: str = "127.0.0.1", port: int = 8765):
+        if socket_path:
+            if os.path.exists(socket_path):
+                os.unlink(socket_path)
+            server = await asyncio.start_unix_server(self.client, path=socket_path)
+            print(f"Serving schedules on {socket_path}")
+        else:
+            server = await asyncio.start_server(self.client, host, port)
+            print(f"Serving schedules on {host}:{port}")
+        watcher = asyncio.create_task(self.watch())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            watcher.cancel()
+
+
+async def query(request: Dict, socket_path: Optional[str] = None,
+                host: str = "127.0.0.1", port: int = 8765) -> Dict:
+    """Send one request to a running ScheduleServer and return its response."""
+    if socket_path:
+        reader, writer = await asyncio.open_unix_connection(socket_path)
+    else:
+        reader, writer = await asyncio.open_connection(host, port)
+    writer.write(json.dumps(request).encode() + b"\n")
+    await writer.drain()
+    response = json.loads(await reader.readline())
+    writer.close()
+    await writer.wait_closed()
+    return response
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve schedules and schedule evaluation to local clients.")
+    parser.add_argument("--db", default="benchmark_results.db")
+    parser.add_argument("--schedules", help="serve this all_schedules.json instead of the 'schedules' table")
+    parser.add_argument("--socket", help="Unix socket path (default: TCP on localhost)")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--poll", type=float, default=1.0, help="seconds between change checks")
+    args = parser.parse_args()
+
+    server = ScheduleServer(args.db, args.schedules, args.poll)
+    try:
+        asyncio.run(server.serve(args.socket, port=args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+import argparse
+import json
+import sqlite3
+from typing import Dict, List, Optional
+from urllib.parse import quote
+
+from schedule_io import split_schedule_id
+
+DEFAULT_OBJECTIVE = "total_time"
+
+
+def schedule_rank(schedule_id: str) -> int:
+    """Rank encoded in the '_schedule_NNN' suffix of a schedule_id (1 if absent)."""
+    suffix = schedule_id.rsplit("_schedule_", 1)
+    return int(suffix[1]) if len(suffix) == 2 and suffix[1].isdigit() else 1
+
+
+class ScheduleStore:
+    """
+    Schedules kept in a `schedules` table next to benchmark_result.
+
+    Each row is keyed by (machine_name, application, objective, rank), so a
+    single schedule can be fetched through the unique index without reading
+    the rest of the table.
+
+    With read_only, the database is opened with mode=ro and the table is not
+    created: a database without it reads as an empty store.
+    """
+
+    def __init__(self, db_name: str = "benchmark_results.db", read_only: bool = False):
+        self.db_name = db_name
+        self.missing = False
+        if read_only:
+            self.conn = sqlite3.connect(f"file:{quote(db_name)}?mode=ro", uri=True)
+            self.missing = self.conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'schedules'").fetchone() is None
+            return
+        self.conn = sqlite3.connect(db_name)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS schedules (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                machine_name TEXT NOT NULL,
+                application TEXT NOT NULL,
+                objective TEXT NOT NULL,
+                rank INTEGER NOT NULL,
+                schedule_id TEXT,
+                total_time REAL,
+                max_chunk_time REAL,
+                chunks TEXT NOT NULL,
+                UNIQUE (machine_name, application, objective, rank)
+            )
+        """)
+        self.conn.commit()
+
+    def put(self, schedule_dict: Dict, application: Optional[str] = None,
+            objective: str = DEFAULT_OBJECTIVE, rank: Optional[int] = None, commit: bool = True):
+        """Insert or replace one build_schedule result."""
+        sched = schedule_dict["schedule"]
+        device = sched["device_id"]
+        if application is None:
+            application = split_schedule_id(sched["schedule_id"], device)
+        if rank is None:
+            rank = schedule_rank(sched["schedule_id"])
+        self.conn.execute("""
+            INSERT OR REPLACE INTO schedules
+                (machine_name, application, objective, rank, schedule_id,
+                 total_time, max_chunk_time, chunks)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, (device, application, objective, rank, sched["schedule_id"],
+              schedule_dict.get("total_time"), schedule_dict.get("max_chunk_time"),
+              json.dumps(sched["chunks"], separators=(",", ":"))))
+        if commit:
+            self.conn.commit()
+
+    def put_many(self, schedules: List[Dict], objective: str = DEFAULT_OBJECTIVE):
+        for schedule_dict in schedules:
+            self.put(schedule_dict, objective=objective, commit=False)
+        self.conn.commit()
+
+    def import_json(self, path: str = "all_schedules.json", objective: str = DEFAULT_OBJECTIVE) -> int:
+        """Load an all_schedules.json file into the store; returns the number of rows."""
+        with open(path) as f:
+            schedules = json.load(f)
+        self.put_many(schedules, objective)
+        return len(schedules)
+
+    def get_chunks(self, machine: str, application: str,
+                   objective: str = DEFAULT_OBJECTIVE, rank: int = 1) -> Optional[List[Dict]]:
+        """Chunk list of one schedule, or None if it is not stored."""
+        row = self.conn.execute("""
+            SELECT chunks FROM schedules
+            WHERE machine_name = ? AND application = ? AND objective = ? AND rank = ?
+        """, (machine, application, objective, rank)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get(self, machine: str, application: str,
+            objective: str = DEFAULT_OBJECTIVE, rank: int = 1) -> Optional[Dict]:
+        """Full schedule dictionary in the build_schedule format."""
+        row = self.conn.execute("""
+            SELECT schedule_id, total_time, max_chunk_time, chunks FROM schedules
+            WHERE machine_name = ? AND application = ? AND objective = ? AND rank = ?
+        """, (machine, application, objective, rank)).fetchone()
+        if row is None:
+            return None
+        schedule_id, total_time, max_chunk_time, chunks = row
+        return {
+            "schedule": {
+                "schedule_id": schedule_id,
+                "device_id": machine,
+                "chunks": json.loads(chunks)
+            },
+            "total_time": total_time,
+            "max_chunk_time": max_chunk_time
+        }
+
+    def keys(self) -> List[tuple]:
+        """All stored (machine, application, objective, rank) keys."""
+        if self.missing:
+            return []
+        return self.conn.execute("""
+            SELECT machine_name, application, objective, rank FROM schedules
+            ORDER BY machine_name, application, objective, rank
+        """).fetchall()
+
+    def all(self, objective: str = DEFAULT_OBJECTIVE) -> List[Dict]:
+        """Every rank-1 schedule for an objective, in all_schedules.json order."""
+        return [self.get(m, a, o, r) for m, a, o, r in self.keys() if o == objective and r == 1]
+
+    def close(self):
+        self.conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Indexed schedule store in the benchmark database.")
+    parser.add_argument("--db", default="benchmark_results.db")
+    sub = parser.add_subparsers(dest="command", required=True)
+    imp = sub.add_parser("import", help="load an all_schedules.json file")
+    imp.add_argument("path", nargs="?", default="all_schedules.json")
+    imp.add_argument("--objective", default=DEFAULT_OBJECTIVE)
+    get = sub.add_parser("get", help="print the chunk list of one schedule")
+    get.add_argument("machine")
+    get.add_argument("application")
+    get.add_argument("--objective", default=DEFAULT_OBJECTIVE)
+    get.add_argument("--rank", type=int, default=1)
+    args = parser.parse_args()
+
+    store = ScheduleStore(args.db)
+    if args.command == "import":
+        count = store.import_json(args.path, args.objective)
+        print(f"Stored {count} schedules in {args.db}")
+    else:
+        chunks = store.get_chunks(args.machine, args.application, args.objective, args.rank)
+        if chunks is None:
+            print(f"No schedule for {args.machine}/{args.application} ({args.objective}, rank {args.rank})")
+        else:
+            print(json.dumps(chunks, indent=2))
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
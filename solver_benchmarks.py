@@ -0,0 +1,187 @@
+import argparse
+import random
+import time
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+import chain_dp
+import heuristic
+from Z3_Allocator import CONTIGUITY_ENCODINGS, TIME_UNITS, PipelineOptimizer
+
+SYNTHETIC_BACKENDS = ['VK', 'OMP']
+SYNTHETIC_CORE_TYPES = ['big', 'little', 'medium']
+
+
+def synthetic_times(num_stages: int, seed: int = 0, decimals: int = 3) -> Tuple[Dict, List[str], List[str]]:
+    """
+    Random timing data shaped like get_execution_times output: a GPU backend
+    plus three CPU core types, with per-stage speed factors per resource.
+    Times are rounded to decimals places (3 = microseconds, like the database).
+    """
+    rng = random.Random(seed)
+    speed = {'VK': 0.5, 'big': 1.0, 'medium': 1.6, 'little': 3.5}
+    times = defaultdict(lambda: defaultdict(dict))
+    for s in range(1, num_stages + 1):
+        work = rng.uniform(0.5, 10.0)
+        times[s]['VK'] = round(work * speed['VK'] * rng.uniform(0.3, 3.0), decimals)
+        for c in SYNTHETIC_CORE_TYPES:
+            times[s]['OMP'][c] = round(work * speed[c] * rng.uniform(0.7, 1.3), decimals)
+    return times, list(SYNTHETIC_BACKENDS), list(SYNTHETIC_CORE_TYPES)
+
+
+def bench_encodings(stage_counts: List[int], seed: int = 0, repeat: int = 1):
+    """Solve the same synthetic pipelines with every contiguity encoding and compare."""
+    optimizer = PipelineOptimizer(":memory:")
+    print(f"{'stages':>6}  " + "  ".join(f"{e:>12}" for e in CONTIGUITY_ENCODINGS) + "  objective")
+    for n in stage_counts:
+        times, backends, core_types = synthetic_times(n, seed)
+        elapsed = {}
+        objectives = set()
+        for encoding in CONTIGUITY_ENCODINGS:
+            start = time.perf_counter()
+            for _ in range(repeat):
+                result = optimizer.solve_pipeline(times, backends, core_types, encoding=encoding)
+            elapsed[encoding] = (time.perf_counter() - start) / repeat
+            objectives.add(round(result['total_time'], 6) if result else None)
+        agree = "agree" if len(objectives) == 1 else f"DIFFER {sorted(objectives)}"
+        print(f"{n:>6}  " + "  ".join(f"{elapsed[e] * 1e3:>10.1f}ms" for e in CONTIGUITY_ENCODINGS) + f"  {agree}")
+
+
+def bench_incremental(num_stages: int, num_apps: int, encoding: str = 'pairwise', seed: int = 0):
+    """Solve num_apps synthetic applications of equal shape from scratch and incrementally."""
+    apps = [synthetic_times(num_stages, seed + i) for i in range(num_apps)]
+    print(f"{num_apps} applications x {num_stages} stages, {encoding} encoding")
+    values = {}
+    for incremental in (False, True):
+        optimizer = PipelineOptimizer(":memory:", encoding=encoding, incremental=incremental)
+        start = time.perf_counter()
+        values[incremental] = [round(optimizer.solve_pipeline(*app)['total_time'], 6) for app in apps]
+        elapsed = time.perf_counter() - start
+        label = "incremental" if incremental else "from scratch"
+        print(f"  {label:>12}: {elapsed * 1e3:10.1f}ms total, {elapsed / num_apps * 1e3:8.1f}ms per application")
+    print("  objectives agree" if values[False] == values[True] else f"  objectives DIFFER: {values}")
+
+
+def perturb(times: Dict, scale: float, seed: int = 0) -> Dict:
+    """Copy of synthetic times with every entry scaled by a random factor in [1-scale, 1+scale]."""
+    rng = random.Random(seed)
+    perturbed = defaultdict(lambda: defaultdict(dict))
+    for s, entry in times.items():
+        for b, value in entry.items():
+            if isinstance(value, dict):
+                for c, t in value.items():
+                    perturbed[s][b][c] = round(t * rng.uniform(1 - scale, 1 + scale), 3)
+            else:
+                perturbed[s][b] = round(value * rng.uniform(1 - scale, 1 + scale), 3)
+    return perturbed
+
+
+def bench_warm_start(num_stages: int, trials: int, scale: float, encoding: str = 'pairwise', seed: int = 0):
+    """Re-solve slightly perturbed timings cold and warm-started from the previous optimum."""
+    optimizer = PipelineOptimizer(":memory:", encoding=encoding)
+    cold_ms = warm_ms = 0.0
+    proved = 0
+    for trial in range(trials):
+        times, backends, core_types = synthetic_times(num_stages, seed + trial)
+        previous = optimizer.solve_pipeline(times, backends, core_types)
+        hint = {s: (b, c) for s, (b, c, _) in previous['pipeline'].items()}
+        changed = perturb(times, scale, seed + trial)
+        cold = optimizer.solve_pipeline(changed, backends, core_types)
+        warm = optimizer.solve_pipeline(changed, backends, core_types, hint=hint)
+        if abs(cold['total_time'] - warm['total_time']) > 1e-6:
+            print(f"  trial {trial}: objectives DIFFER {cold['total_time']} vs {warm['total_time']}")
+        cold_ms += cold['solve_ms']
+        warm_ms += warm['solve_ms']
+        proved += warm['warm_start']['proved_optimal']
+    print(f"{trials} trials x {num_stages} stages, +-{scale:.0%} timing change, {encoding} encoding")
+    print(f"  cold: {cold_ms / trials:8.1f}ms   warm: {warm_ms / trials:8.1f}ms   "
+          f"speed-up {cold_ms / max(warm_ms, 1e-9):.1f}x, hint proven optimal in {proved}/{trials}")
+
+
+def bench_bisect(stage_counts: List[int], encoding: str = 'pairwise', seed: int = 0):
+    """Minimize max_chunk_time with Optimize and with bisection over candidate chunk times."""
+    optimize = PipelineOptimizer(":memory:", encoding=encoding, objective='max_chunk_time')
+    bisect = PipelineOptimizer(":memory:", encoding=encoding, objective='max_chunk_time', engine='bisect')
+    print(f"{'stages':>6}  {'optimize':>10}  {'bisect':>10}  checks  ms/check  objective ({encoding} encoding)")
+    for n in stage_counts:
+        times, backends, core_types = synthetic_times(n, seed)
+        results = [engine.solve_pipeline(times, backends, core_types) for engine in (optimize, bisect)]
+        stages, resources, cost = chain_dp.normalize(times, backends, core_types)
+        values = {round(chain_dp.evaluate(cost, [resources.index(r['pipeline'][s][:2]) for s in stages],
+                                          'max_chunk_time'), 6) for r in results}
+        bisection = results[1]['bisection']
+        agree = "agree" if len(values) == 1 else f"DIFFER {sorted(values)}"
+        print(f"{n:>6}  {results[0]['solve_ms']:>8.1f}ms  {results[1]['solve_ms']:>8.1f}ms  "
+              f"{bisection['iterations']:>6}  {sum(bisection['check_ms']) / bisection['iterations']:>8.2f}  {agree}")
+
+
+def bench_quantize(stage_counts: List[int], encoding: str = 'prefix', decimals: int = 6, seed: int = 0):
+    """Solve with Real timings and with timings quantized to each TIME_UNITS unit."""
+    units = [None] + sorted(TIME_UNITS)
+    print(f"{'stages':>6}  " + "  ".join(f"{u or 'real':>10}" for u in units)
+          + f"  worst objective loss ({encoding} encoding, {decimals}-decimal timings)")
+    for n in stage_counts:
+        times, backends, core_types = synthetic_times(n, seed, decimals)
+        results = [PipelineOptimizer(":memory:", encoding=encoding, time_unit=u).solve_pipeline(times, backends, core_types)
+                   for u in units]
+        loss = max(r['total_time'] - results[0]['total_time'] for r in results)
+        print(f"{n:>6}  " + "  ".join(f"{r['solve_ms']:>8.1f}ms" for r in results) + f"  {loss:.3g} ms")
+
+
+def bench_heuristic(stage_counts: List[int], objective: str = 'total_time', seed: int = 0):
+    """Heuristic engine against the exact chain DP on long synthetic pipelines."""
+    print(f"{'stages':>6}  {'heuristic':>10}  {'exact DP':>10}  {'vs optimum':>10}  {'vs bound':>8}  ({objective})")
+    for n in stage_counts:
+        times, backends, core_types = synthetic_times(n, seed)
+        _, _, cost = chain_dp.normalize(times, backends, core_types)
+        value, _, info = heuristic.search(cost, objective)
+        start = time.perf_counter()
+        optimum = chain_dp.solve_exact(cost, objective)[0]
+        exact_ms = (time.perf_counter() - start) * 1e3
+        print(f"{n:>6}  {info['search_ms']:>8.1f}ms  {exact_ms:>8.1f}ms  {(value - optimum) / optimum:>10.2%}  "
+              f"{info['gap']:>8.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks for the pipeline solver formulations.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    enc = sub.add_parser("encodings", help="compare contiguity encodings")
+    enc.add_argument("--stages", type=int, nargs="+", default=[10, 15, 20, 25])
+    enc.add_argument("--repeat", type=int, default=1)
+    inc = sub.add_parser("incremental", help="compare per-application rebuilds with a reused model")
+    inc.add_argument("--stages", type=int, default=12)
+    inc.add_argument("--apps", type=int, default=10)
+    inc.add_argument("--encoding", choices=CONTIGUITY_ENCODINGS, default='pairwise')
+    warm = sub.add_parser("warmstart", help="compare cold solves with solves warm-started from the previous optimum")
+    warm.add_argument("--stages", type=int, default=12)
+    warm.add_argument("--trials", type=int, default=5)
+    warm.add_argument("--scale", type=float, default=0.02)
+    warm.add_argument("--encoding", choices=CONTIGUITY_ENCODINGS, default='pairwise')
+    bis = sub.add_parser("bisect", help="compare Optimize with bisection on max_chunk_time")
+    bis.add_argument("--stages", type=int, nargs="+", default=[10, 15, 20])
+    bis.add_argument("--encoding", choices=CONTIGUITY_ENCODINGS, default='prefix')
+    quant = sub.add_parser("quantize", help="compare Real timings with integer-quantized timings")
+    quant.add_argument("--stages", type=int, nargs="+", default=[10, 15, 20])
+    quant.add_argument("--encoding", choices=CONTIGUITY_ENCODINGS, default='prefix')
+    quant.add_argument("--decimals", type=int, default=6)
+    heur = sub.add_parser("heuristic", help="compare the heuristic engine with the exact chain DP")
+    heur.add_argument("--stages", type=int, nargs="+", default=[100, 300, 1000])
+    heur.add_argument("--objective", choices=chain_dp.OBJECTIVES, default='total_time')
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    if args.command == "encodings":
+        bench_encodings(args.stages, args.seed, args.repeat)
+    elif args.command == "incremental":
+        bench_incremental(args.stages, args.apps, args.encoding, args.seed)
+    elif args.command == "quantize":
+        bench_quantize(args.stages, args.encoding, args.decimals, args.seed)
+    elif args.command == "heuristic":
+        bench_heuristic(args.stages, args.objective, args.seed)
+    elif args.command == "bisect":
+        bench_bisect(args.stages, args.encoding, args.seed)
+    else:
+        bench_warm_start(args.stages, args.trials, args.scale, args.encoding, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+import itertools
+import math
+import os
+import random
+import unittest
+
+import chain_dp
+import heuristic
+from Z3_Allocator import PipelineOptimizer
+
+DB_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_results.db")
+
+
+def brute_force(cost, objective):
+    """Optimum over every assignment using each resource in exactly one contiguous block."""
+    n, m = len(cost), len(cost[0])
+    best = math.inf
+    for assignment in itertools.product(range(m), repeat=n):
+        blocks = [k for i, k in enumerate(assignment) if i == 0 or assignment[i - 1] != k]
+        if sorted(blocks) != list(range(m)):
+            continue
+        if any(cost[i][k] == math.inf for i, k in enumerate(assignment)):
+            continue
+        best = min(best, chain_dp.evaluate(cost, assignment, objective))
+    return best
+
+
+def random_cost(rng, n, m, missing=0.2):
+    return [[math.inf if rng.random() < missing else round(rng.uniform(0.1, 10.0), 3) for _ in range(m)]
+            for _ in range(n)]
+
+
+class TestChainDP(unittest.TestCase):
+
+    def test_missing_timing_mid_column(self):
+        # Resource 0 has no timing for stage 1, but stages 2-3 can still run on it.
+        cost = [[1.0, 5.0], [math.inf, 1.0], [1.0, 5.0], [1.0, 5.0]]
+        value, assignment = chain_dp.solve_order(cost, [1, 0])
+        self.assertEqual(assignment, [1, 1, 0, 0])
+        self.assertAlmostEqual(value, 8.0)
+        value, assignment, _ = chain_dp.solve_exact(cost, 'max_chunk_time')
+        self.assertEqual(assignment, [1, 1, 0, 0])
+        self.assertAlmostEqual(value, 6.0)
+
+    def test_solve_exact_matches_brute_force(self):
+        rng = random.Random(1)
+        for _ in range(300):
+            cost = random_cost(rng, rng.randint(1, 7), rng.randint(1, 3))
+            for objective in chain_dp.OBJECTIVES:
+                value, assignment, exhaustive = chain_dp.solve_exact(cost, objective)
+                expected = brute_force(cost, objective)
+                self.assertTrue(exhaustive)
+                if expected == math.inf:
+                    self.assertIsNone(assignment)
+                else:
+                    self.assertAlmostEqual(value, expected)
+                    self.assertAlmostEqual(chain_dp.evaluate(cost, assignment, objective), expected)
+
+    def test_lower_bounds(self):
+        rng = random.Random(2)
+        for _ in range(300):
+            cost = random_cost(rng, rng.randint(3, 7), rng.randint(1, 3), missing=0.0)
+            for objective in chain_dp.OBJECTIVES:
+                optimum = brute_force(cost, objective)
+                self.assertLessEqual(chain_dp.lower_bound(cost, objective), optimum + chain_dp.EPSILON)
+                self.assertLessEqual(heuristic.lower_bound(cost, objective), optimum + chain_dp.EPSILON)
+
+    def test_heuristic_is_feasible(self):
+        rng = random.Random(3)
+        for _ in range(100):
+            cost = random_cost(rng, rng.randint(3, 7), rng.randint(1, 3), missing=0.1)
+            for objective in chain_dp.OBJECTIVES:
+                optimum = brute_force(cost, objective)
+                value, assignment, info = heuristic.search(cost, objective)
+                if assignment is None:
+                    continue
+                self.assertGreaterEqual(value, optimum - chain_dp.EPSILON)
+                self.assertAlmostEqual(chain_dp.evaluate(cost, assignment, objective), value)
+                self.assertLessEqual(info['lower_bound'], value + chain_dp.EPSILON)
+
+    def test_heuristic_between_bound_and_optimum(self):
+        rng = random.Random(5)
+        for _ in range(100):
+            cost = random_cost(rng, rng.randint(4, 12), rng.randint(2, 4), missing=0.0)
+            for objective in chain_dp.OBJECTIVES:
+                optimum, _, _ = chain_dp.solve_exact(cost, objective)
+                value, _, info = heuristic.search(cost, objective, time_limit_ms=1000.0)
+                self.assertLessEqual(info['lower_bound'], optimum + chain_dp.EPSILON)
+                self.assertLessEqual(optimum, value + chain_dp.EPSILON)
+
+    def test_heuristic_on_benchmarks(self):
+        # The search finds the total_time optimum on every pair but one, where it stops at 0.769 vs 0.688 ms.
+        optimizer = PipelineOptimizer(DB_FILE)
+        for machine, app in optimizer.list_pairs():
+            backends, core_types = optimizer.get_machine_resources(machine, app)
+            _, _, cost = chain_dp.normalize(optimizer.get_execution_times(machine, app), backends, core_types)
+            optimum, _, _ = chain_dp.solve_exact(cost, 'total_time')
+            value, _, _ = heuristic.search(cost, 'total_time', time_limit_ms=1000.0)
+            if (machine, app) == ('9b034f1b', 'CifarSparse'):
+                self.assertAlmostEqual(optimum, 0.688)
+                self.assertAlmostEqual(value, 0.769)
+            else:
+                self.assertAlmostEqual(value, optimum)
+
+    def test_dominated_options_keep_the_optimum(self):
+        rng = random.Random(4)
+        for _ in range(100):
+            cost = random_cost(rng, rng.randint(3, 6), rng.randint(1, 3), missing=0.0)
+            for objective in chain_dp.OBJECTIVES:
+                optimum, assignment, _ = chain_dp.solve_exact(cost, objective)
+                pruned = set(chain_dp.dominated_options(cost, optimum, objective))
+                self.assertFalse(pruned & set(enumerate(assignment)))
+
+
+if __name__ == '__main__':
+    unittest.main()
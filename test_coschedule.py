@@ -0,0 +1,48 @@
+import os
+import unittest
+from collections import defaultdict
+
+from Z3_Allocator import PipelineOptimizer
+
+DB_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_results.db")
+TARGETS = {"Tree": 30.0, "CifarSparse": 60.0, "CifarDense": 5.0}
+
+
+class TestCoschedule(unittest.TestCase):
+
+    def setUp(self):
+        self.optimizer = PipelineOptimizer(DB_FILE)
+        self.machines = sorted({m for m, _ in self.optimizer.list_pairs()})
+
+    def budgets(self, results):
+        """hardware -> application -> share of the resource's time."""
+        shares = defaultdict(dict)
+        for application, result in results.items():
+            for hardware, budget in result['coschedule']['budget'].items():
+                shares[hardware][application] = budget
+        return shares
+
+    def test_budgets_fit_every_resource(self):
+        for machine in self.machines:
+            for disjoint in (False, True):
+                results = self.optimizer.coschedule(machine, TARGETS, disjoint)
+                self.assertIsNotNone(results)
+                for hardware, shares in self.budgets(results).items():
+                    self.assertLessEqual(sum(shares.values()), 1.0 + 1e-5, (machine, hardware))
+                # The busiest resource is exactly saturated at the achieved rates.
+                self.assertAlmostEqual(max(sum(s.values()) for s in self.budgets(results).values()), 1.0, places=5)
+
+    def test_disjoint_never_shares_a_resource(self):
+        for machine in self.machines:
+            results = self.optimizer.coschedule(machine, TARGETS, disjoint=True)
+            for hardware, shares in self.budgets(results).items():
+                self.assertEqual(len(shares), 1, (machine, hardware, shares))
+            used = defaultdict(set)
+            for application, result in results.items():
+                for b, c, _ in result['pipeline'].values():
+                    used[self.optimizer.hardware_of(b, c)].add(application)
+            self.assertTrue(all(len(apps) == 1 for apps in used.values()), (machine, dict(used)))
+
+
+if __name__ == '__main__':
+    unittest.main()
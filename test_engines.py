@@ -0,0 +1,38 @@
+import contextlib
+import io
+import os
+import unittest
+
+from Z3_Allocator import PipelineOptimizer
+
+DB_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_results.db")
+
+
+def schedules(**kwargs):
+    """Schedule dicts of every pair in the database, solved with these options."""
+    optimizer = PipelineOptimizer(DB_FILE, **kwargs)
+    with contextlib.redirect_stdout(io.StringIO()):
+        return [optimizer.build_schedule(machine, app, optimizer.optimize_pipeline(machine, app))
+                for machine, app in optimizer.list_pairs()]
+
+
+def solve_all(**kwargs):
+    """(max_chunk_time, total_time) per pair, rounded to the nanosecond."""
+    return [(round(entry["max_chunk_time"], 6), round(entry["total_time"], 6)) for entry in schedules(**kwargs)]
+
+
+class TestEngines(unittest.TestCase):
+
+    def test_bisect_breaks_ties_like_optimize(self):
+        for time_unit in [None, 'us']:
+            expected = solve_all(objective='max_chunk_time', time_unit=time_unit)
+            self.assertEqual(solve_all(objective='max_chunk_time', engine='bisect', time_unit=time_unit),
+                             expected)
+
+    def test_incremental_matches_from_scratch(self):
+        for encoding in ['pairwise', 'prefix']:
+            self.assertEqual(schedules(encoding=encoding, incremental=True), schedules(encoding=encoding))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import contextlib
+import io
+import os
+import unittest
+
+from fleet_planner import FleetPlanner, transfer_ms
+from timing_cube import TimingCube
+from Z3_Allocator import OBJECTIVES, PipelineOptimizer
+
+DB_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_results.db")
+
+
+class TestFleetPlanner(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.cube = TimingCube.load(DB_FILE)
+
+    def test_single_machine_matches_optimizer(self):
+        # Fleet resources are optional, so compare with an optimizer that lets resources go unused.
+        optimizer = PipelineOptimizer(DB_FILE, optional_resources=True)
+        for objective in OBJECTIVES:
+            optimizer.objective = objective
+            planner = FleetPlanner(self.cube, objective=objective, optimizer=optimizer)
+            for machine, app in optimizer.list_pairs():
+                plan = planner.plan(app, [machine])
+                with contextlib.redirect_stdout(io.StringIO()):
+                    expected = optimizer.build_schedule(machine, app, optimizer.optimize_pipeline(machine, app))
+                self.assertEqual(plan["transfers"], [])
+                self.assertAlmostEqual(plan["total_time"], expected["total_time"], places=6)
+                if objective == 'max_chunk_time':
+                    self.assertAlmostEqual(plan["max_chunk_time"], expected["max_chunk_time"], places=6)
+                chunks = [(c["hardware"], c["threads"]) for c in plan["schedules"][0]["chunks"]]
+                self.assertTrue(all(threads > 0 for hardware, threads in chunks if hardware != "gpu"))
+
+    def test_transfer_counted_once_per_machine_change(self):
+        machines = sorted({m for m, _ in self.cube.pairs()})
+        planner = FleetPlanner(self.cube, latency_ms=0.01, bandwidth_mbps=1e5, payload_kb=1.0)
+        link = transfer_ms(0.01, 1e5, 1.0)
+        crossed = 0
+        for app in sorted({a for _, a in self.cube.pairs()}):
+            plan = planner.plan(app, machines)
+            on = {s: schedule["device_id"] for schedule in plan["schedules"]
+                  for chunk in schedule["chunks"] for s in chunk["stages"]}
+            stages = sorted(on)
+            changes = [s for s, following in zip(stages, stages[1:]) if on[s] != on[following]]
+            self.assertEqual([t["after_stage"] for t in plan["transfers"]], changes)
+            self.assertAlmostEqual(plan["link_time"], len(changes) * link)
+            chunk_time = sum(c["time"] for schedule in plan["schedules"] for c in schedule["chunks"])
+            self.assertAlmostEqual(plan["total_time"], chunk_time + plan["link_time"], places=6)
+            crossed += len(changes)
+        self.assertGreater(crossed, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
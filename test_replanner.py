@@ -0,0 +1,63 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from replanner import Replanner
+from schedule_io import schedule_key
+from timing_cube import TimingCube
+
+DB_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_results.db")
+SCHEDULES_FILE = os.path.join(os.path.dirname(DB_FILE), "all_schedules.json")
+
+
+class TestReplanner(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        with open(SCHEDULES_FILE) as f:
+            self.schedules = json.load(f)
+        self.replanner = Replanner(TimingCube.load(DB_FILE), self.schedules, alpha=0.2, tolerance=0.05)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_drift_past_tolerance_replans_once(self):
+        for schedule_dict in self.schedules:
+            device, application = schedule_key(schedule_dict)
+            self.assertIsNone(self.replanner.check(device, application))
+            # Slow down the longest chunk's first stage on its hardware, sample after sample.
+            chunk = max(schedule_dict["schedule"]["chunks"], key=lambda c: len(c["stages"]))
+            stage, hardware = chunk["stages"][0], chunk["hardware"]
+            nominal = self.replanner.estimates[(device, application)][stage][hardware]
+            record = {"device": device, "application": application, "stage": stage, "hardware": hardware}
+            # A 1% drift keeps the schedule within the 5% tolerance of any optimum.
+            for _ in range(30):
+                self.assertIsNone(self.replanner.observe(dict(record, time_ms=1.01 * nominal)))
+            replans = [self.replanner.observe(dict(record, time_ms=50 * nominal + 10.0)) for _ in range(30)]
+            replanned = [i for i, result in enumerate(replans) if result is not None]
+            self.assertEqual(len(replanned), 1, (device, application, replanned))
+            placed = {s: c["hardware"] for c in replans[replanned[0]]["schedule"]["chunks"] for s in c["stages"]}
+            self.assertNotEqual(placed[stage], hardware)
+
+    def test_publish_replaces_the_file_atomically(self):
+        path = os.path.join(self.tmp, "live_schedules.json")
+        with open(path, "w") as f:
+            json.dump(self.schedules, f)
+        inode = os.stat(path).st_ino
+        with mock.patch("schedule_io.json.dump", side_effect=RuntimeError("disk full")):
+            with self.assertRaises(RuntimeError):
+                self.replanner.publish(path)
+        with open(path) as f:
+            self.assertEqual(json.load(f), self.schedules)
+        self.replanner.publish(path)
+        self.assertNotEqual(os.stat(path).st_ino, inode)
+        self.assertFalse(os.path.exists(path + ".tmp"))
+        with open(path) as f:
+            self.assertEqual(len(json.load(f)), len(self.schedules))
+
+
+if __name__ == '__main__':
+    unittest.main()
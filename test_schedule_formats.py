@@ -0,0 +1,141 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import columnar_export
+import schedule_binary
+import schedule_io
+from Z3_Allocator import PipelineOptimizer
+
+SCHEDULES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "all_schedules.json")
+DB_FILE = os.path.join(os.path.dirname(SCHEDULES_FILE), "benchmark_results.db")
+
+
+def sample_schedules():
+    """The published schedules plus one with a non-contiguous stage set, a high stage and no affinity."""
+    with open(SCHEDULES_FILE) as f:
+        schedules = json.load(f)
+    schedules.append({
+        "schedule": {
+            "schedule_id": "dev_App_schedule_001",
+            "device_id": "dev",
+            "chunks": [
+                {"name": "chunk1", "hardware": "big", "threads": 2, "affinity": [6, 7], "stages": [1, 3]},
+                {"name": "chunk2", "hardware": "gpu", "threads": 0, "affinity": [], "stages": [70, 71, 72]}
+            ]
+        },
+        "total_time": 1.25,
+        "max_chunk_time": 0.75
+    })
+    return schedules
+
+
+class TestScheduleFormats(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.schedules = sample_schedules()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_binary_round_trip(self):
+        reader = schedule_binary.ScheduleFile(buffer=schedule_binary.encode_schedules(self.schedules))
+        self.assertEqual(list(reader), self.schedules)
+        device, application = schedule_io.schedule_key(self.schedules[0])
+        self.assertEqual(reader.get_chunks(device, application), self.schedules[0]["schedule"]["chunks"])
+        self.assertIsNone(reader.get_chunks("missing", application))
+        reader.close()
+
+    def test_binary_file_round_trip(self):
+        json_path = os.path.join(self.tmp, "schedules.json")
+        with open(json_path, "w") as f:
+            json.dump(self.schedules, f)
+        bin_path = os.path.join(self.tmp, "schedules.bin")
+        schedule_binary.json_to_binary(json_path, bin_path)
+        schedule_binary.binary_to_json(bin_path, json_path)
+        with open(json_path) as f:
+            self.assertEqual(json.load(f), self.schedules)
+
+    def test_columnar_round_trip(self):
+        schedules_path = os.path.join(self.tmp, "schedules.json")
+        with open(schedules_path, "w") as f:
+            json.dump(self.schedules, f)
+        out_dir = os.path.join(self.tmp, "columns")
+        columnar_export.export_columnar(out_dir, DB_FILE, schedules_path)
+        dataset = columnar_export.load_columnar(out_dir)
+        self.assertEqual(dataset.schedules(), self.schedules)
+
+    def test_stream_compaction(self):
+        stream_path = os.path.join(self.tmp, "stream.jsonl")
+        output_path = os.path.join(self.tmp, "schedules.json")
+        with open(output_path, "w") as f:
+            json.dump(self.schedules, f)
+        with schedule_io.ScheduleStreamWriter(stream_path) as writer:
+            for schedule_dict in self.schedules[1:]:
+                writer.write(schedule_dict)
+        with open(stream_path, "a") as f:
+            f.write('{"schedule": {"sched')
+        stale = schedule_io.schedule_key(self.schedules[0])
+        count, dropped = schedule_io.compact_schedule_stream(stream_path, output_path, replaced={stale})
+        self.assertEqual(dropped, [stale])
+        with open(output_path) as f:
+            written = json.load(f)
+        self.assertEqual(count, len(self.schedules) - 1)
+        self.assertEqual(written, list(schedule_io.iter_sorted(self.schedules[1:])))
+
+
+class TestStreamResume(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.stream = os.path.join(self.tmp, "stream.jsonl")
+        self.output = os.path.join(self.tmp, "schedules.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def run_optimizer(self, objective):
+        optimizer = PipelineOptimizer(DB_FILE, objective=objective)
+        optimizer.collect_and_save_all_schedules(self.output, stream_file=self.stream)
+        with open(self.output) as f:
+            return optimizer, json.load(f)
+
+    def test_resume_only_with_matching_options(self):
+        optimizer = PipelineOptimizer(DB_FILE)
+        schedule_io.prepare_stream(self.stream, optimizer.run_options())
+        stale = sample_schedules()[0]
+        stale["total_time"] = -1.0
+        with schedule_io.ScheduleStreamWriter(self.stream) as writer:
+            writer.write(stale)
+        # Other options: the partial stream is set aside and every pair solved.
+        _, published = self.run_optimizer('max_chunk_time')
+        self.assertTrue(os.path.exists(self.stream + ".stale"))
+        self.assertNotIn(-1.0, [entry["total_time"] for entry in published])
+        # Same options: the interrupted run's pairs are kept.
+        os.remove(self.output)
+        schedule_io.prepare_stream(self.stream, optimizer.run_options())
+        with schedule_io.ScheduleStreamWriter(self.stream) as writer:
+            writer.write(stale)
+        _, published = self.run_optimizer('total_time')
+        self.assertIn(stale, published)
+
+    def test_second_run_after_compaction(self):
+        _, first = self.run_optimizer('total_time')
+        self.assertFalse(os.path.exists(self.stream))
+        self.assertTrue(os.path.exists(self.stream + ".done"))
+        optimizer, second = self.run_optimizer('max_chunk_time')
+        self.assertEqual(len(second), len(first))
+        # max_chunk_time has tied optima, so compare the objective rather than the chunks.
+        expected = {}
+        for machine, app in optimizer.list_pairs():
+            schedule_dict = optimizer.build_schedule(machine, app, optimizer.optimize_pipeline(machine, app))
+            expected[(machine, app)] = round(schedule_dict['max_chunk_time'], 6)
+        self.assertEqual({schedule_io.schedule_key(entry): round(entry['max_chunk_time'], 6)
+                          for entry in second}, expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
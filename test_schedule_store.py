@@ -0,0 +1,55 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from schedule_io import schedule_key
+from schedule_store import ScheduleStore
+
+SCHEDULES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "all_schedules.json")
+
+
+class TestScheduleStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.store = ScheduleStore(os.path.join(self.tmp, "schedules.db"))
+        with open(SCHEDULES_FILE) as f:
+            self.schedules = json.load(f)
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.tmp)
+
+    def test_round_trip(self):
+        self.assertEqual(self.store.import_json(SCHEDULES_FILE), len(self.schedules))
+        self.assertEqual(self.store.all(), self.schedules)
+        first = self.schedules[0]
+        device, application = schedule_key(first)
+        self.assertEqual(self.store.get_chunks(device, application), first["schedule"]["chunks"])
+        self.assertIsNone(self.store.get_chunks(device, application, objective="max_chunk_time"))
+
+    def test_reindex_replaces_rows(self):
+        self.store.import_json(SCHEDULES_FILE)
+        changed = json.loads(json.dumps(self.schedules))
+        changed[0]["total_time"] += 1.0
+        self.store.put_many(changed)
+        self.store.import_json(SCHEDULES_FILE, objective="max_chunk_time")
+        keys = self.store.keys()
+        self.assertEqual(len(keys), len(set(keys)))
+        self.assertEqual(len(keys), 2 * len(self.schedules))
+        self.assertEqual(self.store.all(), changed)
+        self.assertEqual(self.store.all("max_chunk_time"), self.schedules)
+
+    def test_read_only_store(self):
+        path = os.path.join(self.tmp, "empty.db")
+        open(path, "w").close()
+        store = ScheduleStore(path, read_only=True)
+        self.assertEqual(store.keys(), [])
+        store.close()
+        self.assertEqual(os.path.getsize(path), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import thermal
+from Z3_Allocator import PipelineOptimizer
+
+DB_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_results.db")
+FACTORS = {"big": 1.8, "gpu": 1.3}
+
+
+class TestThermal(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.db = os.path.join(self.tmp, "benchmark_results.db")
+        shutil.copy(DB_FILE, self.db)
+        self.store = thermal.ThermalStore(self.db)
+        self.store.derive("hot", FACTORS)
+        self.optimizer = PipelineOptimizer(self.db)
+
+    def tearDown(self):
+        self.optimizer.conn.close()
+        self.store.close()
+        shutil.rmtree(self.tmp)
+
+    def test_derived_state_scales_nominal_timings(self):
+        for machine, app in self.optimizer.list_pairs():
+            nominal = self.optimizer.get_execution_times(machine, app)
+            hot = self.store.overlay(nominal, machine, app, "hot")
+            for s, entry in nominal.items():
+                for b, value in entry.items():
+                    for c, time_ms in (value.items() if isinstance(value, dict) else [(None, value)]):
+                        if isinstance(value, dict) and c is None:
+                            continue
+                        factor = FACTORS.get(thermal.hardware_name(b, c), 1.0)
+                        self.assertAlmostEqual(thermal._timing(hot, s, b, c), time_ms * factor)
+
+    def test_switch_thresholds_follow_the_interpolation(self):
+        rules = 0
+        for machine, app in self.optimizer.list_pairs():
+            nominal = self.optimizer.get_execution_times(machine, app)
+            hot = self.store.overlay(nominal, machine, app, "hot")
+            backends, core_types = self.optimizer.get_machine_resources(machine, app)
+            pipelines = [self.optimizer.solve_pipeline(t, backends, core_types)['pipeline'] for t in (nominal, hot)]
+            for (current, current_times), (alternative, alternative_times) in [
+                    ((pipelines[0], nominal), (pipelines[1], hot)), ((pipelines[1], hot), (pipelines[0], nominal))]:
+                rule = thermal.switch_rule(current, alternative, current_times, alternative_times, 'total_time')
+                if rule is None:
+                    continue
+                rules += 1
+                start = thermal.chunk_times(current, current_times)
+                end = thermal.chunk_times(current, alternative_times)
+                resource = max(start, key=lambda r: abs(end[r] - start[r]))
+                self.assertEqual(thermal.hardware_name(*resource), rule["hardware"])
+
+                def objectives(threshold):
+                    weight = (threshold - start[resource]) / (end[resource] - start[resource])
+                    values = []
+                    for pipeline in (current, alternative):
+                        a = thermal.chunk_times(pipeline, current_times)
+                        b = thermal.chunk_times(pipeline, alternative_times)
+                        values.append(sum((1 - weight) * a[r] + weight * b[r] for r in a))
+                    return values
+
+                # Past the switch threshold the alternative wins by the margin; at the exit
+                # threshold the current schedule does (or it is the current state's value).
+                current_value, alternative_value = objectives(rule["threshold_ms"])
+                self.assertLess(alternative_value, (1 - thermal.DEFAULT_MARGIN) * current_value + 1e-5)
+                if rule["exit_ms"] != rule["current_ms"]:
+                    current_value, alternative_value = objectives(rule["exit_ms"])
+                    self.assertLess(current_value, (1 - thermal.DEFAULT_MARGIN) * alternative_value + 1e-5)
+                if rule["when"] == "above":
+                    self.assertLess(rule["exit_ms"], rule["threshold_ms"])
+                else:
+                    self.assertGreater(rule["exit_ms"], rule["threshold_ms"])
+        self.assertGreater(rules, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
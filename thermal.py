@@ -0,0 +1,287 @@
+import argparse
+import csv
+import json
+import sqlite3
+from typing import Dict, List, Optional, Tuple
+
+from timing_cube import hardware_name
+from Z3_Allocator import OBJECTIVES, PipelineOptimizer
+
+NOMINAL = "nominal"
+# Grid used to locate where an alternative schedule overtakes the current one.
+CROSSOVER_STEPS = 1000
+# Relative objective gain required before a switch (and before switching back).
+DEFAULT_MARGIN = 0.02
+
+
+class ThermalStore:
+    """
+    Benchmark rows tagged with a thermal or DVFS state, kept in a
+    `thermal_result` table next to benchmark_result.
+
+    The untagged benchmark_result rows are the "nominal" state. A tagged
+    state only needs the rows that differ (e.g. big cores after sustained
+    load); every other timing falls back to the nominal one.
+    """
+
+    def __init__(self, db_name: str = "benchmark_results.db"):
+        self.db_name = db_name
+        self.conn = sqlite3.connect(db_name)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS thermal_result (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                state TEXT NOT NULL,
+                machine_name TEXT,
+                application TEXT,
+                backend TEXT,
+                stage INTEGER,
+                core_type TEXT,
+                num_threads INTEGER,
+                time_ms REAL,
+                UNIQUE (state, machine_name, application, backend, stage, core_type, num_threads)
+            )
+        """)
+        self.conn.commit()
+
+    def put_rows(self, state: str, rows: List[Tuple]):
+        """Insert or replace (machine, application, backend, stage, core_type, num_threads, time_ms) rows."""
+        if state == NOMINAL:
+            raise ValueError(f"'{NOMINAL}' is the untagged benchmark_result data")
+        self.conn.executemany("""
+            INSERT OR REPLACE INTO thermal_result
+                (state, machine_name, application, backend, stage, core_type, num_threads, time_ms)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, [(state,) + tuple(row) for row in rows])
+        self.conn.commit()
+
+    def import_csv(self, path: str, state: str) -> int:
+        """Tag the rows of a CSV with benchmark_result's column names; returns the number of rows."""
+        with open(path, newline="") as f:
+            rows = [(r["machine_name"], r["application"], r["backend"], int(r["stage"]), r["core_type"],
+                     int(r["num_threads"]), float(r["time_ms"])) for r in csv.DictReader(f)]
+        self.put_rows(state, rows)
+        return len(rows)
+
+    def derive(self, state: str, factors: Dict[str, float], machine: Optional[str] = None) -> int:
+        """
+        Tag scaled copies of the nominal rows: every timing on a hardware in
+        factors ('big', 'gpu', ...) is multiplied by its factor. Useful when
+        only a throttling ratio has been measured.
+        """
+        query = """
+            SELECT machine_name, application, backend, stage, core_type, num_threads, time_ms
+            FROM benchmark_result WHERE stage > 0 AND time_ms IS NOT NULL
+        """
+        params = ()
+        if machine:
+            query += " AND machine_name = ?"
+            params = (machine,)
+        rows = []
+        for row in self.conn.execute(query, params).fetchall():
+            hardware = hardware_name(row[2], row[4])
+            if hardware in factors:
+                rows.append(row[:6] + (row[6] * factors[hardware],))
+        self.put_rows(state, rows)
+        return len(rows)
+
+    def states(self, machine: str, application: str) -> List[str]:
+        """Nominal first, then the tagged states of a pair."""
+        rows = self.conn.execute("""
+            SELECT DISTINCT state FROM thermal_result
+            WHERE machine_name = ? AND application = ? ORDER BY state
+        """, (machine, application)).fetchall()
+        return [NOMINAL] + [row[0] for row in rows]
+
+    def overlay(self, times: Dict, machine: str, application: str, state: str) -> Dict:
+        """Nominal get_execution_times output with the state's minimum timings substituted in place."""
+        if state == NOMINAL:
+            return times
+        rows = self.conn.execute("""
+            SELECT stage, backend, core_type, MIN(time_ms) as min_time
+            FROM thermal_result
+            WHERE state = ? AND machine_name = ? AND application = ? AND stage > 0
+            GROUP BY stage, backend, core_type
+            HAVING min_time IS NOT NULL
+        """, (state, machine, application)).fetchall()
+        state_times = {s: {b: dict(v) if isinstance(v, dict) else v for b, v in entry.items()}
+                       for s, entry in times.items()}
+        for stage, backend, core_type, min_time in rows:
+            entry = state_times.setdefault(stage, {})
+            if backend in ['CUDA', 'VK'] or core_type == 'None':
+                entry[backend] = float(min_time)
+            else:
+                entry.setdefault(backend, {})[core_type] = float(min_time)
+        return state_times
+
+    def close(self):
+        self.conn.close()
+
+
+def _timing(times: Dict, s: int, b: str, c: Optional[str]) -> float:
+    return times[s][b] if c is None else times[s][b][c]
+
+
+def chunk_times(pipeline: Dict, times: Dict) -> Dict[Tuple[str, str], float]:
+    """Per resource, the chunk time of a schedule's stages under the given timings."""
+    chunks = {}
+    for s, (b, c, _) in pipeline.items():
+        chunks[(b, c)] = chunks.get((b, c), 0.0) + _timing(times, s, b, c)
+    return chunks
+
+
+def objective_value(chunks: Dict, objective: str) -> float:
+    return max(chunks.values()) if objective == 'max_chunk_time' else sum(chunks.values())
+
+
+def switch_rule(current: Dict, alternative: Dict, current_times: Dict, alternative_times: Dict,
+                objective: str, margin: float = DEFAULT_MARGIN) -> Optional[Dict]:
+    """
+    When to leave the current schedule for the alternative, and when to
+    come back.
+
+    Timings are interpolated linearly from the current state (0) to the
+    alternative's state (1). The monitored signal is the current
+    schedule's chunk whose time moves most between the two states. The
+    switch threshold is that chunk's time at the first point where the
+    alternative's objective beats the current one's by the relative
+    margin; the exit threshold is its time at the last point before that
+    where the current schedule still beats the alternative by the margin
+    (its time in the current state if it never does). The band between the
+    two keeps a signal hovering near the break-even point from flapping
+    between schedules. Returns None when the alternative never wins by the
+    margin or no chunk time moves.
+    """
+    def at(pipeline, step):
+        start, end = chunk_times(pipeline, current_times), chunk_times(pipeline, alternative_times)
+        weight = step / CROSSOVER_STEPS
+        return {r: (1 - weight) * start[r] + weight * end[r] for r in start}
+
+    def beats(better, worse, step):
+        worse_value = objective_value(at(worse, step), objective)
+        return objective_value(at(better, step), objective) < (1 - margin) * worse_value - 1e-9
+
+    start, end = chunk_times(current, current_times), chunk_times(current, alternative_times)
+    monitored = max(start, key=lambda r: abs(end[r] - start[r]))
+    if abs(end[monitored] - start[monitored]) < 1e-9:
+        return None
+    enter = next((step for step in range(CROSSOVER_STEPS + 1) if beats(alternative, current, step)), None)
+    if enter is None:
+        return None
+    leave = next((step for step in range(enter, -1, -1) if beats(current, alternative, step)), 0)
+    b, c = monitored
+    return {
+        "hardware": hardware_name(b, c),
+        "when": "above" if end[monitored] > start[monitored] else "below",
+        "threshold_ms": round(at(current, enter)[monitored], 6),
+        "exit_ms": round(at(current, leave)[monitored], 6),
+        "current_ms": round(start[monitored], 6)
+    }
+
+
+class ThermalPlanner:
+    """
+    A schedule per thermal/DVFS state of a pair and a switch table telling
+    the runtime which observed chunk time should make it move to the
+    schedule of another state, so it can adapt without re-solving. A rule
+    fires when the chunk crosses threshold_ms and is undone only once it
+    crosses back past exit_ms (see switch_rule).
+    """
+
+    def __init__(self, optimizer: PipelineOptimizer, store: ThermalStore, margin: float = DEFAULT_MARGIN):
+        self.optimizer = optimizer
+        self.store = store
+        self.margin = margin
+
+    def plan(self, machine: str, application: str) -> Optional[Dict]:
+        optimizer = self.optimizer
+        times = optimizer.get_execution_times(machine, application)
+        if not times:
+            return None
+        backends, core_types = optimizer.get_machine_resources(machine, application)
+        state_times, results, schedules = {}, {}, {}
+        for state in self.store.states(machine, application):
+            state_times[state] = self.store.overlay(times, machine, application, state)
+            result = optimizer.solve_pipeline(state_times[state], backends, core_types)
+            if result is None:
+                continue
+            results[state] = result
+            schedules[state] = optimizer.build_schedule(machine, application, result)
+            schedules[state]["state"] = state
+
+        switch_table = []
+        for current in results:
+            for alternative in results:
+                if current == alternative or results[current]['pipeline'] == results[alternative]['pipeline']:
+                    continue
+                rule = switch_rule(results[current]['pipeline'], results[alternative]['pipeline'],
+                                   state_times[current], state_times[alternative], optimizer.objective,
+                                   self.margin)
+                if rule:
+                    switch_table.append(dict({"from": current, "to": alternative}, **rule))
+        return {
+            "device_id": machine,
+            "application": application,
+            "objective": optimizer.objective,
+            "schedules": schedules,
+            "switch_table": switch_table
+        }
+
+
+def _factors(items: List[str]) -> Dict[str, float]:
+    factors = {}
+    for item in items:
+        hardware, _, factor = item.partition("=")
+        factors[hardware] = float(factor)
+    return factors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Thermal/DVFS-tagged timings, per-state schedules and switch tables.")
+    parser.add_argument("--db", default="benchmark_results.db")
+    sub = parser.add_subparsers(dest="command", required=True)
+    imp = sub.add_parser("import", help="tag the rows of a CSV (benchmark_result columns) with a state")
+    imp.add_argument("csv")
+    imp.add_argument("--state", required=True)
+    derive = sub.add_parser("derive", help="tag scaled copies of the nominal rows with a state")
+    derive.add_argument("--state", required=True)
+    derive.add_argument("--scale", nargs="+", required=True, metavar="HARDWARE=FACTOR",
+                        help="e.g. big=1.8 gpu=1.2")
+    derive.add_argument("--machine", help="only this machine (default: all)")
+    plan = sub.add_parser("plan", help="solve every state of every pair and write the switch tables")
+    plan.add_argument("--output", required=True,
+                      help="JSON file for the plans (kept apart from the published all_schedules.json)")
+    plan.add_argument("--objective", choices=OBJECTIVES, default='total_time')
+    plan.add_argument("--margin", type=float, default=DEFAULT_MARGIN * 100,
+                      help="percent the other schedule must win by before switching (default: %(default)s)")
+    args = parser.parse_args()
+
+    store = ThermalStore(args.db)
+    if args.command == "import":
+        print(f"Tagged {store.import_csv(args.csv, args.state)} rows as {args.state}")
+    elif args.command == "derive":
+        try:
+            factors = _factors(args.scale)
+        except ValueError:
+            parser.error("--scale expects HARDWARE=FACTOR")
+        print(f"Tagged {store.derive(args.state, factors, args.machine)} rows as {args.state}")
+    else:
+        optimizer = PipelineOptimizer(args.db, objective=args.objective)
+        planner = ThermalPlanner(optimizer, store, args.margin / 100.0)
+        plans = []
+        for machine, application in optimizer.list_pairs():
+            result = planner.plan(machine, application)
+            if result is None:
+                continue
+            plans.append(result)
+            for rule in result["switch_table"]:
+                back = "below" if rule['when'] == "above" else "above"
+                print(f"{machine}/{application}: {rule['from']} -> {rule['to']} when {rule['hardware']} chunk "
+                      f"is {rule['when']} {rule['threshold_ms']:.3f} ms, back when {back} {rule['exit_ms']:.3f} ms")
+        with open(args.output, "w") as f:
+            json.dump(plans, f, indent=2)
+        print(f"Saved schedules for {len(plans)} pairs in file {args.output}")
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import sqlite3
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+GPU_BACKENDS = ['CUDA', 'VK']
+
+
+def hardware_name(backend: str, core_type: Optional[str]) -> str:
+    """Schedule 'hardware' label of a (backend, core_type) resource."""
+    return "gpu" if backend in GPU_BACKENDS else core_type
+
+
+class TimingCube:
+    """
+    In-memory minimum stage times for every (machine, application).
+
+    times[(machine, application)][stage][hardware] holds the same values
+    PipelineOptimizer.get_execution_times reads per pair, keyed by the
+    hardware labels used in schedules ('little', 'big', 'gpu', ...).
+    """
+
+    def __init__(self, times: Dict[Tuple[str, str], Dict[int, Dict[str, float]]]):
+        self.times = times
+
+    @classmethod
+    def load(cls, db_name: str = "benchmark_results.db") -> "TimingCube":
+        conn = sqlite3.connect(f"file:{quote(db_name)}?mode=ro", uri=True)
+        rows = conn.execute("""
+            SELECT machine_name, application, stage, backend, core_type, MIN(time_ms) as min_time
+            FROM benchmark_result
+            WHERE stage > 0
+            GROUP BY machine_name, application, stage, backend, core_type
+            HAVING min_time IS NOT NULL
+        """).fetchall()
+        conn.close()
+        times = defaultdict(lambda: defaultdict(dict))
+        for machine, application, stage, backend, core_type, min_time in rows:
+            if backend not in GPU_BACKENDS and core_type in (None, 'None'):
+                continue
+            times[(machine, application)][stage][hardware_name(backend, core_type)] = float(min_time)
+        return cls({pair: dict(stages) for pair, stages in times.items()})
+
+    def pairs(self) -> List[Tuple[str, str]]:
+        return sorted(self.times)
+
+    def stage_times(self, machine: str, application: str) -> Dict[int, Dict[str, float]]:
+        return self.times.get((machine, application), {})
+
+    def evaluate(self, machine: str, application: str, chunks: List[Dict]) -> Dict:
+        """
+        Score a chunk list the way build_schedule does: chunk time is the sum of
+        its stage times, total_time sums all chunks, max_chunk_time is the slowest.
+        Raises KeyError if a chunk lacks its hardware or stages, or a stage has no
+        timing on the chunk's hardware.
+        """
+        stage_times = self.stage_times(machine, application)
+        chunk_times = []
+        for index, chunk in enumerate(chunks):
+            if "hardware" not in chunk or "stages" not in chunk:
+                raise KeyError(f"Chunk {index} needs 'hardware' and 'stages'")
+            hardware = chunk["hardware"]
+            try:
+                chunk_times.append(sum(stage_times[s][hardware] for s in chunk["stages"]))
+            except KeyError:
+                raise KeyError(f"No timing for {machine}/{application} stages {chunk['stages']} on {hardware}")
+        return {
+            "total_time": sum(chunk_times),
+            "max_chunk_time": max(chunk_times) if chunk_times else 0.0,
+            "chunk_times": chunk_times
+        }